@@ -9,7 +9,8 @@ Replace code below according to your needs.
 from napari_plugin_engine import napari_hook_implementation
 from ._sdetection_plugins import (SDetectorDog, SDetectorDoh,
                                   SDetectorLog, SDetectorSeg)
-from ._slinking_plugins import (SLinkerShortestPath)
+from ._slinking_plugins import (SLinkerNearestNeighbor,
+                                SLinkerShortestPath, SLinkerLAP)
 from ._sproperties_plugins import SParticlesProperties
 from ._sfeatures_plugins import STracksFeatures
 from ._strackfilter_plugins import SFilterTrack
@@ -28,7 +29,9 @@ def napari_experimental_provide_dock_widget():
             SDetectorLog,
             SDetectorSeg,
             STracksFeatures,
+            SLinkerNearestNeighbor,
             SLinkerShortestPath,
+            SLinkerLAP,
             SFilterTrack,
             SScale,
             SLoad,
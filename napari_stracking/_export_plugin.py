@@ -1,16 +1,22 @@
 import os
 from qtpy import QtCore
+from qtpy.QtCore import QThread
 from qtpy.QtWidgets import (QWidget, QGridLayout, QLabel,
                             QPushButton, QLineEdit, QComboBox,
-                            QFileDialog)
+                            QFileDialog, QProgressBar)
 import napari
 from stracking.containers import STracks, SParticles
 from stracking.io import write_tracks, write_particles
 
+from ._swidgets import SLayerFeaturesWorker
+
 
 class SExport(QWidget):
     """Dock widget to export particles and tracks
 
+    The features of the tracks are computed in a worker thread before the
+    tracks are written
+
     Parameters
     ----------
     napari_viewer: Viewer
@@ -33,16 +39,32 @@ class SExport(QWidget):
         tracks_title = QLabel('Tracks')
         tracks_title.setMaximumHeight(50)
         self._tracks_layers = QComboBox()
-        tracks_export_btn = QPushButton('Export')
-        tracks_export_btn.released.connect(self._save_tracks)
+        self._tracks_export_btn = QPushButton('Export')
+        self._tracks_export_btn.released.connect(self._save_tracks)
+        self._tracks_cancel_btn = QPushButton('Cancel')
+        self._tracks_cancel_btn.setEnabled(False)
+        self._tracks_progress_bar = QProgressBar()
+
+        # features worker
+        self._tracks_file = ''
+        self.thread = QThread()
+        self.worker = SLayerFeaturesWorker(napari_viewer)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.execute)
+        self.worker.finished.connect(self.thread.quit)
+        self.worker.finished.connect(self._write_tracks)
+        self.worker.progress.connect(self._tracks_progress_bar.setValue)
+        self._tracks_cancel_btn.released.connect(self.worker.cancel)
 
         layout.addWidget(particles_title, 0, 0, 1, 2)
         layout.addWidget(self._particles_layers, 1, 0, 1, 2)
         layout.addWidget(particles_export_btn, 2, 1)
         layout.addWidget(tracks_title, 3, 0, 1, 2)
         layout.addWidget(self._tracks_layers, 4, 0, 1, 2)
-        layout.addWidget(tracks_export_btn, 5, 1)
-        layout.addWidget(QWidget(), 6, 0, 1, 2, QtCore.Qt.AlignTop)
+        layout.addWidget(self._tracks_cancel_btn, 5, 0)
+        layout.addWidget(self._tracks_export_btn, 5, 1)
+        layout.addWidget(self._tracks_progress_bar, 6, 0, 1, 2)
+        layout.addWidget(QWidget(), 7, 0, 1, 2, QtCore.Qt.AlignTop)
         self.setLayout(layout)
         self._on_layer_change(None)
 
@@ -76,12 +98,28 @@ class SExport(QWidget):
     def _save_tracks(self):
         """Callback called when save tracks button is clicked"""
         file = QFileDialog.getSaveFileName(self, 'Save File')
-        if len(file) > 0:
-            layer = self.viewer.layers[self._tracks_layers.currentText()]
-            tracks = STracks(data=layer.data, properties=layer.properties,
-                             graph=layer.graph, features=layer.metadata,
-                             scale=layer.scale)
-            format_ = 'st.json'
-            if file[0].endswith('csv'):
-                format_ = 'csv'
-            write_tracks(file[0], tracks, format_)
+        if len(file) > 0 and not self.thread.isRunning():
+            self._tracks_file = file[0]
+            self.worker.layer = \
+                self.viewer.layers[self._tracks_layers.currentText()]
+            self._tracks_export_btn.setEnabled(False)
+            self._tracks_cancel_btn.setEnabled(True)
+            self._tracks_progress_bar.setValue(0)
+            self.thread.start()
+
+    def _write_tracks(self):
+        """Callback called when the tracks features are computed"""
+        self.thread.wait()
+        self._tracks_export_btn.setEnabled(True)
+        self._tracks_cancel_btn.setEnabled(False)
+        if self.worker.table is None:
+            return
+        layer = self.worker.layer
+        tracks = STracks(data=layer.data, properties=layer.properties,
+                         graph=layer.graph,
+                         features=self.worker.table.to_dicts(),
+                         scale=layer.scale)
+        format_ = 'st.json'
+        if self._tracks_file.endswith('csv'):
+            format_ = 'csv'
+        write_tracks(self._tracks_file, tracks, format_)
@@ -6,22 +6,22 @@ from qtpy.QtWidgets import (QWidget, QGridLayout, QLabel,
 from qtpy.QtCore import Signal, QThread, QObject
 import napari
 from stracking.pipelines import STrackingPipeline
-from ._splugin import SProgressObserver, SLogWidget
+from ._splugin import SProgressObserver, SLogWidget, SNapariWorker
 
 
-class SPipelineWorker(QObject):
-    """STracking worker to run a STracking pipeline (STrackingPipeline)"""
-    finished = Signal()
-    progress = Signal(int)
-    log = Signal(str)
+class SPipelineWorker(SNapariWorker):
+    """STracking worker to run a STracking pipeline (STrackingPipeline)
 
+    The pipeline can be canceled between its stages
+
+    """
     def __init__(self):
-        super().__init__()
+        super().__init__(None, None)
         self.image = None
         self.pipeline_file = None
         self.tracks_ = None
 
-        self.observer = SProgressObserver()
+        self.observer = SProgressObserver(self.cancel_event)
         self.observer.progress_signal.connect(self.progress)
         self.observer.notify_signal.connect(self.log)
 
@@ -63,7 +63,7 @@ class SPipeline(QWidget):
         self.thread = QThread()
         self.worker = SPipelineWorker()
         self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
+        self.thread.started.connect(self.worker.execute)
         self.worker.finished.connect(self.thread.quit)
         self.worker.finished.connect(self.set_outputs)
 
@@ -79,6 +79,9 @@ class SPipeline(QWidget):
         # run
         self.run_btn = QPushButton('Run')
         self.run_btn.released.connect(self._run)
+        self.cancel_btn = QPushButton('Cancel')
+        self.cancel_btn.released.connect(self._cancel)
+        self.cancel_btn.setEnabled(False)
 
         # progress
         self.log_widget = SLogWidget()
@@ -90,7 +93,8 @@ class SPipeline(QWidget):
         layout.addWidget(QLabel('Pipeline:'), 1, 0)
         layout.addWidget(self._pipeline_edit, 1, 1)
         layout.addWidget(browse_button, 1, 2)
-        layout.addWidget(self.run_btn, 2, 0, 1, 3)
+        layout.addWidget(self.run_btn, 2, 0, 1, 2)
+        layout.addWidget(self.cancel_btn, 2, 2)
         layout.addWidget(self.log_widget, 3, 0, 1, 3)
         layout.addWidget(QWidget(), 4, 0, 1, 3, QtCore.Qt.AlignTop)
         self.setLayout(layout)
@@ -137,8 +141,14 @@ class SPipeline(QWidget):
         if self.check_inputs():
             self.worker.set_inputs(self.viewer.layers[self._images_layers.currentText()].data,
                                    self._pipeline_edit.text())
+            self.cancel_btn.setEnabled(True)
             self.thread.start()
 
+    def _cancel(self):
+        """Callback called when the cancel button is clicked"""
+        self.cancel_btn.setEnabled(False)
+        self.worker.cancel()
+
     def check_inputs(self):
         """Check the plugin user inputs
 
@@ -174,6 +184,9 @@ class SPipeline(QWidget):
 
     def set_outputs(self):
         """Set the plugin outputs to the napari viewer"""
+        self.cancel_btn.setEnabled(False)
+        if self.worker.is_canceled():
+            return
         self.viewer.add_tracks(self.worker.tracks_.data,
                                name='S Pipeline',
                                scale=self.worker.tracks_.scale,
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import numpy as np
+
+
+def frame_hash(frame):
+    """Content hash of a frame
+
+    Parameters
+    ----------
+    frame: ndarray
+        Frame data
+
+    Returns
+    -------
+    hash: str
+        Hexadecimal digest of the frame shape, type and pixels values
+
+    """
+    frame = np.ascontiguousarray(frame)
+    hash_ = hashlib.blake2b(digest_size=16)
+    hash_.update(f'{frame.shape}{frame.dtype.str}'.encode())
+    hash_.update(frame.data)
+    return hash_.hexdigest()
+
+
+def parameters_key(name, parameters, scale=None):
+    """Key identifying a detector configuration
+
+    Parameters
+    ----------
+    name: str
+        Name of the detector
+    parameters: dict
+        Parameters of the detector
+    scale: tuple or list
+        Scale of the image in each dimension
+
+    Returns
+    -------
+    key: str
+
+    """
+    if scale is not None:
+        scale = tuple(float(s) for s in scale)
+    return f'{name}{sorted(parameters.items())}{scale}'
+
+
+class SDetectionCache:
+    """Least recently used cache of the detections of single frames
+
+    The entries are keyed by the detector configuration and the hash of the
+    frame content, so a frame is never processed twice with the same
+    parameters, whichever run (full movie or current frame) produced it.
+
+    Parameters
+    ----------
+    max_bytes: int
+        Memory budget of the cache. The least recently used entries are
+        evicted when the budget is exceeded. 0 disables the cache
+
+    """
+    def __init__(self, max_bytes=512*1024*1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(value):
+        data, properties = value
+        return data.nbytes + sum(np.asarray(prop).nbytes
+                                 for prop in properties.values())
+
+    def get(self, key):
+        """Get the detections of a frame
+
+        Parameters
+        ----------
+        key: tuple
+            (parameters key, frame hash)
+
+        Returns
+        -------
+        The cached (data, properties) of the frame or None if not cached
+
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        """Add the detections of a frame to the cache
+
+        Parameters
+        ----------
+        key: tuple
+            (parameters key, frame hash)
+        value: tuple
+            (data, properties) detections of the frame
+
+        """
+        size = self._size(value)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._bytes -= self._size(self._entries.pop(key))
+            self._entries[key] = value
+            self._bytes += size
+            self._evict()
+
+    def resize(self, max_bytes):
+        """Change the memory budget of the cache"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Remove all the entries"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        """Remove the least recently used entries until the budget is met"""
+        while self._bytes > self.max_bytes and len(self._entries) > 0:
+            _, value = self._entries.popitem(last=False)
+            self._bytes -= self._size(value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        """Memory used by the cached detections"""
+        return self._bytes
+
+
+# cache shared by all the detector plugins
+detection_cache = SDetectionCache()
@@ -0,0 +1,796 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import itertools
+import numpy as np
+from scipy import ndimage as ndi
+from skimage.feature.blob import _prune_blobs
+
+from stracking.containers import SParticles
+from stracking.detectors import SDetector
+
+from ._sdetection_cache import frame_hash
+
+
+def time_chunk_size(image):
+    """Number of frames stored together in a chunked (dask, zarr) array
+
+    Parameters
+    ----------
+    image: array like
+        ND image with the time in the first axis
+
+    Returns
+    -------
+    size: int
+        Number of frames in the first time chunk. 1 for in memory arrays
+
+    """
+    chunks = getattr(image, 'chunks', None)
+    if chunks is None or len(chunks) == 0:
+        return 1
+    first = chunks[0]
+    if isinstance(first, tuple):  # dask: tuple of the chunks sizes
+        first = first[0] if len(first) > 0 else 1
+    return max(1, int(first))
+
+
+def iter_frames(image, frames, max_block=8):
+    """Read the frames of a movie one time chunk after the other
+
+    Lazy arrays (dask, zarr) are only loaded for the requested frames, and
+    frames that share a storage chunk are read together so that a chunk is
+    never loaded twice. At most ``max_block`` frames are in memory at once.
+
+    Parameters
+    ----------
+    image: array like
+        ND image with the time in the first axis
+    frames: list
+        Sorted indexes of the frames to read
+    max_block: int
+        Maximum number of frames read at once
+
+    Yields
+    ------
+    t: int
+        Index of the frame
+    frame: ndarray
+        Frame data loaded in memory
+
+    """
+    block = time_chunk_size(image)
+    if block > max_block:
+        block = 1
+    i = 0
+    while i < len(frames):
+        chunk = frames[i] // block
+        j = i
+        while j < len(frames) and frames[j] // block == chunk:
+            j += 1
+        if j - i == 1:
+            yield frames[i], np.asarray(image[frames[i], ...])
+        else:
+            data = np.asarray(image[frames[i]:frames[j-1]+1, ...])
+            for t in frames[i:j]:
+                yield t, data[t - frames[i]]
+        i = j
+
+
+def detect_frame(detector, frame, t, scale=None):
+    """Run a detector on a single frame
+
+    Parameters
+    ----------
+    detector: SDetector
+        Detector to run
+    frame: ndarray
+        2D or 3D image of the frame
+    t: int
+        Index of the frame in the movie
+    scale: tuple or list
+        Scale of the image in each dimension
+
+    Returns
+    -------
+    data: ndarray
+        Detections coordinates with the frame index in the first column
+    properties: dict
+        Detections properties
+
+    """
+    particles = detector.run(np.expand_dims(np.asarray(frame), 0), scale)
+    data = particles.data
+    data[:, 0] = t
+    return data, particles.properties
+
+
+def scale_space_halo(max_sigma):
+    """Width of the tiles halo for a scale space detector
+
+    The gaussian kernels are truncated at 4 standard deviations, so with
+    this halo the scale space of a tile core is identical to the scale space
+    of the whole frame.
+
+    Parameters
+    ----------
+    max_sigma: float
+        Largest standard deviation of the scale space kernels
+
+    Returns
+    -------
+    halo: int
+        Halo width in pixels
+
+    """
+    return int(np.ceil(4 * max_sigma)) + 1
+
+
+def tile_regions(shape, tile_size, halo, box=None):
+    """Split a frame, or a box of a frame, into overlapping tiles
+
+    Parameters
+    ----------
+    shape: tuple
+        Shape of the frame
+    tile_size: int
+        Size of the tiles core in each dimension. None to process the box
+        as a single tile
+    halo: int
+        Width of the margin added around the tiles core
+    box: tuple
+        (start, stop) of the box to split in each dimension. None to split
+        the whole frame
+
+    Returns
+    -------
+    regions: list
+        (origin, slices, core) of each tile: origin is the position of the
+        tile in the frame, slices selects the tile with its halo in the frame
+        and core is the (start, stop) of the tile core in each dimension,
+        relative to the tile
+
+    """
+    if box is None:
+        box = tuple((0, size) for size in shape)
+    axes = []
+    for size, (box_start, box_stop) in zip(shape, box):
+        step = tile_size or box_stop - box_start
+        axis = []
+        for start in range(box_start, box_stop, step):
+            stop = min(start + step, box_stop)
+            low = max(0, start - halo)
+            high = min(size, stop + halo)
+            axis.append((low, high, start - low, stop - low))
+        axes.append(axis)
+    regions = []
+    for tile in itertools.product(*axes):
+        origin = np.array([axis[0] for axis in tile])
+        slices = tuple(slice(axis[0], axis[1]) for axis in tile)
+        core = tuple((axis[2], axis[3]) for axis in tile)
+        regions.append((origin, slices, core))
+    return regions
+
+
+def roi_boxes(mask):
+    """Bounding boxes of the regions of interest of a mask
+
+    Overlapping (or touching) boxes are merged, so that each pixel belongs
+    to at most one box. Each merge pass labels the mask of the boxes, so the
+    cost is linear in the frame size.
+
+    Parameters
+    ----------
+    mask: ndarray
+        Boolean mask of the regions of interest of a frame
+
+    Returns
+    -------
+    boxes: list
+        (start, stop) of each box in each dimension
+
+    """
+    boxes = _label_boxes(mask)
+    # the bounding box of merged boxes can overlap other boxes: fill the
+    # boxes and label them again until no box overlaps another
+    while True:
+        filled = np.zeros(mask.shape, dtype=bool)
+        for box in boxes:
+            filled[tuple(slice(start, stop) for start, stop in box)] = True
+        merged = _label_boxes(filled)
+        if len(merged) == len(boxes):
+            return merged
+        boxes = merged
+
+
+def _label_boxes(mask):
+    """Bounding boxes of the connected components of a mask"""
+    labels, _ = ndi.label(mask)
+    return [tuple((sl.start, sl.stop) for sl in obj)
+            for obj in ndi.find_objects(labels) if obj is not None]
+
+
+def roi_regions(mask, tile_size, halo):
+    """Tiles covering the regions of interest of a frame
+
+    Parameters
+    ----------
+    mask: ndarray
+        Boolean mask of the regions of interest of a frame
+    tile_size: int
+        Size of the tiles core. None to process each box as a single tile
+    halo: int
+        Width of the margin added around the boxes, so that the detections
+        near the borders of the regions are the same as in the whole frame
+
+    Returns
+    -------
+    regions: list
+        Tiles regions (see ``tile_regions``)
+
+    """
+    regions = []
+    for box in roi_boxes(mask):
+        regions += tile_regions(mask.shape, tile_size, halo, box)
+    return regions
+
+
+def in_mask(data, mask):
+    """Select the detections located in a mask
+
+    Parameters
+    ----------
+    data: ndarray
+        Detections coordinates with the frame index in the first column
+    mask: ndarray
+        Boolean mask of a frame
+
+    Returns
+    -------
+    keep: ndarray
+        Boolean array, True for the detections in the mask
+
+    """
+    coords = np.rint(data[:, 1:]).astype(int)
+    coords = np.clip(coords, 0, np.array(mask.shape) - 1)
+    return mask[tuple(coords.T)]
+
+
+def block_shape(shape, tile_size=None, halo=0):
+    """Shape of the largest block processed in a frame
+
+    Parameters
+    ----------
+    shape: tuple
+        Shape of the frame
+    tile_size: int
+        Size of the tiles core. None to process whole frames
+    halo: int
+        Width of the tiles halo
+
+    Returns
+    -------
+    shape: tuple
+
+    """
+    if tile_size is None:
+        return tuple(shape)
+    return tuple(min(size, tile_size + 2 * halo) for size in shape)
+
+
+def plan_execution(shape, voxel_bytes, budget=None, workers=1,
+                   tile_size=None, halo=None):
+    """Adapt the execution options of a detection to a memory budget
+
+    Each worker processes one block (a frame or a tile) at a time, so the
+    peak memory is estimated as the number of workers times the memory
+    needed to process the largest block. When the budget is exceeded, the
+    number of workers is reduced first, then the frames are split into
+    tiles of decreasing size.
+
+    Parameters
+    ----------
+    shape: tuple
+        Shape of a frame
+    voxel_bytes: float
+        Memory needed by the detector per voxel of a block
+    budget: int
+        Memory budget in bytes. None or 0 to disable the budget
+    workers: int
+        Requested number of workers
+    tile_size: int
+        Requested tile size. None to process whole frames
+    halo: int
+        Width of the tiles halo. None if the detector cannot process tiles
+
+    Returns
+    -------
+    workers: int
+        Number of workers to use
+    tile_size: int
+        Tile size to use, None to process whole frames
+    estimate: int
+        Estimated peak memory in bytes
+
+    """
+    def memory(tile):
+        return int(np.prod(block_shape(shape, tile, halo or 0)) * voxel_bytes)
+
+    estimate = workers * memory(tile_size)
+    if not budget or estimate <= budget:
+        return workers, tile_size, estimate
+    if memory(tile_size) <= budget:
+        workers = int(budget // memory(tile_size))
+        return workers, tile_size, workers * memory(tile_size)
+    if halo is None:
+        # the detector cannot process tiles: best effort with one worker
+        return 1, tile_size, memory(tile_size)
+    tile = tile_size or max(shape)
+    min_tile = max(halo, 16)
+    while tile > min_tile and memory(tile) > budget:
+        tile = max(min_tile, tile // 2)
+    workers = max(1, min(workers, int(budget // memory(tile))))
+    return workers, tile, workers * memory(tile)
+
+
+def format_bytes(size):
+    """Human readable memory size"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+
+def detect_block(detector, block, t, scale=None, core=None):
+    """Run a detector on a frame or on a tile of a frame
+
+    Parameters
+    ----------
+    detector: SDetector
+        Detector to run
+    block: ndarray
+        2D or 3D image of the frame or of the tile with its halo
+    t: int
+        Index of the frame in the movie
+    scale: tuple or list
+        Scale of the image in each dimension
+    core: tuple
+        (start, stop) of the tile core in each dimension. Only the
+        detections in the core are kept. None to keep all the detections
+
+    Returns
+    -------
+    data: ndarray
+        Detections coordinates, relative to the block, with the frame index
+        in the first column
+    properties: dict
+        Detections properties
+
+    """
+    data, properties = detect_frame(detector, block, t, scale)
+    if core is None or data.shape[0] == 0:
+        return data, properties
+    keep = np.ones(data.shape[0], dtype=bool)
+    for i, (start, stop) in enumerate(core):
+        keep &= (data[:, i+1] >= start) & (data[:, i+1] < stop)
+    return data[keep], {key: np.asarray(value)[keep]
+                        for key, value in properties.items()}
+
+
+def merge_tiles(results, overlap=None):
+    """Merge the detections of the tiles of a frame
+
+    Each blob is kept by the tile owning its center. The blobs of
+    neighbouring tiles can still overlap across the tiles borders, so they
+    are pruned again with the detector overlap criterion.
+
+    Parameters
+    ----------
+    results: list
+        (data, properties) detections of each tile, in frame coordinates
+    overlap: float
+        Overlap of the detector. None to skip the pruning
+
+    Returns
+    -------
+    data: ndarray
+        Detections coordinates of the frame
+    properties: dict
+        Detections properties
+
+    """
+    data, properties = _concatenate(results)
+    if overlap is None or data.shape[0] < 2 or 'radius' not in properties:
+        return data, properties
+    blobs = np.column_stack((data[:, 1:], properties['radius']))
+    # _prune_blobs sets the sigma of the eliminated blobs to 0 in place
+    _prune_blobs(blobs, overlap)
+    keep = blobs[:, -1] > 0
+    return data[keep], {key: value[keep] for key, value in properties.items()}
+
+
+def _concatenate(results):
+    """Concatenate a list of (data, properties) detections"""
+    results = [res for res in results if res[0].shape[0] > 0]
+    if len(results) == 0:
+        return np.empty((0, 0)), dict()
+    data = np.concatenate([res[0] for res in results], axis=0)
+    properties = {key: np.concatenate([np.asarray(res[1][key])
+                                       for res in results])
+                  for key in results[0][1]}
+    return data, properties
+
+
+def merge_particles(results, ndim, scale=None):
+    """Merge the detections of several frames into a single container
+
+    Parameters
+    ----------
+    results: list
+        List of (data, properties) detections of each frame, in frame order
+    ndim: int
+        Number of dimensions of the image (time included)
+    scale: tuple or list
+        Scale of the image in each dimension
+
+    Returns
+    -------
+    particles: SParticles
+
+    """
+    data, properties = _concatenate(results)
+    if data.shape[0] == 0:
+        return SParticles(data=np.empty((0, ndim)), properties={},
+                          scale=scale)
+    return SParticles(data=data, properties=properties, scale=scale)
+
+
+class SFrameDetector(SDetector):
+    """Run a detector independently on each frame of a movie
+
+    The frames can be dispatched to a pool of processes to run the
+    detection in parallel. The detections are merged back with the index
+    of the frame they come from.
+
+    The frames are streamed from the image, so lazy arrays (dask, zarr) are
+    never loaded entirely: only the frames being processed are in memory.
+
+    Very large frames can be split into tiles with a halo. The tiles are
+    processed as independent jobs, so the memory used by a detection is
+    bounded by the tile size, and each blob is kept by the tile owning its
+    center.
+
+    The detection can be restricted to regions of interest given by a
+    mask: only the bounding boxes of the regions, with a halo, are
+    processed, and only the detections in the mask are kept.
+
+    When a cache is given, the detections of each frame (or tile) are
+    stored with the hash of its content, and frames already processed with
+    the same detector configuration are not processed again.
+
+    Parameters
+    ----------
+    detector: SDetector
+        Detector to run on each frame
+    workers: int
+        Number of processes used to run the detection. 1 runs the
+        detection in the calling thread
+    cache: SDetectionCache
+        Cache of the frames detections. None to disable caching
+    cache_key: str
+        Key identifying the detector configuration in the cache (see
+        ``parameters_key``)
+    tile_size: int
+        Size of the tiles core in each spatial dimension. None to process
+        whole frames
+    halo: int
+        Width of the margin added around the tiles (see
+        ``scale_space_halo``)
+    overlap: float
+        Overlap of the detector, used to prune the blobs across the tiles
+        borders. None to skip the pruning
+    roi: array like
+        Mask of the regions of interest (positive inside), with the shape of
+        a frame (same regions for all the frames) or of the movie. A movie
+        mask can be a lazy array: only the masks of the processed frames
+        are read. None to process the whole frames
+    frame_callback: callable
+        Function called with (t, data, properties) as soon as the
+        detections of a frame are complete, in the frames order. It allows
+        to process the detections (ex. link them) while the next frames are
+        being detected
+
+    """
+    def __init__(self, detector, workers=1, cache=None, cache_key=None,
+                 tile_size=None, halo=0, overlap=None, roi=None,
+                 frame_callback=None):
+        super().__init__()
+        self.detector = detector
+        self.workers = workers
+        self.cache = cache
+        self.cache_key = cache_key
+        self.tile_size = tile_size
+        self.halo = halo
+        self.overlap = overlap
+        self.roi = roi
+        self.frame_callback = frame_callback
+        self._cache_hits = 0
+
+    def roi_mask(self, t, ndim):
+        """Mask of the regions of interest of a frame
+
+        Parameters
+        ----------
+        t: int
+            Index of the frame
+        ndim: int
+            Number of dimensions of a frame
+
+        Returns
+        -------
+        mask: ndarray
+            Boolean mask of the frame, None if there is no ROI
+
+        """
+        if self.roi is None:
+            return None
+        if self.roi.ndim == ndim + 1:
+            return np.asarray(self.roi[t]) > 0
+        return np.asarray(self.roi) > 0
+
+    def regions(self, shape, t=0):
+        """Tiles of a frame, or None if the frame is processed as a whole
+
+        Parameters
+        ----------
+        shape: tuple
+            Shape of a frame
+        t: int
+            Index of the frame
+
+        Returns
+        -------
+        regions: list
+            Tiles regions (see ``tile_regions``)
+
+        """
+        tile_size = self.tile_size
+        if tile_size is not None and tile_size >= max(shape):
+            tile_size = None
+        mask = self.roi_mask(t, len(shape))
+        if mask is not None:
+            if mask.shape != tuple(shape):
+                raise Exception('SFrameDetector: the ROI mask shape does not '
+                                'match the frames shape')
+            return roi_regions(mask, tile_size, self.halo)
+        if tile_size is None:
+            return None
+        return tile_regions(shape, tile_size, self.halo)
+
+    def run(self, image, scale=None, frames=None):
+        """Run the detection on a ND image
+
+        Parameters
+        ----------
+        image: ndarray
+            time frames to analyse
+        scale: tuple or list
+            scale of the image in each dimension
+        frames: list
+            Indexes of the frames to process. All the frames are processed
+            if None
+
+        Returns
+        -------
+        detections: SParticles
+
+        """
+        if image.ndim not in (3, 4):
+            raise Exception('SFrameDetector: can process only 2D+t or 3D+t '
+                            'images')
+        if frames is None:
+            frames = range(image.shape[0])
+        frames = sorted(frames)
+
+        self.notify('processing')
+        self.progress(0)
+        self._cache_hits = 0
+        if self.roi is not None and self.roi.ndim == image.ndim:
+            regions = {t: self.regions(image.shape[1:], t) for t in frames}
+        else:
+            # same regions for all the frames
+            frame_regions = self.regions(image.shape[1:])
+            regions = {t: frame_regions for t in frames}
+        tiled = any(region is not None for region in regions.values())
+        count = sum(1 if region is None else len(region)
+                    for region in regions.values())
+        if tiled:
+            self.notify(f'processing {count} tiles')
+        results = {t: [] for t in frames}
+        self._frames = frames
+        self._tiled = tiled
+        self._remaining = {t: 1 if regions[t] is None else len(regions[t])
+                           for t in frames}
+        self._frames_results = dict()
+        self._next_frame = 0
+        self._ndim = image.ndim
+        if self.workers > 1 and count > 1:
+            self._run_parallel(image, scale, frames, regions, results, count)
+        else:
+            self._run_serial(image, scale, frames, regions, results, count)
+        # finish the last frames without blocks (empty ROI)
+        self._emit_frames(results)
+        if self._cache_hits > 0:
+            self.notify(f'{self._cache_hits} blocks loaded from cache')
+        self.notify('done')
+        self.progress(100)
+        return merge_particles([self._frames_results.pop(t) for t in frames],
+                               image.ndim, scale)
+
+    def _finish_frame(self, t, frame_results):
+        """Merge the detections of the blocks of a frame
+
+        The tiles detections are pruned across the tiles borders, and the
+        detections outside of the ROI are removed
+
+        """
+        if len(frame_results) == 0:
+            # no block in the frame ROI
+            return np.empty((0, self._ndim)), dict()
+        if not self._tiled:
+            data, properties = frame_results[0]
+        else:
+            data, properties = merge_tiles(frame_results, self.overlap)
+        if self.roi is not None and data.shape[0] > 0:
+            keep = in_mask(data, self.roi_mask(t, data.shape[1] - 1))
+            data = data[keep]
+            properties = {key: np.asarray(value)[keep]
+                          for key, value in properties.items()}
+        return data, properties
+
+    def _emit_frames(self, results):
+        """Finish the complete frames, in the frames order
+
+        A frame is finished when all its blocks are processed and all the
+        previous frames are finished, so the frame callback receives the
+        frames in order even when the blocks are processed out of order
+
+        """
+        while self._next_frame < len(self._frames):
+            t = self._frames[self._next_frame]
+            if self._remaining[t] > 0:
+                return
+            data, properties = self._finish_frame(t, results.pop(t))
+            self._frames_results[t] = (data, properties)
+            if self.frame_callback is not None:
+                self.frame_callback(t, data, properties)
+            self._next_frame += 1
+
+    def _blocks(self, image, frames, regions, max_block):
+        """Read the blocks to process: whole frames or tiles
+
+        Parameters
+        ----------
+        regions: dict
+            Tiles regions of each frame, None for the frames processed as
+            a whole
+
+        Yields
+        ------
+        t: int
+            Index of the frame
+        origin: ndarray
+            Position of the block in the frame. None for whole frames
+        core: tuple
+            Core of the tile (see ``tile_regions``). None for whole frames
+        block: ndarray
+            Block data loaded in memory
+
+        """
+        if all(regions[t] is None for t in frames):
+            for t, frame in iter_frames(image, frames, max_block):
+                yield t, None, None, frame
+            return
+        for t in frames:
+            for origin, slices, core in regions[t]:
+                # lazy arrays only load the tile
+                yield t, origin, core, np.asarray(image[(t,) + slices])
+
+    def _run_serial(self, image, scale, frames, regions, results, count):
+        """Process the blocks one after the other in the calling thread"""
+        done = 0
+        for t, origin, core, block in self._blocks(image, frames, regions, 8):
+            self.progress(int(100 * done / count))
+            key, result = self._cached(block, t, core)
+            if result is None:
+                result = detect_block(self.detector, block, t, scale, core)
+                self._store(key, result)
+            self._add(results, t, origin, result)
+            done += 1
+
+    def _run_parallel(self, image, scale, frames, regions, results, count):
+        """Dispatch the blocks to a pool of processes
+
+        The blocks are submitted as they are read, with at most two blocks
+        per worker waiting in the pool, to bound the memory usage
+
+        """
+        self.notify(f'processing {len(frames)} frames with '
+                    f'{self.workers} workers')
+        pending = dict()
+        max_pending = 2 * self.workers
+        self._done = 0
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            for t, origin, core, block in self._blocks(image, frames, regions,
+                                                       max_pending):
+                key, result = self._cached(block, t, core)
+                if result is not None:
+                    self._add(results, t, origin, result)
+                    self._done += 1
+                    continue
+                if len(pending) >= max_pending:
+                    self._collect(pending, results, count)
+                future = executor.submit(detect_block, self.detector, block,
+                                         t, scale, core)
+                pending[future] = (t, origin, key)
+            while len(pending) > 0:
+                self._collect(pending, results, count)
+        except BaseException:
+            # canceled by an observer or failed: drop the waiting blocks
+            # without waiting for the pool (cancel_futures needs python 3.9)
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+            raise
+        executor.shutdown()
+
+    def _collect(self, pending, results, count):
+        """Wait for at least one submitted block and store its detections"""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            t, origin, key = pending.pop(future)
+            result = future.result()
+            self._store(key, result)
+            self._add(results, t, origin, result)
+            self._done += 1
+        self.progress(int(100 * self._done / count))
+
+    def _add(self, results, t, origin, result):
+        """Add the detections of a block in the frame coordinates"""
+        data, properties = result
+        if origin is not None:
+            data = data.copy()
+            data[:, 1:] += origin
+        results[t].append((data, properties))
+        self._remaining[t] -= 1
+        self._emit_frames(results)
+
+    def _cached(self, block, t, core=None):
+        """Look for the detections of a block in the cache
+
+        Returns
+        -------
+        key: tuple
+            Key of the block in the cache, None if there is no cache
+        result: tuple
+            The (data, properties) detections of the block, None if the
+            block is not cached
+
+        """
+        if self.cache is None:
+            return None, None
+        key = (self.cache_key, frame_hash(block))
+        if core is not None:
+            key += (core,)
+        result = self.cache.get(key)
+        if result is not None:
+            self._cache_hits += 1
+            data = result[0].copy()
+            data[:, 0] = t
+            result = (data, result[1])
+        return key, result
+
+    def _store(self, key, result):
+        """Add the detections of a block to the cache"""
+        if key is not None:
+            self.cache.put(key, result)
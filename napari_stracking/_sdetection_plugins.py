@@ -1,11 +1,60 @@
 from ._splugin import SNapariPlugin
+from ._sdetection_preview import SDetectionPreview
 from ._sdetection_workers import (SDogWorker, SDogWidget,
                                   SDohWorker, SDohWidget,
                                   SLogWidget, SLogWorker,
                                   SSegWidget, SSegWorker)
 
 
-class SDetectorDog(SNapariPlugin):
+class SDetectorPlugin(SNapariPlugin):
+    """Common plugin for the detectors
+
+    It adds the live preview and the memory estimate of the detection to
+    the plugin. ``init_detector`` must be called after ``init_ui``
+
+    """
+    def init_detector(self):
+        """Initialize the live preview and the memory estimate"""
+        self.preview = SDetectionPreview(self.viewer, self.widget,
+                                         self.worker)
+        self.preview.log.connect(self.log_widget.add_log)
+        self.widget.changed.connect(self.update_memory_estimate)
+        self.update_memory_estimate()
+
+    def closeEvent(self, event):
+        """Stop the live preview thread when the plugin is closed"""
+        self.preview.stop()
+        super().closeEvent(event)
+
+    def update_memory_estimate(self):
+        """Refresh the memory estimate displayed in the widget"""
+        try:
+            state = self.widget.state()
+        except ValueError:
+            # parameters being edited
+            return
+        input_image_layer = state['inputs']['image']
+        if input_image_layer not in self.viewer.layers:
+            self.widget.set_memory_estimate('')
+            return
+        layer = self.viewer.layers[input_image_layer]
+        image = layer.data
+        if layer.multiscale:
+            image = image[0]
+        if image.ndim not in (3, 4):
+            self.widget.set_memory_estimate('')
+            return
+        try:
+            estimate = self.worker.memory_estimate(state, image.shape,
+                                                   image.dtype)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            # parameters being edited, like a sigma ratio of 1
+            self.widget.set_memory_estimate('')
+            return
+        self.widget.set_memory_estimate(estimate)
+
+
+class SDetectorDog(SDetectorPlugin):
     """Napari plugin for DoG detection
 
     Parameters
@@ -23,9 +72,10 @@ class SDetectorDog(SNapariPlugin):
         self.widget.enable.connect(self.set_enable)
         self.init_ui()
         self.widget.init_layer_list()
+        self.init_detector()
 
 
-class SDetectorDoh(SNapariPlugin):
+class SDetectorDoh(SDetectorPlugin):
     """Napari plugin for DoH detection
 
     Parameters
@@ -43,9 +93,10 @@ class SDetectorDoh(SNapariPlugin):
         self.widget.enable.connect(self.set_enable)
         self.init_ui()
         self.widget.init_layer_list()
+        self.init_detector()
 
 
-class SDetectorLog(SNapariPlugin):
+class SDetectorLog(SDetectorPlugin):
     """Napari plugin for LoG detection
 
     Parameters
@@ -63,9 +114,10 @@ class SDetectorLog(SNapariPlugin):
         self.widget.enable.connect(self.set_enable)
         self.init_ui()
         self.widget.init_layer_list()
+        self.init_detector()
 
 
-class SDetectorSeg(SNapariPlugin):
+class SDetectorSeg(SDetectorPlugin):
     """Napari plugin for detection from segmentation map
 
     Parameters
@@ -83,3 +135,4 @@ class SDetectorSeg(SNapariPlugin):
         self.widget.enable.connect(self.set_enable)
         self.init_ui()
         self.widget.init_layer_list()
+        self.init_detector()
@@ -0,0 +1,197 @@
+import threading
+
+from qtpy.QtCore import Signal, QThread, QObject, QTimer
+
+from ._splugin import SCanceled, SProgressObserver
+
+
+class SDetectionPreviewRunner(QObject):
+    """Run the preview detections in a background thread
+
+    The runner receives the detection requests in its own thread. Requests
+    that became stale while waiting (a newer request was sent) are skipped,
+    and a running request is canceled by its cancel event.
+
+    """
+    done = Signal(int, object)
+    log = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.latest = 0
+
+    def run(self, generation, detector, image, t, scale, cancel_event):
+        """Detect the particles of one frame
+
+        Parameters
+        ----------
+        generation: int
+            Identifier of the request. Older requests are stale
+        detector: SFrameDetector
+            Detector to run
+        image: array like
+            Image layer data
+        t: int
+            Index of the frame to process
+        scale: tuple or list
+            Scale of the image in each dimension
+        cancel_event: threading.Event
+            Event set when a newer request is sent or the preview stops
+
+        """
+        if generation < self.latest or cancel_event.is_set():
+            return
+        detector.add_observer(SProgressObserver(cancel_event))
+        try:
+            particles = detector.run(image, scale, [t])
+        except SCanceled:
+            return
+        except Exception as err:
+            self.log.emit(f'preview failed: {err}')
+            return
+        self.done.emit(generation, particles.data)
+
+
+class SDetectionPreview(QObject):
+    """Live detection preview of the frame displayed in the viewer
+
+    When activated, the preview listens to the viewer time slider and to
+    the detector widget edits. After a short delay without change, the
+    current frame is detected in a background thread and the detections are
+    displayed in a single points layer updated in place.
+
+    Parameters
+    ----------
+    napari_viewer: Viewer
+        Napari viewer
+    widget: SDetectorWidget
+        Widget of the detector plugin
+    worker: SDetectorWorker
+        Worker of the detector plugin
+
+    """
+    request = Signal(int, object, object, int, object, object)
+    log = Signal(str)
+
+    def __init__(self, napari_viewer, widget, worker, delay=300):
+        super().__init__()
+        self.viewer = napari_viewer
+        self.widget = widget
+        self.worker = worker
+        self.active = False
+        self._generation = 0
+        self._size = 1
+        self._scale = None
+        self._cancel_event = threading.Event()
+
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self._start)
+
+        self._thread = QThread()
+        self._runner = SDetectionPreviewRunner()
+        self._runner.moveToThread(self._thread)
+        self.request.connect(self._runner.run)
+        self._runner.done.connect(self._on_done)
+        self._runner.log.connect(self.log)
+
+        self.widget.preview.connect(self.set_active)
+        self.widget.changed.connect(self.schedule)
+
+    @property
+    def layer_name(self):
+        """Name of the preview points layer"""
+        return f'{self.worker.name} preview'
+
+    def set_active(self, mode: bool):
+        """Start or stop the live preview
+
+        Parameters
+        ----------
+        mode: bool
+            True to start the preview, False to stop it
+
+        """
+        if mode == self.active:
+            return
+        self.active = mode
+        if mode:
+            self._thread.start()
+            self.viewer.dims.events.current_step.connect(self.schedule)
+            self.schedule()
+        else:
+            self._timer.stop()
+            self.viewer.dims.events.current_step.disconnect(self.schedule)
+            self._cancel()
+            self._thread.quit()
+            if self.layer_name in self.viewer.layers:
+                self.viewer.layers.remove(self.layer_name)
+
+    def stop(self):
+        """Stop the preview and its thread, when the plugin is closed"""
+        self.set_active(False)
+        self._cancel()
+        self._thread.quit()
+        self._thread.wait()
+
+    def _cancel(self):
+        """Make the pending and running requests stale"""
+        self._generation += 1
+        self._runner.latest = self._generation
+        self._cancel_event.set()
+
+    def schedule(self, event=None):
+        """Restart the delay before running the preview detection"""
+        if self.active:
+            self._timer.start()
+
+    def _start(self):
+        """Send the current frame detection request to the runner"""
+        try:
+            state = self.widget.state()
+        except ValueError:
+            # parameters being edited
+            return
+        input_image_layer = state['inputs']['image']
+        if input_image_layer not in self.viewer.layers:
+            return
+        layer = self.viewer.layers[input_image_layer]
+        image = layer.data
+        if layer.multiscale:
+            image = image[0]
+        t = self.viewer.dims.current_step[0]
+        if t >= image.shape[0]:
+            return
+
+        try:
+            roi = self.worker.roi_mask(state, image)
+        except Exception as err:
+            self.log.emit(f'preview failed: {err}')
+            return
+        try:
+            detector = self.worker.engine(state, layer.scale, image.shape,
+                                          image.dtype, roi)
+        except (ValueError, ZeroDivisionError, OverflowError) as err:
+            # parameters being edited, like a sigma ratio of 1
+            self.log.emit(f'preview failed: {err}')
+            return
+        self._size = self.worker.size(state['parameters'])
+        self._scale = layer.scale
+        # cancel the running request, the new one has its own event
+        self._cancel()
+        self._cancel_event = threading.Event()
+        self.request.emit(self._generation, detector, image, t, layer.scale,
+                          self._cancel_event)
+
+    def _on_done(self, generation, data):
+        """Display the detections of the last request"""
+        if generation != self._generation or not self.active:
+            return
+        if self.layer_name in self.viewer.layers:
+            layer = self.viewer.layers[self.layer_name]
+            layer.data = data
+            layer.size = self._size
+        else:
+            self.viewer.add_points(data, scale=self._scale,
+                                   size=self._size, name=self.layer_name)
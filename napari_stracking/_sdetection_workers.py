@@ -1,16 +1,519 @@
 from qtpy.QtWidgets import (QWidget, QGridLayout, QLabel, QLineEdit,
                             QComboBox, QCheckBox, QVBoxLayout, QHBoxLayout,
                             QPushButton)
+from qtpy.QtCore import Signal
 import numpy as np
 import napari
 from ._splugin import SNapariWorker, SNapariWidget, SProgressObserver
 from ._swidgets import SPropertiesViewer, SPipelineListWidget
+from ._sdetection_engine import (SFrameDetector, scale_space_halo,
+                                 plan_execution, format_bytes)
+from ._sdetection_cache import detection_cache, parameters_key
+from ._sscale_space import (SScaleSpaceDetector, scale_space_cache,
+                            dog_sigmas)
+from ._sseg_detector import SSegCentroidsDetector
+from ._slinking_engine import SOnlineLinker, finished_tracks
+from ._smotion_model import motion_model
+
+from stracking.detectors import DoHDetector
+
+
+# ---------------- Common ----------------
+class SDetectionExecutionWidget(QWidget):
+    """Widget for the execution options shared by the detector plugins"""
+    def __init__(self):
+        super().__init__()
+
+        self._workers_label = QLabel('Workers')
+        self._workers_value = QLineEdit('1')
+
+        self._cache_label = QLabel('Cache size (MB)')
+        self._cache_value = QLineEdit('512')
+
+        self._tile_label = QLabel('Tile size (0 for whole frames)')
+        self._tile_value = QLineEdit('0')
+
+        self._budget_label = QLabel('Memory budget (MB)')
+        self._budget_value = QLineEdit('4096')
+
+        self._memory_label = QLabel()
+        self._memory_label.setWordWrap(True)
+
+        self._online_check = QCheckBox('Online linking')
+        self._link_distance_label = QLabel('Link max distance')
+        self._link_distance_value = QLineEdit('5')
+        self._link_gap_label = QLabel('Link gap')
+        self._link_gap_value = QLineEdit('1')
+        self._link_motion_label = QLabel('Link motion model')
+        self._link_motion_value = QComboBox()
+        self._link_motion_value.addItems(['Brownian', 'Constant velocity',
+                                          'Kalman'])
+        self._online_check.stateChanged.connect(self._on_online_change)
+        self._on_online_change(False)
+
+        layout = QGridLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self._workers_label, 0, 0)
+        layout.addWidget(self._workers_value, 0, 1)
+        layout.addWidget(self._cache_label, 1, 0)
+        layout.addWidget(self._cache_value, 1, 1)
+        layout.addWidget(self._tile_label, 2, 0)
+        layout.addWidget(self._tile_value, 2, 1)
+        layout.addWidget(self._budget_label, 3, 0)
+        layout.addWidget(self._budget_value, 3, 1)
+        layout.addWidget(self._memory_label, 4, 0, 1, 2)
+        layout.addWidget(self._online_check, 5, 0, 1, 2)
+        layout.addWidget(self._link_distance_label, 6, 0)
+        layout.addWidget(self._link_distance_value, 6, 1)
+        layout.addWidget(self._link_gap_label, 7, 0)
+        layout.addWidget(self._link_gap_value, 7, 1)
+        layout.addWidget(self._link_motion_label, 8, 0)
+        layout.addWidget(self._link_motion_value, 8, 1)
+        self.setLayout(layout)
+
+    def _on_online_change(self, value):
+        """Show the linking options only when the online linking is on"""
+        self._link_distance_label.setVisible(bool(value))
+        self._link_distance_value.setVisible(bool(value))
+        self._link_gap_label.setVisible(bool(value))
+        self._link_gap_value.setVisible(bool(value))
+        self._link_motion_label.setVisible(bool(value))
+        self._link_motion_value.setVisible(bool(value))
+
+    def check_inputs(self):
+        """Check the execution options
+
+        Returns
+        -------
+        True if all the inputs are correct, False otherwise
+
+        """
+        try:
+            workers = int(self._workers_value.text())
+            if workers < 1:
+                SNapariWidget.show_error("Workers must be at least 1")
+                return False
+        except ValueError as err:
+            SNapariWidget.show_error("Workers must be an integer")
+            return False
+        try:
+            cache_size = float(self._cache_value.text())
+            if cache_size < 0:
+                SNapariWidget.show_error("Cache size must be positive")
+                return False
+        except ValueError as err:
+            SNapariWidget.show_error("Cache size must be a number")
+            return False
+        try:
+            tile_size = int(self._tile_value.text())
+            if tile_size < 0:
+                SNapariWidget.show_error("Tile size must be positive")
+                return False
+        except ValueError as err:
+            SNapariWidget.show_error("Tile size must be an integer")
+            return False
+        try:
+            budget = float(self._budget_value.text())
+            if budget < 0:
+                SNapariWidget.show_error("Memory budget must be positive")
+                return False
+        except ValueError as err:
+            SNapariWidget.show_error("Memory budget must be a number")
+            return False
+        if not self._online_check.isChecked():
+            return True
+        try:
+            float(self._link_distance_value.text())
+        except ValueError as err:
+            SNapariWidget.show_error("Link max distance must be a number")
+            return False
+        try:
+            link_gap = int(self._link_gap_value.text())
+            if link_gap < 1:
+                SNapariWidget.show_error("Link gap must be at least 1")
+                return False
+        except ValueError as err:
+            SNapariWidget.show_error("Link gap must be an integer")
+            return False
+        return True
+
+    def parameters(self):
+        """Returns the execution options
+
+        The linking options are None when the online linking is off, their
+        hidden fields are not checked
+
+        """
+        online = self._online_check.isChecked()
+        return {'workers': int(self._workers_value.text()),
+                'cache_size': float(self._cache_value.text()),
+                'tile_size': int(self._tile_value.text()),
+                'memory_budget': float(self._budget_value.text()),
+                'online_linking': online,
+                'link_max_distance': float(self._link_distance_value.text())
+                if online else None,
+                'link_gap': int(self._link_gap_value.text())
+                if online else None,
+                'link_motion': self._link_motion_value.currentText()
+                if online else None}
+
+    def set_memory_estimate(self, text):
+        """Display the memory estimate of the detection"""
+        self._memory_label.setText(text)
+
+
+class SDetectorWidget(SNapariWidget):
+    """Common widget for the detector plugins
+
+    It adds the signals used by the live preview: ``changed`` is emitted
+    when any input of the widget is edited and ``preview`` when the live
+    preview check box is toggled
+
+    """
+    changed = Signal()
+    preview = Signal(bool)
+
+    def __init__(self):
+        super().__init__()
+        self._preview_check = QCheckBox('Live preview')
+        self._preview_check.stateChanged.connect(
+            lambda value: self.preview.emit(bool(value)))
+        self._roi_layer_box = QComboBox()
+        self._roi_layer_box.addItem('None')
+
+    def update_roi_list(self):
+        """Refresh the list of the layers usable as region of interest"""
+        current_text = self._roi_layer_box.currentText()
+        self._roi_layer_box.clear()
+        self._roi_layer_box.addItem('None')
+        for layer in self.viewer.layers:
+            if isinstance(layer, (napari.layers.Shapes,
+                                  napari.layers.Labels)):
+                self._roi_layer_box.addItem(layer.name)
+        self._roi_layer_box.setCurrentText(current_text)
+
+    def roi_layer(self):
+        """Name of the region of interest layer, None if not set"""
+        if self._roi_layer_box.currentText() in ('', 'None'):
+            return None
+        return self._roi_layer_box.currentText()
+
+    def connect_changes(self):
+        """Emit the changed signal when any input of the widget is edited"""
+        for edit in self.findChildren(QLineEdit):
+            edit.textChanged.connect(self.changed)
+        for box in self.findChildren(QComboBox):
+            box.currentTextChanged.connect(self.changed)
+
+    def set_memory_estimate(self, text):
+        """Display the memory estimate of the detection"""
+        self._execution_widget.set_memory_estimate(text)
+
+
+class SShapesMask:
+    """Mask of a Shapes layer with a time axis, rasterized frame by frame
+
+    Indexing the mask with a frame index rasterizes the shapes of this
+    frame only, so the mask of a movie is never allocated
+
+    Parameters
+    ----------
+    layer: Shapes
+        The shapes layer, with the time in the first axis
+    shape: tuple
+        Shape of the image (time included)
+
+    """
+    def __init__(self, layer, shape):
+        self.shape = tuple(shape)
+        self.ndim = len(self.shape)
+        self._data = [np.asarray(data) for data in layer.data]
+        self._types = list(layer.shape_type)
+        self._frames = np.array([int(np.rint(data[0, 0]))
+                                 for data in self._data], dtype=int)
+
+    def __getitem__(self, t):
+        shapes = np.flatnonzero(self._frames == t)
+        if shapes.shape[0] == 0:
+            return np.zeros(self.shape[1:], dtype=bool)
+        frame_layer = napari.layers.Shapes(
+            [self._data[i][:, 1:] for i in shapes],
+            shape_type=[self._types[i] for i in shapes])
+        return frame_layer.to_labels(labels_shape=self.shape[1:]) > 0
+
+
+class SDetectorWorker(SNapariWorker):
+    """Common worker for the detector plugins
+
+    The subclasses create the detector from the widget parameters with the
+    ``detector`` method. The worker runs it frame by frame using the
+    widget execution options.
+
+    """
+    def __init__(self, napari_viewer, widget):
+        super().__init__(napari_viewer, widget)
+
+        self.observer = SProgressObserver(self.cancel_event)
+        self.observer.progress_signal.connect(self.progress)
+        self.observer.notify_signal.connect(self.log)
+
+        self.name = 'Detections'
+        self._out_data = None
+        self._out_tracks = None
+
+    def detector(self, state_params):
+        """Create the detector
+
+        Parameters
+        ----------
+        state_params: dict
+            Parameters of the widget state
+
+        Returns
+        -------
+        detector: SDetector
+
+        """
+        raise NotImplementedError()
+
+    def size(self, state_params):
+        """Size of the points displayed in the output layer"""
+        return state_params['max_sigma']
+
+    def halo(self, state_params):
+        """Halo of the tiles needed by the detector
 
-from stracking.detectors import (DoGDetector, DoHDetector, LoGDetector, SSegDetector)
+        Returns
+        -------
+        halo: int
+            Width of the tiles halo in pixels, or None if the detector
+            cannot process tiles
+
+        """
+        return scale_space_halo(state_params['max_sigma'])
+
+    def voxel_bytes(self, state_params):
+        """Memory needed by the detector per voxel of a frame
+
+        It counts the float copy of the frame, the scale space and the
+        temporary images of the detector
+
+        """
+        return 8 * (2 * state_params['num_sigma'] + 3)
+
+    def plan(self, state, shape, dtype):
+        """Execution options fitting the memory budget
+
+        Parameters
+        ----------
+        state: dict
+            State of the widget
+        shape: tuple
+            Shape of the image (time included)
+        dtype: numpy.dtype
+            Type of the image
+
+        Returns
+        -------
+        workers: int
+            Number of workers to use
+        tile_size: int
+            Tile size to use, None to process whole frames
+        estimate: int
+            Estimated peak memory in bytes
+
+        """
+        state_params = state['parameters']
+        execution = state['execution']
+        tile_size = None
+        halo = self.halo(state_params)
+        if execution['tile_size'] > 0 and halo is not None:
+            tile_size = execution['tile_size']
+        voxel_bytes = self.voxel_bytes(state_params) + np.dtype(dtype).itemsize
+        budget = int(execution['memory_budget'] * 1024 * 1024)
+        return plan_execution(shape[1:], voxel_bytes, budget,
+                              execution['workers'], tile_size, halo)
+
+    def memory_estimate(self, state, shape, dtype):
+        """Describe the estimated memory of the detection
+
+        Returns
+        -------
+        text: str
+            The estimate and how the execution is adapted to the budget
+
+        """
+        execution = state['execution']
+        workers, tile_size, estimate = self.plan(state, shape, dtype)
+        text = f'Estimated memory: {format_bytes(estimate)}'
+        if tile_size is not None and tile_size != execution['tile_size']:
+            text += f' (over budget: tiles of {tile_size} px'
+            text += f', {workers} workers)'
+        elif workers != execution['workers']:
+            text += f' (over budget: {workers} workers)'
+        budget = execution['memory_budget'] * 1024 * 1024
+        if 0 < budget < estimate:
+            text += ', the budget cannot be met'
+        return text
+
+    def roi_mask(self, state, image):
+        """Mask of the region of interest layer
+
+        Parameters
+        ----------
+        state: dict
+            State of the widget
+        image: array like
+            Image to process
+
+        Returns
+        -------
+        mask: array like
+            Mask with the shape of a frame, or of the image for regions
+            changing in time (positive inside). The regions changing in
+            time are read frame by frame (see ``SFrameDetector``), so
+            they never take the memory of the whole movie. None if no ROI
+            layer is selected
+
+        """
+        roi_name = state['inputs'].get('roi')
+        if roi_name is None or roi_name not in self.viewer.layers:
+            return None
+        layer = self.viewer.layers[roi_name]
+        if isinstance(layer, napari.layers.Labels):
+            mask = layer.data[0] if layer.multiscale else layer.data
+            if mask.ndim == image.ndim - 1:
+                mask = np.asarray(mask) > 0
+        elif layer.ndim == image.ndim:
+            mask = SShapesMask(layer, image.shape)
+        else:
+            mask = layer.to_labels(labels_shape=image.shape[1:]) > 0
+        if mask.shape not in (image.shape, image.shape[1:]):
+            raise Exception(f'The ROI layer {roi_name} shape does not match '
+                            f'the image shape')
+        return mask
+
+    def engine(self, state, scale, shape=None, dtype=None, roi=None):
+        """Create the frame by frame detection engine
+
+        Parameters
+        ----------
+        state: dict
+            State of the widget
+        scale: tuple or list
+            Scale of the image layer
+        shape: tuple
+            Shape of the image. When given with dtype, the execution
+            options are adapted to the memory budget
+        dtype: numpy.dtype
+            Type of the image
+        roi: ndarray
+            Mask of the region of interest (see ``roi_mask``)
+
+        Returns
+        -------
+        detector: SFrameDetector
+
+        """
+        state_params = state['parameters']
+        execution = dict(state['execution'])
+        cache = None
+        cache_key = None
+        if execution['cache_size'] > 0:
+            cache = detection_cache
+            cache.resize(int(execution['cache_size'] * 1024 * 1024))
+            detector_params = dict(state_params)
+            detector_params.pop('current_frame')
+            cache_key = parameters_key(self.name, detector_params, scale)
+        tile_size = None
+        halo = self.halo(state_params)
+        if execution['tile_size'] > 0:
+            if halo is None:
+                self.log.emit(f'{self.name}: tiling not available, the '
+                              f'frames are processed as a whole')
+            else:
+                tile_size = execution['tile_size']
+        if shape is not None and dtype is not None:
+            workers, planned_tile, estimate = self.plan(state, shape, dtype)
+            if planned_tile != tile_size:
+                self.log.emit(f'estimated memory over budget: using tiles '
+                              f'of {planned_tile} px and {workers} workers')
+            elif workers != execution['workers']:
+                self.log.emit(f'estimated memory over budget: using '
+                              f'{workers} workers')
+            execution['workers'] = workers
+            tile_size = planned_tile
+        return SFrameDetector(self.detector(state_params),
+                              workers=execution['workers'],
+                              cache=cache, cache_key=cache_key,
+                              tile_size=tile_size, halo=halo or 0,
+                              overlap=state_params.get('overlap'), roi=roi)
+
+    def run(self):
+        """Execute the processing"""
+        state = self.widget.state()
+        input_image_layer = state['inputs']['image']
+        state_params = state['parameters']
+
+        image = self.viewer.layers[input_image_layer].data
+        scale = self.viewer.layers[input_image_layer].scale
+        if self.viewer.layers[input_image_layer].multiscale:
+            image = image[0]
+
+        detector = self.engine(state, scale, image.shape, image.dtype,
+                               self.roi_mask(state, image))
+        detector.add_observer(self.observer)
+
+        frames = None
+        if state_params['current_frame']:
+            frames = [self.viewer.dims.current_step[0]]
+        linker = None
+        tracks = []
+        if state['execution']['online_linking']:
+            linker = SOnlineLinker(state['execution']['link_max_distance'],
+                                   state['execution']['link_gap'],
+                                   scale=scale,
+                                   motion=motion_model(
+                                       state['execution']['link_motion']))
+
+            def link_frame(t, data, properties):
+                finished = linker.push(t, data, properties)
+                if len(finished) > 0:
+                    self.log.emit(f'frame {t}: {len(finished)} tracks '
+                                  f'finished')
+                tracks.extend(finished)
+
+            detector.frame_callback = link_frame
+        particles = detector.run(image, scale, frames)
+
+        self._out_data = {'data': particles.data,
+                          'properties': particles.properties, 'scale': scale,
+                          'size': self.size(state_params),
+                          'name': self.name}
+        self._out_tracks = None
+        if linker is not None:
+            tracks.extend(linker.flush())
+            self._out_tracks = finished_tracks(tracks, image.ndim, scale)
+            self.log.emit(f'{len(tracks)} tracks linked online')
+
+        self.finished.emit()
+
+    def set_outputs(self):
+        """Set the plugin outputs to napari layers"""
+        self.viewer.add_points(self._out_data['data'],
+                               properties=self._out_data['properties'],
+                               scale=self._out_data['scale'],
+                               size=self._out_data['size'],
+                               name=self._out_data['name'])
+        if self._out_tracks is not None and len(self._out_tracks.data) > 0:
+            self.viewer.add_tracks(self._out_tracks.data,
+                                   name=self._out_data['name'] + ' tracks',
+                                   scale=self._out_tracks.scale,
+                                   properties=self._out_tracks.properties)
 
 
 # ---------------- DoG ----------------
-class SDogWidget(SNapariWidget):
+class SDogWidget(SDetectorWidget):
     """Widget for the DoG detector plugins"""
     def __init__(self, napari_viewer):
         super().__init__()
@@ -42,25 +545,32 @@ class SDogWidget(SNapariWidget):
         self._overlap_label = QLabel('Overlap')
         self._overlap_value = QLineEdit('0.5')
 
+        self._execution_widget = SDetectionExecutionWidget()
+
         layout = QGridLayout()
         layout.setContentsMargins(0, 0, 0, 0)
 
         layout.addWidget(QLabel('Image layer'), 0, 0)
         layout.addWidget(self._input_layer_box, 0, 1)
-        layout.addWidget(self._advanced_check, 1, 0, 1, 2)
-
-        layout.addWidget(self._current_frame_check, 2, 0, 1, 2)
-        layout.addWidget(self._min_sigma_label, 3, 0)
-        layout.addWidget(self._min_sigma_value, 3, 1)
-        layout.addWidget(self._max_sigma_label, 4, 0)
-        layout.addWidget(self._max_sigma_value, 4, 1)
-        layout.addWidget(self._threshold_label, 5, 0)
-        layout.addWidget(self._threshold_value, 5, 1)
-        layout.addWidget(self._sigma_ratio_label, 6, 0)
-        layout.addWidget(self._sigma_ratio_value, 6, 1)
-        layout.addWidget(self._overlap_label, 7, 0)
-        layout.addWidget(self._overlap_value, 7, 1)
+        layout.addWidget(QLabel('ROI layer'), 1, 0)
+        layout.addWidget(self._roi_layer_box, 1, 1)
+        layout.addWidget(self._advanced_check, 2, 0)
+        layout.addWidget(self._preview_check, 2, 1)
+
+        layout.addWidget(self._current_frame_check, 3, 0, 1, 2)
+        layout.addWidget(self._min_sigma_label, 4, 0)
+        layout.addWidget(self._min_sigma_value, 4, 1)
+        layout.addWidget(self._max_sigma_label, 5, 0)
+        layout.addWidget(self._max_sigma_value, 5, 1)
+        layout.addWidget(self._threshold_label, 6, 0)
+        layout.addWidget(self._threshold_value, 6, 1)
+        layout.addWidget(self._sigma_ratio_label, 7, 0)
+        layout.addWidget(self._sigma_ratio_value, 7, 1)
+        layout.addWidget(self._overlap_label, 8, 0)
+        layout.addWidget(self._overlap_value, 8, 1)
+        layout.addWidget(self._execution_widget, 9, 0, 1, 2)
         self.setLayout(layout)
+        self.connect_changes()
         self.toggle_advanced(False)
 
     def init_layer_list(self):
@@ -68,6 +578,7 @@ class SDogWidget(SNapariWidget):
         for layer in self.viewer.layers:
             if isinstance(layer, napari.layers.image.image.Image):
                 self._input_layer_box.addItem(layer.name)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             # print('disable the run button')
             self.enable.emit(False)
@@ -93,6 +604,7 @@ class SDogWidget(SNapariWidget):
                 self._input_layer_box.addItem(layer.name)
         if is_current_item_still_here:
             self._input_layer_box.setCurrentText(current_text)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             self.enable.emit(False)
         else:
@@ -129,11 +641,12 @@ class SDogWidget(SNapariWidget):
         except ValueError as err:
             self.show_error(f"Overlap input must be a number")
             return False
-        return True
+        return self._execution_widget.check_inputs()
 
     def state(self) -> dict:
         return {'name': 'SDoGDetector',
-                'inputs': {'image': self._input_layer_box.currentText()},
+                'inputs': {'image': self._input_layer_box.currentText(),
+                           'roi': self.roi_layer()},
                 'parameters': {'min_sigma': float(self._min_sigma_value.text()),
                                'max_sigma': float(self._max_sigma_value.text()),
                                'threshold': float(self._threshold_value.text()),
@@ -141,6 +654,7 @@ class SDogWidget(SNapariWidget):
                                'overlap': float(self._overlap_value.text()),
                                'current_frame': self._current_frame_check.isChecked()
                                },
+                'execution': self._execution_widget.parameters(),
                 'outputs': ['points', 'DoG detections']
                 }
 
@@ -151,68 +665,49 @@ class SDogWidget(SNapariWidget):
             self._sigma_ratio_value.setVisible(True)
             self._overlap_label.setVisible(True)
             self._overlap_value.setVisible(True)
+            self._execution_widget.setVisible(True)
         else:
             self._sigma_ratio_label.setVisible(False)
             self._sigma_ratio_value.setVisible(False)
             self._overlap_label.setVisible(False)
             self._overlap_value.setVisible(False)
+            self._execution_widget.setVisible(False)
         self.advanced.emit(value)
         self.is_advanced = value
 
 
-class SDogWorker(SNapariWorker):
+class SDogWorker(SDetectorWorker):
     """Worker for the DoG detector plugins"""
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
-
-        self.observer = SProgressObserver()
-        self.observer.progress_signal.connect(self.progress)
-        self.observer.notify_signal.connect(self.log)
-
-        self._out_data = None
-
-    def run(self):
-        """Execute the processing"""
-        state = self.widget.state()
-        input_image_layer = state['inputs']['image']
-        state_params = state['parameters']
-
-        min_sigma = state_params['min_sigma']
-        max_sigma = state_params['max_sigma']
-        threshold = state_params['threshold']
-        sigma_ratio = state_params['sigma_ratio']
-        overlap = state_params['overlap']
-        detector = DoGDetector(min_sigma=min_sigma, max_sigma=max_sigma,
-                               threshold=threshold, sigma_ratio=sigma_ratio,
-                               overlap=overlap)
-        detector.add_observer(self.observer)
-
-        image = self.viewer.layers[input_image_layer].data
-        scale = self.viewer.layers[input_image_layer].scale
-
-        if state_params['current_frame']:
-            t = self.viewer.dims.current_step[0]
-            particles = detector.run(np.expand_dims(image[t, ...], 0), scale)
-            particles.data[:, 0] = t
-        else:
-            particles = detector.run(image, scale)
-
-        self._out_data = {'data': particles.data, 'scale': scale,
-                          'size': max_sigma,
-                          'name': 'DoG detections'}
-
-        self.finished.emit()
-
-    def set_outputs(self):
-        """Set the plugin outputs to napari layers"""
-        self.viewer.add_points(self._out_data['data'],
-                               scale=self._out_data['scale'],
-                               size=self._out_data['size'],
-                               name='DoG detections')
+        self.name = 'DoG detections'
+
+    def detector(self, state_params):
+        return SScaleSpaceDetector('dog',
+                                   min_sigma=state_params['min_sigma'],
+                                   max_sigma=state_params['max_sigma'],
+                                   threshold=state_params['threshold'],
+                                   sigma_ratio=state_params['sigma_ratio'],
+                                   overlap=state_params['overlap'],
+                                   cache=scale_space_cache)
+
+    def halo(self, state_params):
+        # the largest DoG kernel can exceed max_sigma
+        sigmas = dog_sigmas(state_params['min_sigma'],
+                            state_params['max_sigma'],
+                            state_params['sigma_ratio'])
+        return scale_space_halo(sigmas[-1])
+
+    def voxel_bytes(self, state_params):
+        # scale space of len(sigmas) - 1 differences and its maximum filter
+        sigmas = dog_sigmas(state_params['min_sigma'],
+                            state_params['max_sigma'],
+                            state_params['sigma_ratio'])
+        return 8 * (2 * (len(sigmas) - 1) + 3)
 
 
 # ----------------- LoG -------------------
-class SLogWidget(SNapariWidget):
+class SLogWidget(SDetectorWidget):
     """Widget for the LoG detector plugins"""
     def __init__(self, napari_viewer):
         super().__init__()
@@ -248,27 +743,34 @@ class SLogWidget(SNapariWidget):
         self._log_scale_value = QComboBox()
         self._log_scale_value.addItems(['False', 'True'])
 
+        self._execution_widget = SDetectionExecutionWidget()
+
         layout = QGridLayout()
         layout.setContentsMargins(0, 0, 0, 0)
 
         layout.addWidget(QLabel('Image layer'), 0, 0)
         layout.addWidget(self._input_layer_box, 0, 1)
-        layout.addWidget(self._advanced_check, 1, 0, 1, 2)
-
-        layout.addWidget(self._current_frame_check, 2, 0, 1, 2)
-        layout.addWidget(self._min_sigma_label, 3, 0)
-        layout.addWidget(self._min_sigma_value, 3, 1)
-        layout.addWidget(self._max_sigma_label, 4, 0)
-        layout.addWidget(self._max_sigma_value, 4, 1)
-        layout.addWidget(self._num_sigma_label, 5, 0)
-        layout.addWidget(self._num_sigma_value, 5, 1)
-        layout.addWidget(self._threshold_label, 6, 0)
-        layout.addWidget(self._threshold_value, 6, 1)
-        layout.addWidget(self._overlap_label, 7, 0)
-        layout.addWidget(self._overlap_value, 7, 1)
-        layout.addWidget(self._log_scale_label, 8, 0)
-        layout.addWidget(self._log_scale_value, 8, 1)
+        layout.addWidget(QLabel('ROI layer'), 1, 0)
+        layout.addWidget(self._roi_layer_box, 1, 1)
+        layout.addWidget(self._advanced_check, 2, 0)
+        layout.addWidget(self._preview_check, 2, 1)
+
+        layout.addWidget(self._current_frame_check, 3, 0, 1, 2)
+        layout.addWidget(self._min_sigma_label, 4, 0)
+        layout.addWidget(self._min_sigma_value, 4, 1)
+        layout.addWidget(self._max_sigma_label, 5, 0)
+        layout.addWidget(self._max_sigma_value, 5, 1)
+        layout.addWidget(self._num_sigma_label, 6, 0)
+        layout.addWidget(self._num_sigma_value, 6, 1)
+        layout.addWidget(self._threshold_label, 7, 0)
+        layout.addWidget(self._threshold_value, 7, 1)
+        layout.addWidget(self._overlap_label, 8, 0)
+        layout.addWidget(self._overlap_value, 8, 1)
+        layout.addWidget(self._log_scale_label, 9, 0)
+        layout.addWidget(self._log_scale_value, 9, 1)
+        layout.addWidget(self._execution_widget, 10, 0, 1, 2)
         self.setLayout(layout)
+        self.connect_changes()
         self.toggle_advanced(False)
 
     def init_layer_list(self):
@@ -276,6 +778,7 @@ class SLogWidget(SNapariWidget):
         for layer in self.viewer.layers:
             if isinstance(layer, napari.layers.image.image.Image):
                 self._input_layer_box.addItem(layer.name)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             # print('disable the run button')
             self.enable.emit(False)
@@ -301,6 +804,7 @@ class SLogWidget(SNapariWidget):
                 self._input_layer_box.addItem(layer.name)
         if is_current_item_still_here:
             self._input_layer_box.setCurrentText(current_text)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             self.enable.emit(False)
         else:
@@ -337,11 +841,12 @@ class SLogWidget(SNapariWidget):
         except ValueError as err:
             self.show_error(f"Overlap input must be a number")
             return False
-        return True
+        return self._execution_widget.check_inputs()
 
     def state(self) -> dict:
         return {'name': 'SDoGDetector',
-                'inputs': {'image': self._input_layer_box.currentText()},
+                'inputs': {'image': self._input_layer_box.currentText(),
+                           'roi': self.roi_layer()},
                 'parameters': {'min_sigma': float(self._min_sigma_value.text()),
                                'max_sigma': float(self._max_sigma_value.text()),
                                'num_sigma': int(self._num_sigma_value.text()),
@@ -350,6 +855,7 @@ class SLogWidget(SNapariWidget):
                                'overlap': float(self._overlap_value.text()),
                                'current_frame': self._current_frame_check.isChecked()
                                },
+                'execution': self._execution_widget.parameters(),
                 'outputs': ['points', 'LoG detections']
                 }
 
@@ -360,74 +866,39 @@ class SLogWidget(SNapariWidget):
             self._overlap_value.setVisible(True)
             self._log_scale_label.setVisible(True)
             self._log_scale_value.setVisible(True)
+            self._execution_widget.setVisible(True)
         else:
             self._overlap_label.setVisible(False)
             self._overlap_value.setVisible(False)
             self._log_scale_label.setVisible(False)
             self._log_scale_value.setVisible(False)
+            self._execution_widget.setVisible(False)
         self.advanced.emit(value)
         self.is_advanced = value
 
 
-class SLogWorker(SNapariWorker):
+class SLogWorker(SDetectorWorker):
     """Worker for the LoG detector plugins"""
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
+        self.name = 'LoG detections'
 
-        self.observer = SProgressObserver()
-        self.observer.progress_signal.connect(self.progress)
-        self.observer.notify_signal.connect(self.log)
-
-        self._out_data = None
-
-    def run(self):
-        """Execute the processing"""
-        state = self.widget.state()
-        if state is None:
-            return
-        input_image_layer = state['inputs']['image']
-        state_params = state['parameters']
-
-        min_sigma = state_params['min_sigma']
-        max_sigma = state_params['max_sigma']
-        threshold = state_params['threshold']
-        num_sigma = state_params['num_sigma']
-        overlap = state_params['overlap']
-        log_txt = state_params['log_scale']
+    def detector(self, state_params):
         log_scale = False
-        if log_txt == 'True':
+        if state_params['log_scale'] == 'True':
             log_scale = True
-
-        detector = LoGDetector(min_sigma=min_sigma, max_sigma=max_sigma,
-                               num_sigma=num_sigma, threshold=threshold,
-                               overlap=overlap, log_scale=log_scale)
-        detector.add_observer(self.observer)
-
-        image = self.viewer.layers[input_image_layer].data
-        scale = self.viewer.layers[input_image_layer].scale
-        if state_params['current_frame']:
-            t = self.viewer.dims.current_step[0]
-            particles = detector.run(np.expand_dims(image[t, ...], 0), scale)
-            particles.data[:, 0] = t
-        else:
-            particles = detector.run(image, scale)
-
-        self._out_data = {'data': particles.data, 'scale': scale,
-                          'size': max_sigma,
-                          'name': 'LoG detections'}
-
-        self.finished.emit()
-
-    def set_outputs(self):
-        """Set the plugin outputs to napari layers"""
-        self.viewer.add_points(self._out_data['data'],
-                               scale=self._out_data['scale'],
-                               size=self._out_data['size'],
-                               name='LoG detections')
+        return SScaleSpaceDetector('log',
+                                   min_sigma=state_params['min_sigma'],
+                                   max_sigma=state_params['max_sigma'],
+                                   num_sigma=state_params['num_sigma'],
+                                   threshold=state_params['threshold'],
+                                   overlap=state_params['overlap'],
+                                   log_scale=log_scale,
+                                   cache=scale_space_cache)
 
 
 # ------------------ DoH -------------------
-class SDohWidget(SNapariWidget):
+class SDohWidget(SDetectorWidget):
     """Widget for the DoH detector plugins"""
     def __init__(self, napari_viewer):
         super().__init__()
@@ -463,27 +934,34 @@ class SDohWidget(SNapariWidget):
         self._log_scale_value = QComboBox()
         self._log_scale_value.addItems(['False', 'True'])
 
+        self._execution_widget = SDetectionExecutionWidget()
+
         layout = QGridLayout()
         layout.setContentsMargins(0, 0, 0, 0)
 
         layout.addWidget(QLabel('Image layer'), 0, 0)
         layout.addWidget(self._input_layer_box, 0, 1)
-        layout.addWidget(self._advanced_check, 1, 0, 1, 2)
-
-        layout.addWidget(self._current_frame_check, 2, 0, 1, 2)
-        layout.addWidget(self._min_sigma_label, 3, 0)
-        layout.addWidget(self._min_sigma_value, 3, 1)
-        layout.addWidget(self._max_sigma_label, 4, 0)
-        layout.addWidget(self._max_sigma_value, 4, 1)
-        layout.addWidget(self._num_sigma_label, 5, 0)
-        layout.addWidget(self._num_sigma_value, 5, 1)
-        layout.addWidget(self._threshold_label, 6, 0)
-        layout.addWidget(self._threshold_value, 6, 1)
-        layout.addWidget(self._overlap_label, 7, 0)
-        layout.addWidget(self._overlap_value, 7, 1)
-        layout.addWidget(self._log_scale_label, 8, 0)
-        layout.addWidget(self._log_scale_value, 8, 1)
+        layout.addWidget(QLabel('ROI layer'), 1, 0)
+        layout.addWidget(self._roi_layer_box, 1, 1)
+        layout.addWidget(self._advanced_check, 2, 0)
+        layout.addWidget(self._preview_check, 2, 1)
+
+        layout.addWidget(self._current_frame_check, 3, 0, 1, 2)
+        layout.addWidget(self._min_sigma_label, 4, 0)
+        layout.addWidget(self._min_sigma_value, 4, 1)
+        layout.addWidget(self._max_sigma_label, 5, 0)
+        layout.addWidget(self._max_sigma_value, 5, 1)
+        layout.addWidget(self._num_sigma_label, 6, 0)
+        layout.addWidget(self._num_sigma_value, 6, 1)
+        layout.addWidget(self._threshold_label, 7, 0)
+        layout.addWidget(self._threshold_value, 7, 1)
+        layout.addWidget(self._overlap_label, 8, 0)
+        layout.addWidget(self._overlap_value, 8, 1)
+        layout.addWidget(self._log_scale_label, 9, 0)
+        layout.addWidget(self._log_scale_value, 9, 1)
+        layout.addWidget(self._execution_widget, 10, 0, 1, 2)
         self.setLayout(layout)
+        self.connect_changes()
         self.toggle_advanced(False)
 
     def init_layer_list(self):
@@ -491,6 +969,7 @@ class SDohWidget(SNapariWidget):
         for layer in self.viewer.layers:
             if isinstance(layer, napari.layers.image.image.Image):
                 self._input_layer_box.addItem(layer.name)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             # print('disable the run button')
             self.enable.emit(False)
@@ -516,6 +995,7 @@ class SDohWidget(SNapariWidget):
                 self._input_layer_box.addItem(layer.name)
         if is_current_item_still_here:
             self._input_layer_box.setCurrentText(current_text)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             self.enable.emit(False)
         else:
@@ -552,11 +1032,12 @@ class SDohWidget(SNapariWidget):
         except ValueError as err:
             self.show_error(f"Overlap input must be a number")
             return False
-        return True
+        return self._execution_widget.check_inputs()
 
     def state(self) -> dict:
         return {'name': 'SDoGDetector',
-                'inputs': {'image': self._input_layer_box.currentText()},
+                'inputs': {'image': self._input_layer_box.currentText(),
+                           'roi': self.roi_layer()},
                 'parameters': {'min_sigma': float(self._min_sigma_value.text()),
                                'max_sigma': float(self._max_sigma_value.text()),
                                'num_sigma': int(self._num_sigma_value.text()),
@@ -565,6 +1046,7 @@ class SDohWidget(SNapariWidget):
                                'overlap': float(self._overlap_value.text()),
                                'current_frame': self._current_frame_check.isChecked()
                                },
+                'execution': self._execution_widget.parameters(),
                 'outputs': ['points', 'LoG detections']
                 }
 
@@ -575,72 +1057,37 @@ class SDohWidget(SNapariWidget):
             self._overlap_value.setVisible(True)
             self._log_scale_label.setVisible(True)
             self._log_scale_value.setVisible(True)
+            self._execution_widget.setVisible(True)
         else:
             self._overlap_label.setVisible(False)
             self._overlap_value.setVisible(False)
             self._log_scale_label.setVisible(False)
             self._log_scale_value.setVisible(False)
+            self._execution_widget.setVisible(False)
         self.advanced.emit(value)
         self.is_advanced = value
 
 
-class SDohWorker(SNapariWorker):
+class SDohWorker(SDetectorWorker):
     """Worker for the DoH detector plugins"""
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
+        self.name = 'DoH detections'
 
-        self.observer = SProgressObserver()
-        self.observer.progress_signal.connect(self.progress)
-        self.observer.notify_signal.connect(self.log)
-
-        self._out_data = None
-
-    def run(self):
-        """Execute the processing"""
-        state = self.widget.state()
-        input_image_layer = state['inputs']['image']
-        state_params = state['parameters']
-
-        min_sigma = state_params['min_sigma']
-        max_sigma = state_params['max_sigma']
-        threshold = state_params['threshold']
-        num_sigma = state_params['num_sigma']
-        overlap = state_params['overlap']
-        log_txt = state_params['log_scale']
+    def detector(self, state_params):
         log_scale = False
-        if log_txt == 'True':
+        if state_params['log_scale'] == 'True':
             log_scale = True
-        detector = DoHDetector(min_sigma=min_sigma, max_sigma=max_sigma,
-                               num_sigma=num_sigma, threshold=threshold,
-                               overlap=overlap, log_scale=log_scale)
-        detector.add_observer(self.observer)
-
-        image = self.viewer.layers[input_image_layer].data
-        scale = self.viewer.layers[input_image_layer].scale
-
-        if state_params['current_frame']:
-            t = self.viewer.dims.current_step[0]
-            particles = detector.run(np.expand_dims(image[t, ...], 0), scale)
-            particles.data[:, 0] = t
-        else:
-            particles = detector.run(image, scale)
-
-        self._out_data = {'data': particles.data, 'scale': scale,
-                          'size': max_sigma,
-                          'name': 'DoH detections'}
-
-        self.finished.emit()
-
-    def set_outputs(self):
-        """Set the plugin outputs to napari layers"""
-        self.viewer.add_points(self._out_data['data'],
-                               scale=self._out_data['scale'],
-                               size=self._out_data['size'],
-                               name='DoH detections')
+        return DoHDetector(min_sigma=state_params['min_sigma'],
+                           max_sigma=state_params['max_sigma'],
+                           num_sigma=state_params['num_sigma'],
+                           threshold=state_params['threshold'],
+                           overlap=state_params['overlap'],
+                           log_scale=log_scale)
 
 
 # ------------------ Seg -------------------
-class SSegWidget(SNapariWidget):
+class SSegWidget(SDetectorWidget):
     """Widget for the Seg detector plugins"""
     def __init__(self, napari_viewer):
         super().__init__()
@@ -661,24 +1108,33 @@ class SSegWidget(SNapariWidget):
         self._type_value = QComboBox()
         self._type_value.addItems(['Labels', 'Mask'])
 
+        self._execution_widget = SDetectionExecutionWidget()
+
         layout = QGridLayout()
         layout.setContentsMargins(0, 0, 0, 0)
 
         layout.addWidget(QLabel('Image layer'), 0, 0)
         layout.addWidget(self._input_layer_box, 0, 1)
-        layout.addWidget(self._advanced_check, 1, 0, 1, 2)
-
-        layout.addWidget(self._current_frame_check, 2, 0, 1, 2)
-        layout.addWidget(self._type_label, 8, 0)
-        layout.addWidget(self._type_value, 8, 1)
+        layout.addWidget(QLabel('ROI layer'), 1, 0)
+        layout.addWidget(self._roi_layer_box, 1, 1)
+        layout.addWidget(self._advanced_check, 2, 0)
+        layout.addWidget(self._preview_check, 2, 1)
+
+        layout.addWidget(self._current_frame_check, 3, 0, 1, 2)
+        layout.addWidget(self._type_label, 9, 0)
+        layout.addWidget(self._type_value, 9, 1)
+        layout.addWidget(self._execution_widget, 10, 0, 1, 2)
         self.setLayout(layout)
+        self.connect_changes()
         self.toggle_advanced(False)
 
     def init_layer_list(self):
         """Initialize the layers lists"""
         for layer in self.viewer.layers:
-            if isinstance(layer, napari.layers.image.image.Image):
+            if isinstance(layer, (napari.layers.image.image.Image,
+                                  napari.layers.Labels)):
                 self._input_layer_box.addItem(layer.name)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             self.enable.emit(False)
         else:
@@ -697,78 +1153,59 @@ class SSegWidget(SNapariWidget):
         self._input_layer_box.clear()
         is_current_item_still_here = False
         for layer in self.viewer.layers:
-            if isinstance(layer, napari.layers.image.image.Image):
+            if isinstance(layer, (napari.layers.image.image.Image,
+                                  napari.layers.Labels)):
                 if layer.name == current_text:
                     is_current_item_still_here = True
                 self._input_layer_box.addItem(layer.name)
         if is_current_item_still_here:
             self._input_layer_box.setCurrentText(current_text)
+        self.update_roi_list()
         if self._input_layer_box.count() < 1:
             self.enable.emit(False)
         else:
             self.enable.emit(True)
 
     def check_inputs(self):
-        return True
+        return self._execution_widget.check_inputs()
 
     def state(self) -> dict:
         return {'name': 'SDoGDetector',
-                'inputs': {'image': self._input_layer_box.currentText()},
+                'inputs': {'image': self._input_layer_box.currentText(),
+                           'roi': self.roi_layer()},
                 'parameters': {'type': self._type_value.currentText(),
                                'current_frame': self._current_frame_check.isChecked()
                                },
+                'execution': self._execution_widget.parameters(),
                 'outputs': ['points', 'LoG detections']
                 }
 
     def toggle_advanced(self, value):
         """Change the parameters widget to advanced mode"""
+        self._execution_widget.setVisible(value)
         self.advanced.emit(value)
         self.is_advanced = value
 
 
-class SSegWorker(SNapariWorker):
+class SSegWorker(SDetectorWorker):
     """Worker for the Seg detector plugins"""
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
+        self.name = 'Seg detections'
 
-        self.observer = SProgressObserver()
-        self.observer.progress_signal.connect(self.progress)
-        self.observer.notify_signal.connect(self.log)
-
-        self._out_data = None
-
-    def run(self):
-        """Execute the processing"""
-        state = self.widget.state()
-        input_image_layer = state['inputs']['image']
-        state_params = state['parameters']
-
+    def detector(self, state_params):
         is_mask = False
         if state_params['type'] == 'Mask':
             is_mask = True
+        return SSegCentroidsDetector(is_mask=is_mask)
 
-        detector = SSegDetector(is_mask=is_mask)
-        detector.add_observer(self.observer)
-
-        image = self.viewer.layers[input_image_layer].data
-        scale = self.viewer.layers[input_image_layer].scale
-
-        if state_params['current_frame']:
-            t = self.viewer.dims.current_step[0]
-            particles = detector.run(np.expand_dims(image[t, ...], 0), scale)
-            particles.data[:, 0] = t
-        else:
-            particles = detector.run(image, scale)
+    def size(self, state_params):
+        return 2
 
-        self._out_data = {'data': particles.data, 'scale': scale,
-                          'size': 2,
-                          'name': 'Seg detections'}
+    def halo(self, state_params):
+        # objects are not bounded in size, they cannot be split into tiles
+        return None
 
-        self.finished.emit()
-
-    def set_outputs(self):
-        """Set the plugin outputs to napari layers"""
-        self.viewer.add_points(self._out_data['data'],
-                               scale=self._out_data['scale'],
-                               size=self._out_data['size'],
-                               name='Seg detections')
+    def voxel_bytes(self, state_params):
+        # labels image and regions properties
+        return 16
@@ -0,0 +1,163 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from skimage.registration import phase_cross_correlation
+
+from stracking.containers import SParticles, STracks
+
+from ._sdetection_engine import iter_frames
+from ._slinking_engine import scaled_coordinates
+
+
+def image_drift(image, upsample_factor=10, observer=None):
+    """Estimate the stage drift of a movie by phase correlation
+
+    Each frame is registered to the previous one by FFT phase correlation,
+    and the drift is the cumulated shift. The frames are read one after the
+    other, so lazy arrays are never loaded entirely, and the FFT of each
+    frame is computed once.
+
+    Parameters
+    ----------
+    image: array like
+        2D+t or 3D+t movie
+    upsample_factor: int
+        The shifts are estimated with a precision of 1/upsample_factor
+        pixel
+    observer: SObservable
+        Object notified of the progress, None to skip the notifications
+
+    Returns
+    -------
+    drift: ndarray
+        (T, D) position of each frame relative to the first frame, in
+        pixels
+
+    """
+    if image.ndim not in (3, 4):
+        raise Exception('image_drift: can process only 2D+t or 3D+t images')
+    drift = np.zeros((image.shape[0], image.ndim - 1))
+    previous = None
+    for t, frame in iter_frames(image, list(range(image.shape[0]))):
+        if observer is not None:
+            observer.progress(int(100 * t / image.shape[0]))
+        spectrum = np.fft.fftn(np.asarray(frame, dtype=float))
+        if previous is not None:
+            shift, _, _ = phase_cross_correlation(
+                previous, spectrum, space='fourier',
+                upsample_factor=upsample_factor, normalization=None)
+            drift[t] = drift[t - 1] - shift
+        previous = spectrum
+    return drift
+
+
+def points_drift(data, max_distance, scale=None, observer=None):
+    """Estimate the stage drift from the displacement of the particles
+
+    The displacement between two consecutive frames is the median of the
+    displacements of the particles to their nearest neighbour in the next
+    frame, so the particles own motion averages out when they move in
+    random directions. The drift is the cumulated displacement.
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    max_distance: float
+        Maximum displacement of a particle between two frames (drift
+        included), in the scale units like the linkers max distance
+    scale: tuple or list
+        Scale of the particles layer in each dimension (time included),
+        None for a distance in pixels
+    observer: SObservable
+        Object notified of the progress, None to skip the notifications
+
+    Returns
+    -------
+    drift: ndarray
+        (T, D) position of each frame relative to the first frame, in the
+        particles coordinates (pixels). T is the last frame index plus one
+
+    """
+    data = np.asarray(data, dtype=float)
+    coordinates = scaled_coordinates(data, scale)
+    frames = data[:, 0].astype(int)
+    last = frames.max() + 1 if data.shape[0] > 0 else 0
+    drift = np.zeros((last, data.shape[1] - 1))
+    order = np.argsort(frames, kind='stable')
+    bounds = np.searchsorted(frames[order], np.arange(last + 1))
+    previous = None
+    for t in range(last):
+        if observer is not None:
+            observer.progress(int(100 * t / last))
+        positions = coordinates[order[bounds[t]:bounds[t + 1]]]
+        if t > 0:
+            drift[t] = drift[t - 1]
+        if previous is not None and previous.shape[0] > 0 and \
+                positions.shape[0] > 0:
+            distances, index = cKDTree(positions).query(
+                previous, distance_upper_bound=max_distance)
+            found = np.isfinite(distances)
+            if np.any(found):
+                drift[t] += np.median(
+                    positions[index[found]] - previous[found], axis=0)
+        previous = positions
+    if scale is not None:
+        drift /= np.asarray(scale[1:], dtype=float)
+    return drift
+
+
+def remove_drift(particles, drift):
+    """Particles in the drift corrected coordinates
+
+    Parameters
+    ----------
+    particles: SParticles
+        Particles in the image coordinates
+    drift: ndarray
+        (T, D) drift of each frame (see ``image_drift``)
+
+    Returns
+    -------
+    particles: SParticles
+        Copy of the particles with the drift subtracted
+
+    """
+    data = np.array(particles.data, dtype=float)
+    if data.shape[0] > 0:
+        data[:, 1:] -= _frames_drift(drift, data[:, 0])
+    return SParticles(data=data, properties=particles.properties,
+                      scale=particles.scale)
+
+
+def restore_drift(tracks, drift):
+    """Tracks back in the image coordinates
+
+    Parameters
+    ----------
+    tracks: STracks
+        Tracks in the drift corrected coordinates
+    drift: ndarray
+        (T, D) drift of each frame (see ``image_drift``)
+
+    Returns
+    -------
+    tracks: STracks
+        The tracks, with the drift added to their coordinates
+
+    """
+    if tracks.data is not None and tracks.data.shape[0] > 0:
+        data = np.array(tracks.data, dtype=float)
+        data[:, 2:] += _frames_drift(drift, data[:, 1])
+        tracks = STracks(data=data, properties=tracks.properties,
+                         graph=tracks.graph, features=tracks.features,
+                         scale=tracks.scale)
+    return tracks
+
+
+def _frames_drift(drift, frames):
+    """Drift of each particle from its frame index"""
+    frames = frames.astype(int)
+    if frames.min() < 0 or frames.max() >= drift.shape[0]:
+        raise Exception('The drift is not defined for all the frames of '
+                        'the particles')
+    return drift[frames]
@@ -0,0 +1,1014 @@
+import threading
+
+import numpy as np
+from scipy.fft import next_fast_len, rfft, irfft
+
+
+class SSortedTracks:
+    """Tracks points sorted by track and by frame
+
+    The points of the tracks are sorted once, so the points of each track
+    are a contiguous segment of the arrays, and the tracks features are
+    computed for all the tracks at once with segment reductions.
+
+    Parameters
+    ----------
+    data: ndarray
+        Tracks data [track_id, T, (Z), Y, X]
+    scale: tuple or list
+        Scale of the tracks layer in each dimension (time included), None
+        to compute the features in pixels
+
+    """
+    def __init__(self, data, scale=None):
+        data = np.asarray(data, dtype=float)
+        if _is_sorted(data):
+            order = np.arange(data.shape[0])
+        else:
+            order = np.lexsort((data[:, 1], data[:, 0]))
+            data = data[order]
+        #: Index of the points in the unsorted data
+        self.order = order
+        #: Sorted tracks data
+        self.data = data
+        #: Scale of the tracks layer
+        self.scale = scale
+        #: Frame of each point
+        self.frames = data[:, 1]
+        #: Spatial coordinates of each point, in the scale units
+        self.coordinates = data[:, 2:]
+        if scale is not None:
+            self.coordinates = \
+                self.coordinates * np.asarray(scale[1:], dtype=float)
+        first = np.ones(data.shape[0], dtype=bool)
+        first[1:] = data[1:, 0] != data[:-1, 0]
+        #: Index of the first point of each track
+        self.starts = np.flatnonzero(first)
+        #: Index of the last point of each track
+        self.ends = np.append(self.starts[1:], data.shape[0]) - 1 \
+            if self.starts.shape[0] > 0 else np.zeros((0,), dtype=int)
+        #: ID of each track
+        self.ids = data[self.starts, 0].astype(int)
+        #: Index of the track of each point
+        self.segments = np.cumsum(first) - 1
+        self._steps = None
+
+    @property
+    def count(self):
+        """Number of tracks"""
+        return self.starts.shape[0]
+
+    @property
+    def steps(self):
+        """Distance of each point to the previous point of its track
+
+        The distance is zero for the first point of each track
+
+        """
+        if self._steps is None:
+            steps = np.zeros(self.coordinates.shape[0])
+            if steps.shape[0] > 1:
+                steps[1:] = np.linalg.norm(np.diff(self.coordinates, axis=0),
+                                           axis=1)
+            steps[self.starts] = 0
+            self._steps = steps
+        return self._steps
+
+    def subset(self, tracks):
+        """Tracks made of some of these tracks
+
+        Parameters
+        ----------
+        tracks: ndarray
+            Indexes of the tracks to keep
+
+        Returns
+        -------
+        subset: SSortedTracks
+            The selected tracks
+
+        """
+        selected = np.zeros(self.count, dtype=bool)
+        selected[tracks] = True
+        return SSortedTracks(self.data[selected[self.segments]], self.scale)
+
+    def fingerprints(self):
+        """Number of points and hash of the points of each track
+
+        Two tracks with the same fingerprint have the same points, so
+        their features can be reused
+
+        Returns
+        -------
+        counts: ndarray
+            Number of points of each track
+        hashes: ndarray
+            Hash (uint64) of the frames and coordinates of each track
+
+        """
+        counts = self.ends - self.starts + 1
+        if self.count == 0:
+            return counts, np.zeros((0,), dtype=np.uint64)
+        bits = np.ascontiguousarray(self.data[:, 1:]).view(np.uint64)
+        hashes = np.zeros(bits.shape[0], dtype=np.uint64)
+        for column in range(bits.shape[1]):
+            hashes = (hashes ^ bits[:, column]) * _FNV_PRIME
+            hashes ^= hashes >> np.uint64(29)
+        return counts, np.add.reduceat(hashes, self.starts)
+
+    def track_sum(self, values):
+        """Sum of a value over the points of each track
+
+        Parameters
+        ----------
+        values: ndarray
+            One value per (sorted) point
+
+        Returns
+        -------
+        sums: ndarray
+            One sum per track
+
+        """
+        return np.bincount(self.segments, weights=values,
+                           minlength=self.count)
+
+
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def _is_sorted(data):
+    """True if the tracks data is already sorted by track and by frame"""
+    ids = np.diff(data[:, 0])
+    return bool(np.all((ids > 0) | ((ids == 0) & (np.diff(data[:, 1]) > 0))))
+
+
+def length_feature(tracks):
+    """Number of points of each track"""
+    return {'length': tracks.ends - tracks.starts + 1}
+
+
+def distance_feature(tracks):
+    """Length of the path of each track"""
+    return {'distance': tracks.track_sum(tracks.steps)}
+
+
+def displacement_feature(tracks):
+    """Distance between the first and the last point of each track"""
+    return {'displacement': np.linalg.norm(
+        tracks.coordinates[tracks.ends] - tracks.coordinates[tracks.starts],
+        axis=1)}
+
+
+def msd_feature(tracks, max_lag=0, fit_lags=10, batch_size=2**22):
+    """Mean squared displacement and diffusion of each track
+
+    The MSD of the tracks is computed with FFT correlations, in
+    O(T log T) for a track spanning T frames. A track is placed on a
+    regular frames grid with a mask of its points, so the gaps are left out
+    of the averages. The tracks are batched by FFT size, so tracks of
+    similar durations share the same FFT calls. The MSD is then fitted by
+    MSD(lag) = 2 d D lag^alpha on the first lags. The curves are stored
+    ragged, each track only stores the lags up to its own duration, so the
+    curves take as much memory as the tracks points.
+
+    Parameters
+    ----------
+    tracks: SSortedTracks
+        The tracks
+    max_lag: int
+        Maximum lag of the MSD curves, 0 for the longest track duration
+    fit_lags: int
+        Number of lags used to fit the diffusion coefficient and the
+        anomalous exponent
+    batch_size: int
+        Maximum number of values of a batch of FFTs
+
+    Returns
+    -------
+    features: dict
+        'msd' SRaggedArray of the MSD of each track for the lags 1 to
+        min(duration - 1, max_lag) (NaN when a track has no pair of points
+        at a lag), 'diffusion' coefficient and 'alpha' exponent of each
+        track (NaN when less than two lags can be fitted)
+
+    """
+    first = tracks.frames[tracks.starts].astype(int)
+    spans = tracks.frames[tracks.ends].astype(int) - first + 1
+    lengths = spans - 1
+    if max_lag > 0:
+        lengths = np.minimum(lengths, max_lag)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    values = np.full(offsets[-1], np.nan)
+    diffusion = np.full(tracks.count, np.nan)
+    alpha = np.full(tracks.count, np.nan)
+    durations, inverse = np.unique(spans, return_inverse=True)
+    sizes = np.array([next_fast_len(2 * int(span))
+                      for span in durations], dtype=int)[inverse]
+    for size in np.unique(sizes[lengths > 0]):
+        group = np.flatnonzero((sizes == size) & (lengths > 0))
+        rows = max(1, batch_size // size)
+        for i in range(0, group.shape[0], rows):
+            selected = group[i:i + rows]
+            counts = lengths[selected]
+            batch = _batch_msd(tracks, selected, first, size,
+                               int(counts.max()))
+            diffusion[selected], alpha[selected] = _fit_msd(
+                batch[:, :fit_lags], tracks.coordinates.shape[1])
+            # keep the lags of each track up to its own length
+            batch_rows = np.repeat(np.arange(selected.shape[0]), counts)
+            batch_lags = np.arange(batch_rows.shape[0]) - \
+                np.repeat(np.cumsum(counts) - counts, counts)
+            values[np.repeat(offsets[selected], counts) + batch_lags] = \
+                batch[batch_rows, batch_lags]
+    return {'msd': SRaggedArray(values, offsets), 'diffusion': diffusion,
+            'alpha': alpha}
+
+
+def _batch_msd(tracks, selected, first, size, lags):
+    """MSD of a batch of tracks with the same FFT size
+
+    The tracks of the batch span at most size/2 frames, so the circular
+    correlations are exact up to the lag size/2
+
+    """
+    lags = min(lags, size // 2)
+    counts = tracks.ends[selected] - tracks.starts[selected] + 1
+    rows = np.repeat(np.arange(selected.shape[0]), counts)
+    points = np.arange(rows.shape[0]) + \
+        np.repeat(tracks.starts[selected] - np.cumsum(counts) + counts,
+                  counts)
+    columns = tracks.frames[points].astype(int) - first[selected][rows]
+    # the MSD does not depend on the origin, centering the tracks avoids
+    # the loss of precision of the squared coordinates
+    coordinates = tracks.coordinates[points]
+    for axis in range(coordinates.shape[1]):
+        coordinates[:, axis] -= (np.bincount(rows, coordinates[:, axis]) /
+                                 counts)[rows]
+
+    mask = np.zeros((selected.shape[0], size))
+    mask[rows, columns] = 1
+    squares = np.zeros((selected.shape[0], size))
+    squares[rows, columns] = np.sum(coordinates ** 2, axis=1)
+    mask_fft = rfft(mask, axis=1)
+    squares_fft = rfft(squares, axis=1)
+    # sum over the pairs of points (i, i+lag) of
+    # |x(i+lag)|^2 + |x(i)|^2 - 2 x(i).x(i+lag)
+    spectrum = np.conj(mask_fft) * squares_fft + \
+        np.conj(squares_fft) * mask_fft
+    for axis in range(coordinates.shape[1]):
+        position = np.zeros((selected.shape[0], size))
+        position[rows, columns] = coordinates[:, axis]
+        position_fft = rfft(position, axis=1)
+        spectrum -= 2 * np.conj(position_fft) * position_fft
+    sums = irfft(spectrum, n=size, axis=1)[:, 1:lags + 1]
+    pairs = np.rint(irfft(np.conj(mask_fft) * mask_fft, n=size,
+                          axis=1)[:, 1:lags + 1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(pairs > 0, np.maximum(sums, 0) / pairs, np.nan)
+
+
+def _fit_msd(msd, ndim):
+    """Fit log(MSD) = log(2 d D) + alpha log(lag) for each track"""
+    lags = np.log(np.arange(1, msd.shape[1] + 1, dtype=float))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = np.log(msd)
+        valid = np.isfinite(values)
+        values = np.where(valid, values, 0)
+        lags = np.where(valid, lags, 0)
+        n = np.sum(valid, axis=1)
+        sum_x = np.sum(lags, axis=1)
+        sum_y = np.sum(values, axis=1)
+        sum_xx = np.sum(lags ** 2, axis=1)
+        sum_xy = np.sum(lags * values, axis=1)
+        alpha = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x ** 2)
+        diffusion = np.exp((sum_y - alpha * sum_x) / n) / (2 * ndim)
+    fitted = n >= 2
+    return np.where(fitted, diffusion, np.nan), np.where(fitted, alpha, np.nan)
+
+
+#: Tracks features computed by the engine, by name
+TRACKS_FEATURES = {'length': length_feature,
+                   'distance': distance_feature,
+                   'displacement': displacement_feature,
+                   'msd': msd_feature}
+
+#: Columns computed by each feature
+FEATURES_COLUMNS = {'length': ['length'],
+                    'distance': ['distance'],
+                    'displacement': ['displacement'],
+                    'msd': ['msd', 'diffusion', 'alpha']}
+
+#: Columns with several values per track
+CURVES_COLUMNS = ['msd']
+
+#: Key of the features registry in the tracks layers metadata
+REGISTRY_KEY = 'features_registry'
+
+#: Key of the features table in the tracks layers metadata
+TABLE_KEY = 'features_table'
+
+
+def tracks_features(data, names, scale=None, parameters=None):
+    """Compute tracks features in a single vectorized pass
+
+    Parameters
+    ----------
+    data: ndarray
+        Tracks data [track_id, T, (Z), Y, X]
+    names: list
+        Names of the features to compute (see ``TRACKS_FEATURES``)
+    scale: tuple or list
+        Scale of the tracks layer in each dimension (time included), None
+        to compute the features in pixels
+    parameters: dict
+        Parameters of the features, by feature name
+
+    Returns
+    -------
+    columns: dict
+        'track_id' array of the tracks IDs, and one array per feature with
+        the features of the tracks in the same order. A feature with
+        several values per track (like the MSD curves) is an SRaggedArray
+        with one row per track
+
+    """
+    if parameters is None:
+        parameters = dict()
+    for name in names:
+        if name not in TRACKS_FEATURES:
+            raise Exception(f'Unknown track feature {name}')
+    tracks = SSortedTracks(data, scale)
+    columns = {'track_id': tracks.ids}
+    for name in names:
+        columns.update(TRACKS_FEATURES[name](tracks,
+                                             **parameters.get(name, dict())))
+    return columns
+
+
+class SFeaturesCache:
+    """Tracks features computed only for the new or modified tracks
+
+    The cache keeps, for each feature, the fingerprint (see
+    ``SSortedTracks.fingerprints``) and the feature of the tracks it was
+    last computed for. The next run recomputes the feature of the tracks
+    whose ID is new or whose fingerprint changed, and reuses the cached
+    values of the other tracks, so iterative edits and filters of a large
+    tracks set only pay for the edited tracks.
+
+    """
+    def __init__(self):
+        self._scale = None
+        self._features = dict()
+
+    def reset(self):
+        """Forget the cached features"""
+        self.__init__()
+
+    def run(self, data, names, scale=None, parameters=None, observer=None):
+        """Compute the tracks features (see ``tracks_features``)
+
+        Parameters
+        ----------
+        data: ndarray
+            Tracks data [track_id, T, (Z), Y, X]
+        names: list
+            Names of the features to compute (see ``TRACKS_FEATURES``)
+        scale: tuple or list
+            Scale of the tracks layer in each dimension (time included),
+            None to compute the features in pixels
+        parameters: dict
+            Parameters of the features, by feature name
+        observer: SObserver
+            Observer notified of the computation progress, None for no
+            notification. The observer can stop the computation by raising
+            an exception from its progress method
+
+        Returns
+        -------
+        columns: dict
+            'track_id' array of the tracks IDs, and the features arrays
+
+        """
+        if parameters is None:
+            parameters = dict()
+        for name in names:
+            if name not in TRACKS_FEATURES:
+                raise Exception(f'Unknown track feature {name}')
+        if scale is not None:
+            scale = tuple(float(value) for value in scale)
+        if scale != self._scale:
+            self.reset()
+            self._scale = scale
+
+        tracks = SSortedTracks(data, scale)
+        counts, hashes = tracks.fingerprints()
+        columns = {'track_id': tracks.ids}
+        for i, name in enumerate(names):
+            if observer is not None:
+                observer.notify(f'compute feature {name}')
+                observer.progress(int(100 * i / len(names)))
+            name_parameters = parameters.get(name, dict())
+            entry = self._features.get(name)
+            if entry is not None and entry['parameters'] == name_parameters:
+                cached = _cached_tracks(entry, tracks.ids, counts, hashes)
+                modified = np.flatnonzero(cached < 0)
+                computed = TRACKS_FEATURES[name](tracks.subset(modified),
+                                                 **name_parameters)
+                features = {key: _merge_column(entry['columns'][key], cached,
+                                               values, modified)
+                            for key, values in computed.items()}
+            else:
+                features = TRACKS_FEATURES[name](tracks, **name_parameters)
+            self._features[name] = {'ids': tracks.ids, 'counts': counts,
+                                    'hashes': hashes,
+                                    'parameters': name_parameters,
+                                    'columns': features}
+            columns.update(features)
+        if observer is not None:
+            observer.progress(100)
+        return columns
+
+
+def _cached_tracks(entry, ids, counts, hashes):
+    """Position of the tracks in a cache entry, -1 for the modified tracks"""
+    cached = np.full(ids.shape[0], -1)
+    if entry['ids'].shape[0] > 0:
+        position = np.minimum(np.searchsorted(entry['ids'], ids),
+                              entry['ids'].shape[0] - 1)
+        found = (entry['ids'][position] == ids) & \
+            (entry['counts'][position] == counts) & \
+            (entry['hashes'][position] == hashes)
+        cached[found] = position[found]
+    return cached
+
+
+def _merge_column(cached_values, cached, values, modified):
+    """Feature column from the cached and the recomputed values"""
+    reused = np.flatnonzero(cached >= 0)
+    if isinstance(values, SRaggedArray):
+        order = np.empty(cached.shape[0], dtype=int)
+        order[reused] = np.arange(reused.shape[0])
+        order[modified] = reused.shape[0] + np.arange(modified.shape[0])
+        return SRaggedArray.concatenate(
+            [cached_values.take(cached[reused]), values]).take(order)
+    column = np.empty(cached.shape[0],
+                      dtype=np.result_type(cached_values, values))
+    column[reused] = cached_values[cached[reused]]
+    column[modified] = values
+    return column
+
+
+class SFeaturesRegistry:
+    """Tracks features declared on a tracks layer and computed on demand
+
+    The features are declared with their parameters, and computed only when
+    a column is requested. The computed columns are memoized as long as
+    the tracks data is not modified, and a modified tracks data only
+    recomputes the features of the modified tracks (see
+    ``SFeaturesCache``).
+
+    The registry can be computed from a worker thread: the computations are
+    serialized by a lock, and the features declared during a computation
+    are computed by the next one.
+
+    Parameters
+    ----------
+    cache: SFeaturesCache
+        Cache shared with another registry, None to create a new cache
+
+    """
+    def __init__(self, cache=None):
+        self._parameters = dict()
+        self._cache = cache if cache is not None else SFeaturesCache()
+        self._data = None
+        self._columns = {'track_id': np.zeros((0,), dtype=int)}
+        # parameters of the computed features
+        self._computed = dict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def declare(self, name, parameters=None):
+        """Declare a feature, without computing it
+
+        Parameters
+        ----------
+        name: str
+            Name of the feature (see ``TRACKS_FEATURES``)
+        parameters: dict
+            Parameters of the feature
+
+        """
+        if name not in TRACKS_FEATURES:
+            raise Exception(f'Unknown track feature {name}')
+        if parameters is None:
+            parameters = dict()
+        # replaced and not modified, so a running computation keeps the
+        # parameters it started with
+        self._parameters = {**self._parameters, name: parameters}
+
+    def derive(self):
+        """Registry with the same features, for another tracks layer
+
+        The registries share their cache, so the features of the tracks
+        common to both layers are computed once
+
+        Returns
+        -------
+        registry: SFeaturesRegistry
+            Registry with the same declared features and no computed column
+
+        """
+        registry = SFeaturesRegistry(self._cache)
+        for name, parameters in self._parameters.items():
+            registry.declare(name, parameters)
+        return registry
+
+    def columns(self, scalar=False):
+        """Names of the columns of the declared features
+
+        Parameters
+        ----------
+        scalar: bool
+            True to list only the columns with a single value per track
+
+        Returns
+        -------
+        names: list
+            Names of the columns
+
+        """
+        return [column for name in self._parameters
+                for column in FEATURES_COLUMNS[name]
+                if not scalar or column not in CURVES_COLUMNS]
+
+    def compute(self, data, columns=None, observer=None):
+        """Compute the requested columns, if not already computed
+
+        Parameters
+        ----------
+        data: ndarray
+            Tracks data [track_id, T, (Z), Y, X] of the layer
+        columns: list
+            Names of the requested columns, None for all the columns
+        observer: SObserver
+            Observer notified of the computation progress (see
+            ``SFeaturesCache.run``)
+
+        Returns
+        -------
+        table: SFeatureTable
+            The requested columns
+
+        """
+        with self._lock:
+            parameters = self._parameters
+            if columns is None:
+                columns = [column for name in parameters
+                           for column in FEATURES_COLUMNS[name]]
+            if data is not self._data:
+                self._data = data
+                self._computed = dict()
+            names = [name for name in parameters
+                     if self._computed.get(name) != parameters[name] and
+                     any(column in columns
+                         for column in FEATURES_COLUMNS[name])]
+            if len(names) > 0:
+                self._columns.update(self._cache.run(
+                    data, names, parameters=parameters, observer=observer))
+                self._computed.update({name: parameters[name]
+                                       for name in names})
+            return SFeatureTable(self._columns['track_id'],
+                                 {name: self._columns[name]
+                                  for name in columns})
+
+
+def layer_registry(layer, create=False):
+    """Features registry of a tracks layer
+
+    Parameters
+    ----------
+    layer: Tracks
+        The napari tracks layer
+    create: bool
+        True to add a registry to the layer if it does not have one
+
+    Returns
+    -------
+    registry: SFeaturesRegistry
+        The layer features registry, None if it has none and create is False
+
+    """
+    registry = layer.metadata.get(REGISTRY_KEY)
+    if registry is None and create:
+        registry = SFeaturesRegistry()
+        layer.metadata[REGISTRY_KEY] = registry
+    return registry
+
+
+def layer_features(layer, names=None, observer=None):
+    """Features table of a tracks layer
+
+    The table gathers the features stored in the layer metadata (features
+    table and features dicts) and the declared features of the layer
+    registry, computed on demand
+
+    Parameters
+    ----------
+    layer: Tracks
+        The napari tracks layer
+    names: list
+        Names of the registry features to compute, None for all the
+        declared features
+    observer: SObserver
+        Observer notified of the computation progress (see
+        ``SFeaturesCache.run``)
+
+    Returns
+    -------
+    table: SFeatureTable
+        The features of the tracks of the layer
+
+    """
+    table = SFeatureTable(np.unique(layer.data[:, 0]).astype(int))
+    dicts = {name: feature for name, feature in layer.metadata.items()
+             if isinstance(feature, dict)}
+    if len(dicts) > 0:
+        table.update(SFeatureTable.from_dicts(dicts))
+    stored = layer.metadata.get(TABLE_KEY)
+    if stored is not None:
+        table.update(stored)
+    registry = layer_registry(layer)
+    if registry is not None:
+        requested = [column for column in registry.columns()
+                     if names is None or column in names]
+        if len(requested) > 0:
+            table.update(registry.compute(layer.data, requested,
+                                          observer))
+    return table
+
+
+def layer_features_names(layer, scalar=False):
+    """Names of the features of a tracks layer, without computing them
+
+    Parameters
+    ----------
+    layer: Tracks
+        The napari tracks layer
+    scalar: bool
+        True to list only the features with a single value per track
+
+    Returns
+    -------
+    names: list
+        Names of the features
+
+    """
+    names = []
+    for name, feature in layer.metadata.items():
+        if isinstance(feature, dict) and \
+                (not scalar or
+                 all(np.isscalar(value) for value in feature.values())):
+            names.append(name)
+    stored = layer.metadata.get(TABLE_KEY)
+    if stored is not None:
+        names += stored.names(scalar)
+    registry = layer_registry(layer)
+    if registry is not None:
+        names += registry.columns(scalar)
+    return list(dict.fromkeys(names))
+
+
+class SRaggedArray:
+    """Rows of different lengths stored in a single flat array
+
+    The row i is values[offsets[i]:offsets[i + 1]], so curves of very
+    different lengths (like the MSD of short and long tracks) take as much
+    memory as their values, without padding.
+
+    Parameters
+    ----------
+    values: ndarray
+        Values of the rows, concatenated
+    offsets: ndarray
+        Start of each row in the values, followed by the number of values
+
+    """
+    #: The rows are arrays of values, like the rows of a 2D array
+    ndim = 2
+
+    def __init__(self, values, offsets):
+        #: Values of the rows, concatenated
+        self.values = np.asarray(values, dtype=float)
+        #: Start of each row in the values, and number of values
+        self.offsets = np.asarray(offsets, dtype=int)
+
+    @staticmethod
+    def from_rows(rows):
+        """Ragged array from a list of rows
+
+        Parameters
+        ----------
+        rows: list
+            Values of each row
+
+        Returns
+        -------
+        array: SRaggedArray
+            The ragged array
+
+        """
+        rows = [np.ravel(row).astype(float) for row in rows]
+        offsets = np.concatenate(([0], np.cumsum(
+            [row.shape[0] for row in rows], dtype=int)))
+        values = np.concatenate(rows) if len(rows) > 0 else np.zeros((0,))
+        return SRaggedArray(values, offsets)
+
+    @staticmethod
+    def concatenate(arrays):
+        """Ragged array with the rows of several ragged arrays
+
+        Parameters
+        ----------
+        arrays: list
+            The ragged arrays
+
+        Returns
+        -------
+        array: SRaggedArray
+            Rows of the arrays, in order
+
+        """
+        offsets = [np.zeros((1,), dtype=int)]
+        for array in arrays:
+            offsets.append(array.offsets[1:] + offsets[-1][-1])
+        return SRaggedArray(
+            np.concatenate([np.zeros((0,))] +
+                           [array.values for array in arrays]),
+            np.concatenate(offsets))
+
+    @property
+    def lengths(self):
+        """Number of values of each row"""
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def __getitem__(self, index):
+        rows = np.arange(len(self))[index]
+        if np.ndim(rows) == 0:
+            return self.values[self.offsets[rows]:self.offsets[rows + 1]]
+        return self.take(rows)
+
+    def take(self, rows):
+        """Ragged array with a subset of the rows
+
+        Parameters
+        ----------
+        rows: ndarray
+            Indexes of the rows, -1 for an empty row
+
+        Returns
+        -------
+        array: SRaggedArray
+            The selected rows
+
+        """
+        rows = np.asarray(rows, dtype=int)
+        starts = self.offsets[rows]
+        lengths = np.where(rows >= 0, self.offsets[rows + 1] - starts, 0)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        positions = np.arange(offsets[-1]) + \
+            np.repeat(starts - offsets[:-1], lengths)
+        return SRaggedArray(self.values[positions], offsets)
+
+    def tolist(self):
+        """List of the rows, as lists of values"""
+        return [self.values[start:end].tolist()
+                for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+
+class SFeatureTable:
+    """Columnar table of tracks features
+
+    The table is indexed by the sorted tracks IDs, and stores one typed
+    array per feature, with one row per track. The features with several
+    values per track (like the MSD curves) are SRaggedArray.
+
+    Parameters
+    ----------
+    track_ids: ndarray
+        IDs of the tracks
+    columns: dict
+        Array of each feature, with one row per track in the track_ids
+        order
+
+    """
+    def __init__(self, track_ids, columns=None):
+        track_ids = np.asarray(track_ids, dtype=int)
+        order = np.argsort(track_ids, kind='stable')
+        #: Sorted IDs of the tracks
+        self.track_ids = track_ids[order]
+        self._columns = dict()
+        if columns is not None:
+            for name, values in columns.items():
+                if not isinstance(values, SRaggedArray):
+                    values = np.asarray(values)
+                self._columns[name] = values[order]
+
+    @staticmethod
+    def from_dicts(features):
+        """Table from features in the {feature_name: {track_id: value}}
+        format of the layers metadata
+
+        Parameters
+        ----------
+        features: dict
+            {feature_name: {track_id: value}} for each feature
+
+        Returns
+        -------
+        table: SFeatureTable
+            The features table
+
+        """
+        table = SFeatureTable(np.unique(np.fromiter(
+            (int(key) for feature in features.values() for key in feature),
+            dtype=int)))
+        for name, feature in features.items():
+            ids = np.fromiter((int(key) for key in feature), dtype=int,
+                              count=len(feature))
+            values = list(feature.values())
+            if all(np.isscalar(value) for value in values):
+                values = np.asarray(values)
+            else:
+                values = SRaggedArray.from_rows(values)
+            table.update(SFeatureTable(ids, {name: values}))
+        return table
+
+    def __len__(self):
+        return self.track_ids.shape[0]
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def names(self, scalar=False):
+        """Names of the features
+
+        Parameters
+        ----------
+        scalar: bool
+            True to list only the features with a single value per track
+
+        Returns
+        -------
+        names: list
+            Names of the features
+
+        """
+        return [name for name, values in self._columns.items()
+                if not scalar or values.ndim == 1]
+
+    def rows(self, track_ids):
+        """Rows of tracks in the table
+
+        Parameters
+        ----------
+        track_ids: ndarray
+            IDs of the tracks
+
+        Returns
+        -------
+        rows: ndarray
+            Row of each track, -1 for the tracks not in the table
+
+        """
+        track_ids = np.asarray(track_ids, dtype=int)
+        if len(self) == 0:
+            return np.full(track_ids.shape, -1)
+        rows = np.minimum(np.searchsorted(self.track_ids, track_ids),
+                          len(self) - 1)
+        rows[self.track_ids[rows] != track_ids] = -1
+        return rows
+
+    def select(self, rows):
+        """Table with a subset of the tracks
+
+        Parameters
+        ----------
+        rows: ndarray
+            Boolean mask or indexes of the rows to keep
+
+        Returns
+        -------
+        table: SFeatureTable
+            The selected tracks features
+
+        """
+        return SFeatureTable(self.track_ids[rows],
+                             {name: values[rows]
+                              for name, values in self._columns.items()})
+
+    def reindex(self, track_ids):
+        """Table of the features of other tracks
+
+        Parameters
+        ----------
+        track_ids: ndarray
+            IDs of the tracks of the new table
+
+        Returns
+        -------
+        table: SFeatureTable
+            Features of the tracks, NaN (or an empty curve) for the tracks
+            not in this table
+
+        """
+        rows = self.rows(track_ids)
+        found = rows >= 0
+        if np.all(found):
+            return self.select(rows)
+        columns = dict()
+        for name, values in self._columns.items():
+            if isinstance(values, SRaggedArray):
+                columns[name] = values.take(rows)
+                continue
+            column = np.full((rows.shape[0],) + values.shape[1:], np.nan)
+            column[found] = values[rows[found]]
+            columns[name] = column
+        return SFeatureTable(track_ids, columns)
+
+    def update(self, table):
+        """Add (or replace) the features of another table
+
+        The features of the tracks missing in the other table are NaN
+
+        Parameters
+        ----------
+        table: SFeatureTable
+            Table with the features to add
+
+        """
+        if len(table) != len(self) or \
+                np.any(table.track_ids != self.track_ids):
+            table = table.reindex(self.track_ids)
+        self._columns.update(table._columns)
+
+    def drop(self, names):
+        """Table without some features
+
+        Parameters
+        ----------
+        names: list
+            Names of the features to remove
+
+        Returns
+        -------
+        table: SFeatureTable
+            The table without the features
+
+        """
+        return SFeatureTable(self.track_ids,
+                             {name: values
+                              for name, values in self._columns.items()
+                              if name not in names})
+
+    def to_dicts(self):
+        """Convert the table to the layers metadata format
+
+        Returns
+        -------
+        features: dict
+            {feature_name: {track_id: value}} for each feature. The values
+            of the features with several values per track are lists
+
+        """
+        ids = self.track_ids.tolist()
+        features = dict()
+        for name, values in self._columns.items():
+            if isinstance(values, SRaggedArray):
+                values = values.tolist()
+            elif values.ndim > 1:
+                values = [_trim_nan(row) for row in values]
+            else:
+                values = values.tolist()
+            features[name] = dict(zip(ids, values))
+        return features
+
+
+def _trim_nan(values):
+    """List of the values without the trailing NaN values"""
+    valid = np.flatnonzero(~np.isnan(values))
+    return values[:valid[-1] + 1 if valid.shape[0] > 0 else 0].tolist()
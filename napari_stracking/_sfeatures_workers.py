@@ -7,8 +7,8 @@ from ._splugin import SNapariWorker, SNapariWidget, SProgressObserver
 from ._swidgets import SFeaturesViewer, SPipelineListWidget
 
 from stracking.containers import SParticles, STracks
-from stracking.features import (LengthFeature, DistanceFeature,
-                                DisplacementFeature)
+
+from ._sfeatures_engine import layer_registry
 
 
 # ------------------ STracksFeaturesWidget --------
@@ -57,7 +57,8 @@ class STracksFeaturesWidget(SNapariWidget):
         header_layout = QHBoxLayout()
         header_layout.addWidget(QLabel("Add feature:"))
         self.filters_names = QComboBox()
-        self.filters_names.addItems(['Length', 'Distance', 'Displacement'])
+        self.filters_names.addItems(['Length', 'Distance', 'Displacement',
+                                     'MSD'])
         header_layout.addWidget(self.filters_names)
         add_filter_button = QPushButton("Add")
         add_filter_button.released.connect(self._on_add)
@@ -160,6 +161,9 @@ class STracksFeaturesWidget(SNapariWidget):
         elif filter_ == 'Displacement':
             self.pipeline_list_widget.add_widget('Displacement',
                                                  SDisplacementFeatureWidget())
+        elif filter_ == 'MSD':
+            self.pipeline_list_widget.add_widget('MSD',
+                                                 SMSDFeatureWidget(self))
 
     def show_features(self):
         """Method to call to force the features table display"""
@@ -197,11 +201,9 @@ class SLengthFeatureWidget(QWidget):
         layout = QGridLayout()
         self.setLayout(layout)
 
-    @staticmethod
-    def check_inputs():
+    def check_inputs(self):
         return True
 
-    @staticmethod
     def parameters(self):
         return {}
 
@@ -214,11 +216,9 @@ class SDistanceFeatureWidget(QWidget):
         layout = QGridLayout()
         self.setLayout(layout)
 
-    @staticmethod
     def check_inputs(self):
         return True
 
-    @staticmethod
     def parameters(self):
         return {}
 
@@ -231,11 +231,9 @@ class SDisplacementFeatureWidget(QWidget):
         layout = QGridLayout()
         self.setLayout(layout)
 
-    @staticmethod
     def check_inputs(self):
         return True
 
-    @staticmethod
     def parameters(self):
         return {}
 
@@ -245,7 +243,7 @@ class STracksFeaturesWorker(SNapariWorker):
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
 
-        self.observer = SProgressObserver()
+        self.observer = SProgressObserver(self.cancel_event)
         self.observer.progress_signal.connect(self.progress)
         self.observer.notify_signal.connect(self.log)
 
@@ -255,41 +253,66 @@ class STracksFeaturesWorker(SNapariWorker):
         """Execute the processing"""
         state = self.widget.state()
         print(state)
-        input_tracks_layer_name = state['inputs']['tracks']
 
-        # get the particles
-        data = self.viewer.layers[input_tracks_layer_name].data
-        tracks = STracks(data=data, features=dict())
-
-        # run the filters
+        # the features are only declared, and computed when they are
+        # displayed, filtered or exported
         state_params = state['parameters']
-
-        filters_names = state_params['filters']
-        filters_params = state_params['filters_params']
-        for i in range(len(filters_names)):
-            n_filter = filters_names[i]
-            if n_filter == 'Length':
-                feature_calc = LengthFeature()
-                feature_calc.add_observer(self.observer)
-                tracks = feature_calc.run(tracks)
-            elif n_filter == 'Distance':
-                feature_calc = DistanceFeature()
-                feature_calc.add_observer(self.observer)
-                tracks = feature_calc.run(tracks)
-            elif n_filter == 'Displacement':
-                feature_calc = DisplacementFeature()
-                feature_calc.add_observer(self.observer)
-                tracks = feature_calc.run(tracks)
-
-        self._out_data = tracks
+        names = [name.lower() for name in state_params['filters']]
+        self._out_data = dict(zip(names, state_params['filters_params']))
         self.progress.emit(100)
         self.finished.emit()
 
     def set_outputs(self):
-        """Set the output features in a new napari layer"""
-        # set the properties to the layer
+        """Declare the features in the tracks layer features registry"""
         state = self.widget.state()
         input_tracks_layer_name = state['inputs']['tracks']
-        self.viewer.layers[input_tracks_layer_name].metadata.update(
-            self._out_data.features)
-        self.widget.show_features()
+        registry = layer_registry(
+            self.viewer.layers[input_tracks_layer_name], create=True)
+        for name, parameters in self._out_data.items():
+            registry.declare(name, parameters)
+        if self.widget.features_viewer.isVisible():
+            self.widget.show_features()
+
+
+class SMSDFeatureWidget(QWidget):
+    """Widget for the mean squared displacement feature
+
+    Parameters
+    ----------
+    parent_plugin: SNapariWidget
+        Widget of the plugin, used to display the input errors
+
+    """
+    def __init__(self, parent_plugin):
+        super().__init__()
+        self.parent_plugin = parent_plugin
+
+        self.max_lag_val = QLineEdit('0')
+        self.fit_lags_val = QLineEdit('10')
+
+        layout = QGridLayout()
+        layout.addWidget(QLabel('Max lag (0 for all)'), 0, 0)
+        layout.addWidget(self.max_lag_val, 0, 1)
+        layout.addWidget(QLabel('Fit lags'), 1, 0)
+        layout.addWidget(self.fit_lags_val, 1, 1)
+        self.setLayout(layout)
+
+    def check_inputs(self):
+        try:
+            _ = int(self.max_lag_val.text())
+        except ValueError:
+            self.parent_plugin.show_error("Max lag must be an integer")
+            return False
+        try:
+            fit_lags = int(self.fit_lags_val.text())
+        except ValueError:
+            self.parent_plugin.show_error("Fit lags must be an integer")
+            return False
+        if fit_lags < 2:
+            self.parent_plugin.show_error("Fit lags must be at least 2")
+            return False
+        return True
+
+    def parameters(self):
+        return {'max_lag': int(self.max_lag_val.text()),
+                'fit_lags': int(self.fit_lags_val.text())}
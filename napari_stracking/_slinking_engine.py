@@ -0,0 +1,1590 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import copy
+import heapq
+import numpy as np
+from scipy.sparse import lil_matrix, csr_matrix, coo_matrix
+from scipy.sparse.csgraph import (bellman_ford,
+                                  min_weight_full_bipartite_matching)
+from scipy.spatial import cKDTree
+
+from stracking.containers import SParticles, STracks
+from stracking.linkers import SLinker
+
+from ._smotion_model import SMotionModel, predicted_links
+
+
+def scaled_coordinates(data, scale=None):
+    """Spatial coordinates of the particles in the scale units
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    scale: tuple or list
+        Scale of the particles layer in each dimension (time included)
+
+    Returns
+    -------
+    coordinates: ndarray
+        (N, D) array of the scaled spatial coordinates
+
+    """
+    coordinates = np.asarray(data[:, 1:], dtype=float)
+    if scale is not None:
+        coordinates = coordinates * np.asarray(scale[1:], dtype=float)
+    return coordinates
+
+
+def frame_indexes(data):
+    """Indexes of the particles of each frame
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+
+    Returns
+    -------
+    indexes: dict
+        Indexes of the particles in data for each frame, in data order
+
+    """
+    frames = data[:, 0].astype(int)
+    order = np.argsort(frames, kind='stable')
+    values, starts = np.unique(frames[order], return_index=True)
+    return dict(zip(values.tolist(), np.split(order, starts[1:])))
+
+
+def candidate_links(data, scale, max_distance, gap):
+    """Pairs of particles that can be linked
+
+    Each frame is indexed with a KD-tree, so only the pairs of particles
+    closer than max_distance are generated, instead of all the pairs of
+    particles of consecutive frames.
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    scale: tuple or list
+        Scale of the particles layer. The distances are computed in the
+        scale units, so anisotropic data are handled
+    max_distance: float
+        Maximum distance between two linked particles (excluded)
+    gap: int
+        Maximum number of frames between two linked particles
+
+    Returns
+    -------
+    sources: ndarray
+        Indexes of the first particle of each pair
+    targets: ndarray
+        Indexes of the second particle of each pair, in a later frame
+    costs: ndarray
+        Squared distance between the particles of each pair
+
+    """
+    coordinates = scaled_coordinates(data, scale)
+    indexes = frame_indexes(data)
+    trees = {frame: cKDTree(coordinates[index])
+             for frame, index in indexes.items()}
+    sources = []
+    targets = []
+    for frame, index in indexes.items():
+        for dt in range(1, gap + 1):
+            if frame + dt not in trees:
+                continue
+            next_index = indexes[frame + dt]
+            pairs = trees[frame].sparse_distance_matrix(
+                trees[frame + dt], max_distance, output_type='ndarray')
+            sources.append(index[pairs['i']])
+            targets.append(next_index[pairs['j']])
+    if len(sources) == 0:
+        return (np.empty((0,), dtype=int), np.empty((0,), dtype=int),
+                np.empty((0,)))
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    costs = np.sum((coordinates[sources] - coordinates[targets]) ** 2, axis=1)
+    keep = costs < max_distance ** 2
+    return sources[keep], targets[keep], costs[keep]
+
+
+def sample_frames(data, count=20):
+    """Frames evenly sampled in the particles frames
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    count: int
+        Maximum number of frames
+
+    Returns
+    -------
+    frames: ndarray
+        Sorted sampled frames
+
+    """
+    frames = np.unique(data[:, 0])
+    if frames.shape[0] > count:
+        frames = frames[np.linspace(0, frames.shape[0] - 1,
+                                    count).astype(int)]
+    return frames
+
+
+def nearest_displacements(data, scale=None, sample=20):
+    """Displacements of the particles to their nearest neighbour
+
+    For a sample of frames, each particle is matched to its nearest
+    neighbour in the next frame with a KD-tree
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    scale: tuple or list
+        Scale of the particles
+    sample: int
+        Maximum number of frames sampled
+
+    Returns
+    -------
+    displacements: ndarray
+        Distance of the sampled particles to their nearest neighbour in the
+        next frame, in the scale units
+
+    """
+    coordinates = scaled_coordinates(data, scale)
+    indexes = frame_indexes(data)
+    displacements = []
+    for frame in sample_frames(data, sample):
+        if frame + 1 not in indexes:
+            continue
+        tree = cKDTree(coordinates[indexes[frame + 1]])
+        distances, _ = tree.query(coordinates[indexes[frame]])
+        displacements.append(distances)
+    if len(displacements) == 0:
+        return np.empty((0,))
+    return np.concatenate(displacements)
+
+
+def estimate_max_distance(data, scale=None, quantile=0.95, sample=20):
+    """Propose a linking max distance from the particles displacements
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    scale: tuple or list
+        Scale of the particles
+    quantile: float
+        Quantile of the nearest neighbour displacements (see
+        ``nearest_displacements``) used as max distance
+    sample: int
+        Maximum number of frames sampled
+
+    Returns
+    -------
+    max_distance: float
+        Proposed max distance, None if there are no consecutive frames
+
+    """
+    displacements = nearest_displacements(data, scale, sample)
+    if displacements.shape[0] == 0:
+        return None
+    return float(np.quantile(displacements, quantile))
+
+
+def candidate_count(data, scale, max_distance, gap, sample=20):
+    """Predict the number of candidate links of a linker
+
+    The candidate links (see ``candidate_links``) of a sample of frames are
+    counted with KD-trees, and extrapolated to all the frames
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    scale: tuple or list
+        Scale of the particles
+    max_distance: float
+        Maximum distance between two linked particles
+    gap: int
+        Gap (in frame number) of possible missing detections
+    sample: int
+        Maximum number of frames sampled
+
+    Returns
+    -------
+    count: int
+        Predicted number of candidate links
+
+    """
+    coordinates = scaled_coordinates(data, scale)
+    indexes = frame_indexes(data)
+    frames = sample_frames(data, sample)
+    if frames.shape[0] == 0:
+        return 0
+    count = 0
+    for frame in frames:
+        tree = cKDTree(coordinates[indexes[frame]])
+        for dt in range(1, gap + 1):
+            if frame + dt in indexes:
+                count += tree.count_neighbors(
+                    cKDTree(coordinates[indexes[frame + dt]]), max_distance)
+    return int(round(count * len(indexes) / frames.shape[0]))
+
+
+def tracks_from_paths(data, paths, properties=None, scale=None):
+    """Create the tracks container from the particles of each track
+
+    Parameters
+    ----------
+    data: ndarray
+        Particles data [T, (Z), Y, X]
+    paths: list
+        Indexes of the particles of each track, in time order
+    properties: dict
+        Properties of the particles
+    scale: tuple or list
+        Scale of the particles
+
+    Returns
+    -------
+    tracks: STracks
+
+    """
+    if len(paths) > 0:
+        index = np.concatenate(paths)
+        ids = np.concatenate([np.full(len(path), i)
+                              for i, path in enumerate(paths)])
+    else:
+        index = np.empty((0,), dtype=int)
+        ids = np.empty((0,))
+    tracks_data = np.column_stack((ids, data[index]))
+    tracks_properties = dict()
+    if properties is not None:
+        for key, value in properties.items():
+            tracks_properties[key] = np.asarray(value)[index]
+    return STracks(data=tracks_data, properties=tracks_properties, graph={},
+                   features={}, scale=scale)
+
+
+def paths_links(paths):
+    """Links between the consecutive particles of the tracks
+
+    Parameters
+    ----------
+    paths: list
+        Indexes of the particles of each track, in time order
+
+    Returns
+    -------
+    sources: ndarray
+        Index of the first particle of each link
+    targets: ndarray
+        Index of the second particle of each link
+
+    """
+    paths = [np.asarray(path, dtype=int) for path in paths if len(path) > 1]
+    if len(paths) == 0:
+        return np.empty((0,), dtype=int), np.empty((0,), dtype=int)
+    return (np.concatenate([path[:-1] for path in paths]),
+            np.concatenate([path[1:] for path in paths]))
+
+
+def greedy_links(sources, targets, costs):
+    """Select one to one links by increasing cost
+
+    A link is dropped when its first particle already has a successor or
+    its second particle already has a predecessor, so that the tracks do
+    not split or merge.
+
+    Parameters
+    ----------
+    sources: ndarray
+        Index of the first particle of each link
+    targets: ndarray
+        Index of the second particle of each link
+    costs: ndarray
+        Cost of each link
+
+    Returns
+    -------
+    selected: ndarray
+        Boolean array, True for the selected links
+
+    """
+    sources, targets = np.asarray(sources), np.asarray(targets)
+    selected = np.zeros(len(costs), dtype=bool)
+    if len(costs) == 0:
+        return selected
+    # the links whose particles are in no other link are always selected
+    _, source_index, source_counts = np.unique(
+        sources, return_inverse=True, return_counts=True)
+    _, target_index, target_counts = np.unique(
+        targets, return_inverse=True, return_counts=True)
+    unique = (source_counts[source_index] == 1) & \
+        (target_counts[target_index] == 1)
+    selected[unique] = True
+    linked_sources = set()
+    linked_targets = set()
+    ambiguous = np.flatnonzero(~unique)
+    order = ambiguous[np.argsort(np.asarray(costs)[ambiguous],
+                                 kind='stable')]
+    for k in order.tolist():
+        source, target = sources[k], targets[k]
+        if source not in linked_sources and target not in linked_targets:
+            linked_sources.add(source)
+            linked_targets.add(target)
+            selected[k] = True
+    return selected
+
+
+def links_paths(sources, targets, costs, count):
+    """Build the tracks from a set of links
+
+    The links are selected with ``greedy_links``
+
+    Parameters
+    ----------
+    sources: ndarray
+        Index of the first particle of each link
+    targets: ndarray
+        Index of the second particle of each link
+    costs: ndarray
+        Cost of each link
+    count: int
+        Number of particles
+
+    Returns
+    -------
+    paths: list
+        Indexes of the particles of each track in time order. The tracks
+        are sorted by their first particle
+
+    """
+    selected = greedy_links(sources, targets, costs)
+    return chain_links(sources[selected], targets[selected], count)
+
+
+def chain_links(sources, targets, count):
+    """Build the tracks from one to one links
+
+    Parameters
+    ----------
+    sources: ndarray
+        Index of the first particle of each link
+    targets: ndarray
+        Index of the second particle of each link. Each particle is at most
+        once in sources and once in targets
+    count: int
+        Number of particles
+
+    Returns
+    -------
+    paths: list
+        Indexes of the particles of each track in time order. The tracks
+        are sorted by their first particle
+
+    """
+    sources = np.asarray(sources, dtype=int)
+    targets = np.asarray(targets, dtype=int)
+    if sources.shape[0] == 0:
+        return []
+    # pointer jumping: first particle and position of each particle in its
+    # track, in log(track length) vectorized steps
+    firsts = np.arange(count)
+    firsts[targets] = sources
+    positions = np.zeros(count, dtype=int)
+    positions[targets] = 1
+    while True:
+        jumped = firsts[firsts]
+        if np.array_equal(jumped, firsts):
+            break
+        positions = positions + positions[firsts]
+        firsts = jumped
+    linked = np.zeros(count, dtype=bool)
+    linked[sources] = True
+    linked[targets] = True
+    index = np.flatnonzero(linked)
+    index = index[np.lexsort((positions[index], firsts[index]))]
+    splits = np.flatnonzero(np.diff(firsts[index])) + 1
+    return np.split(index, splits)
+
+
+def assignment_links(sources, targets, costs, no_link_cost):
+    """Select the one to one links minimizing the total cost
+
+    The links are selected by solving a linear assignment problem on a
+    sparse cost matrix, augmented with the costs of not linking the
+    particles (Jaqaman et al. 2008)::
+
+        | links    | no link |
+        | no link  | links'  |
+
+    The top left block holds the candidate links costs, the diagonal
+    blocks the costs of ending a track (top right) or starting a track
+    (bottom left), and the bottom right block the transposed candidate
+    links, to match the unused no link entries. Only the candidate links
+    are stored, so the matrix stays sparse.
+
+    Parameters
+    ----------
+    sources: ndarray
+        Index of the first particle of each link
+    targets: ndarray
+        Index of the second particle of each link
+    costs: ndarray
+        Cost of each link
+    no_link_cost: float
+        Cost of ending or starting a track instead of linking
+
+    Returns
+    -------
+    selected: ndarray
+        Boolean array, True for the selected links
+
+    """
+    if len(costs) == 0:
+        return np.zeros((0,), dtype=bool)
+    rows, sources = np.unique(sources, return_inverse=True)
+    cols, targets = np.unique(targets, return_inverse=True)
+    n, m = rows.shape[0], cols.shape[0]
+    # the matching ignores zero weights
+    epsilon = 1e-9 * no_link_cost
+    costs = np.asarray(costs, dtype=float) + epsilon
+    matrix = coo_matrix(
+        (np.concatenate((costs, np.full(n + m, float(no_link_cost)),
+                         np.full(len(costs), epsilon))),
+         (np.concatenate((sources, np.arange(n), n + np.arange(m),
+                          n + targets)),
+          np.concatenate((targets, m + np.arange(n), np.arange(m),
+                          m + sources)))),
+        shape=(n + m, m + n)).tocsr()
+    matched_rows, matched_cols = min_weight_full_bipartite_matching(matrix)
+    match = np.full(n + m, -1)
+    match[matched_rows] = matched_cols
+    return match[sources] == targets
+
+
+def link_window(linker, data, scale=None):
+    """Link the particles of a time window
+
+    Parameters
+    ----------
+    linker: SLinker
+        Linker to run
+    data: ndarray
+        Particles data [T, (Z), Y, X] of the window
+    scale: tuple or list
+        Scale of the particles
+
+    Returns
+    -------
+    sources: ndarray
+        Index in data of the first particle of each link
+    targets: ndarray
+        Index in data of the second particle of each link
+
+    """
+    particles = SParticles(data=data,
+                           properties={'index': np.arange(data.shape[0])},
+                           scale=scale)
+    tracks = linker.run(particles)
+    if tracks.data is None or tracks.data.shape[0] == 0:
+        return np.empty((0,), dtype=int), np.empty((0,), dtype=int)
+    ids = tracks.data[:, 0]
+    index = np.asarray(tracks.properties['index']).astype(int)
+    order = np.lexsort((tracks.data[:, 1], ids))
+    ids, index = ids[order], index[order]
+    same = ids[1:] == ids[:-1]
+    return index[:-1][same], index[1:][same]
+
+
+class SShortestPathLinker(SLinker):
+    """Shortest path linker with a spatial index of the candidate links
+
+    Same algorithm as ``stracking.linkers.SPLinker``: the particles are the
+    nodes of a graph, and the tracks are extracted iteratively as the
+    shortest path of the graph. The graph edges are created only for the
+    candidate links found with a KD-tree (see ``candidate_links``), instead
+    of evaluating the cost of all the pairs of particles, and the tracks
+    properties are copied from the particles by index.
+
+    The link costs are the squared euclidean distances in the particles
+    scale units.
+
+    Two solvers are available:
+
+    - 'dag': the graph is stored in sparse CSR arrays of the candidate
+      links only. As the links always go forward in time, the graph is
+      acyclic and the shortest paths are computed in a single pass in time
+      order. When a track is extracted, only the particles whose shortest
+      path went through the track are updated.
+    - 'bellman-ford': the SPLinker solver, a Bellman-Ford shortest path on
+      the whole graph for each extracted track
+
+    Parameters
+    ----------
+    max_distance: float
+        Maximum distance between two linked particles
+    gap: int
+        Gap (in frame number) of possible missing detections
+    min_track_length: int
+        Tracks with this number of particles or less are discarded
+    solver: str
+        'dag' or 'bellman-ford'
+
+    """
+    def __init__(self, max_distance=5, gap=1, min_track_length=2,
+                 solver='dag'):
+        super().__init__(None)
+        self.max_distance = max_distance
+        self.gap = gap
+        self.min_track_length = min_track_length
+        self.solver = solver
+        self.int_convert_coef = 10000
+
+    def weights(self, costs):
+        """Graph weights of the links, as computed by SPLinker"""
+        max_cost = self.max_distance ** 2
+        return ((costs / max_cost - 1.0) *
+                self.int_convert_coef).astype(int)
+
+    def run(self, particles, image=None):
+        """Run the linker
+
+        Parameters
+        ----------
+        particles: SParticles
+            Particles of all the frames
+        image: ndarray
+            Not used
+
+        Returns
+        -------
+        tracks: STracks
+
+        """
+        data = particles.data
+        self.notify('processing')
+        self.progress(0)
+
+        # nodes in frame order, as SPLinker
+        order = np.argsort(data[:, 0], kind='stable')
+        data = data[order]
+        properties = {key: np.asarray(value)[order]
+                      for key, value in particles.properties.items()}
+
+        self.notify('processing: candidate links')
+        sources, targets, costs = candidate_links(data, particles.scale,
+                                                  self.max_distance, self.gap)
+        self.notify(f'{len(sources)} candidate links')
+        if self.solver == 'dag':
+            paths = self._dag_shortest_paths(data[:, 0], sources, targets,
+                                             self.weights(costs))
+        elif self.solver == 'bellman-ford':
+            paths = self._shortest_paths(data.shape[0], sources, targets,
+                                         self.weights(costs))
+        else:
+            raise Exception(f'SShortestPathLinker: unknown solver '
+                            f'{self.solver}')
+
+        self.progress(100)
+        self.notify('done')
+        return tracks_from_paths(data, paths, properties, particles.scale)
+
+    def _shortest_paths(self, count, sources, targets, weights):
+        """Extract the tracks iteratively as shortest paths of the graph"""
+        self.notify('processing: build graph')
+        graph = lil_matrix((count + 2, count + 2))
+        graph[0, 1:count+1] = 1
+        graph[1:count+1, count+1] = 1
+        # null weights are not stored in the sparse graph
+        keep = weights != 0
+        graph[sources[keep] + 1, targets[keep] + 1] = weights[keep]
+
+        self.progress(50)
+        self.notify('processing: shortest path')
+        paths = []
+        used = 0
+        while 1:
+            _, predecessors = bellman_ford(csgraph=graph, directed=True,
+                                           indices=0,
+                                           return_predecessors=True)
+            path = []
+            current = count + 1
+            while predecessors[current] > 0:
+                current = predecessors[current]
+                graph[current, :] = 0
+                graph[:, current] = 0
+                path.insert(0, current - 1)
+            if len(path) <= self.min_track_length:
+                break
+            paths.append(np.array(path))
+            used += len(path)
+            self.progress(50 + int(50 * used / max(count, 1)))
+        return paths
+
+    def _dag_shortest_paths(self, frames, sources, targets, weights):
+        """Extract the tracks iteratively as shortest paths of the DAG
+
+        The particles are sorted by frame, so the particles indexes are a
+        topological order of the graph. The distance of a particle is the
+        cost of the shortest path from the source to the particle: 1 for the
+        source edge, plus the weights of the links.
+
+        """
+        count = frames.shape[0]
+        self.notify('processing: build graph')
+        # null weights are not stored in the sparse graph
+        keep = weights != 0
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+        # incoming links of each particle (rows are the targets)
+        incoming = csr_matrix((weights, (targets, sources)),
+                              shape=(count, count))
+        incoming.sort_indices()
+        # outgoing links of each particle (rows are the sources)
+        outgoing = csr_matrix((np.ones(sources.shape[0]),
+                               (sources, targets)), shape=(count, count))
+
+        distances = np.ones(count)
+        predecessors = np.full(count, -1)
+        self._dag_initialize(frames, incoming, distances, predecessors)
+
+        self.progress(50)
+        self.notify('processing: shortest path')
+        used = np.zeros(count, dtype=bool)
+        heap = list(zip(distances.tolist(), range(count)))
+        heapq.heapify(heap)
+        paths = []
+        while len(heap) > 0:
+            distance, last = heapq.heappop(heap)
+            if used[last] or distance != distances[last]:
+                continue  # outdated entry
+            path = [last]
+            while predecessors[path[-1]] >= 0:
+                path.append(predecessors[path[-1]])
+            if len(path) <= self.min_track_length:
+                break
+            path = np.array(path[::-1])
+            paths.append(path)
+            used[path] = True
+            for node in self._dag_update(path, incoming, outgoing, used,
+                                         distances, predecessors):
+                heapq.heappush(heap, (distances[node], node))
+            self.progress(50 + int(50 * used.sum() / count))
+        return paths
+
+    @staticmethod
+    def _dag_initialize(frames, incoming, distances, predecessors):
+        """Compute the shortest paths distances frame by frame"""
+        starts = np.flatnonzero(np.diff(frames, prepend=np.nan) != 0)
+        stops = np.append(starts[1:], frames.shape[0])
+        for start, stop in zip(starts, stops):
+            first, last = incoming.indptr[start], incoming.indptr[stop]
+            if first == last:
+                continue
+            nodes = np.repeat(np.arange(start, stop),
+                              np.diff(incoming.indptr[start:stop+1]))
+            parents = incoming.indices[first:last]
+            candidates = distances[parents] + incoming.data[first:last]
+            # best candidate of each particle: sort by particle and cost
+            order = np.lexsort((candidates, nodes))
+            nodes, parents = nodes[order], parents[order]
+            candidates = candidates[order]
+            best = np.flatnonzero(np.diff(nodes, prepend=-1) != 0)
+            nodes, parents = nodes[best], parents[best]
+            candidates = candidates[best]
+            better = candidates < distances[nodes]
+            distances[nodes[better]] = candidates[better]
+            predecessors[nodes[better]] = parents[better]
+
+    @staticmethod
+    def _dag_update(path, incoming, outgoing, used, distances, predecessors):
+        """Update the shortest paths after the extraction of a track
+
+        Only the particles whose shortest path went through the removed
+        track (its descendants) can have a longer shortest path.
+
+        Returns
+        -------
+        updated: list
+            Indexes of the updated particles
+
+        """
+        removed = set(path.tolist())
+        affected = set()
+        stack = list(removed)
+        while len(stack) > 0:
+            node = stack.pop()
+            children = outgoing.indices[outgoing.indptr[node]:
+                                        outgoing.indptr[node+1]]
+            for child in children[predecessors[children] == node].tolist():
+                if not used[child] and child not in affected:
+                    affected.add(child)
+                    stack.append(child)
+        updated = sorted(affected)
+        for node in updated:
+            first, last = incoming.indptr[node], incoming.indptr[node+1]
+            parents = incoming.indices[first:last]
+            candidates = distances[parents] + incoming.data[first:last]
+            candidates[used[parents]] = np.inf
+            distances[node] = 1
+            predecessors[node] = -1
+            if candidates.shape[0] > 0:
+                best = np.argmin(candidates)
+                if candidates[best] < 1:
+                    distances[node] = candidates[best]
+                    predecessors[node] = parents[best]
+        return updated
+
+
+class SLAPLinker(SLinker):
+    """Linear assignment (LAP) linker with sparse cost matrices
+
+    The tracks are built in two linear assignment steps, as in Jaqaman et
+    al. 2008:
+
+    1. frame to frame linking: the particles of consecutive frames are
+       linked, all frames at once
+    2. gap closing: the ends of the tracks segments are linked to the
+       starts of the segments up to ``gap`` frames later
+
+    Each step is a single sparse assignment problem (see
+    ``assignment_links``) built from the candidate links found with a
+    KD-tree (see ``candidate_links``). The links costs are the squared
+    euclidean distances in the particles scale units, and the cost of
+    ending or starting a track is the squared max distance.
+
+    With a motion model, the frames are linked one after the other: the
+    particles are searched around the positions predicted from the
+    segments built in the previous frames, and the costs are the squared
+    distances to the predicted positions. The gaps are closed with the
+    positions predicted at the end of the segments.
+
+    Parameters
+    ----------
+    max_distance: float
+        Maximum distance between a linked particle and the (predicted)
+        position of the track
+    gap: int
+        Gap (in frame number) of possible missing detections
+    min_track_length: int
+        Tracks with this number of particles or less are discarded
+    motion: SMotionModel
+        Motion model predicting the tracks positions. None for a brownian
+        motion (no prediction)
+    initial_distance: float
+        Maximum distance of the second particle of a track, when the
+        motion cannot be predicted yet. By default max_distance
+
+    """
+    def __init__(self, max_distance=5, gap=1, min_track_length=2,
+                 motion=None, initial_distance=None):
+        super().__init__(None)
+        self.max_distance = max_distance
+        self.gap = gap
+        self.min_track_length = min_track_length
+        self.motion = motion
+        if initial_distance is None:
+            initial_distance = max_distance
+        self.initial_distance = initial_distance
+
+    def run(self, particles, image=None):
+        """Run the linker
+
+        Parameters
+        ----------
+        particles: SParticles
+            Particles of all the frames
+        image: ndarray
+            Not used
+
+        Returns
+        -------
+        tracks: STracks
+
+        """
+        data = particles.data
+        self.notify('processing')
+        self.progress(0)
+
+        order = np.argsort(data[:, 0], kind='stable')
+        data = data[order]
+        properties = {key: np.asarray(value)[order]
+                      for key, value in particles.properties.items()}
+        count = data.shape[0]
+        if self.motion is not None or \
+                self.initial_distance != self.max_distance:
+            link_sources, link_targets = self._predicted_links(
+                data, scaled_coordinates(data, particles.scale))
+            paths = [path for path in chain_links(link_sources,
+                                                  link_targets, count)
+                     if len(path) > self.min_track_length]
+            self.progress(100)
+            self.notify('done')
+            return tracks_from_paths(data, paths, properties,
+                                     particles.scale)
+
+        self.notify('processing: candidate links')
+        sources, targets, costs = candidate_links(data, particles.scale,
+                                                  self.max_distance, self.gap)
+        self.notify(f'{len(sources)} candidate links')
+        no_link_cost = self.max_distance ** 2
+
+        self.notify('processing: frame to frame linking')
+        self.progress(20)
+        consecutive = data[targets, 0] - data[sources, 0] == 1
+        selected = assignment_links(sources[consecutive],
+                                    targets[consecutive],
+                                    costs[consecutive], no_link_cost)
+        link_sources = sources[consecutive][selected]
+        link_targets = targets[consecutive][selected]
+
+        self.notify('processing: gap closing')
+        self.progress(60)
+        ends = np.ones(count, dtype=bool)
+        ends[link_sources] = False
+        starts = np.ones(count, dtype=bool)
+        starts[link_targets] = False
+        gaps = ~consecutive & ends[sources] & starts[targets]
+        selected = assignment_links(sources[gaps], targets[gaps],
+                                    costs[gaps], no_link_cost)
+        link_sources = np.concatenate((link_sources, sources[gaps][selected]))
+        link_targets = np.concatenate((link_targets, targets[gaps][selected]))
+
+        paths = [path for path in chain_links(link_sources, link_targets,
+                                              count)
+                 if len(path) > self.min_track_length]
+        self.progress(100)
+        self.notify('done')
+        return tracks_from_paths(data, paths, properties, particles.scale)
+
+    def _predicted_links(self, data, coordinates):
+        """Link the frames one after the other with the motion model
+
+        Parameters
+        ----------
+        data: ndarray
+            Particles data [T, (Z), Y, X], sorted by frame
+        coordinates: ndarray
+            Scaled spatial coordinates of the particles
+
+        Returns
+        -------
+        sources: ndarray
+            Index of the first particle of each link
+        targets: ndarray
+            Index of the second particle of each link
+
+        """
+        motion = self.motion
+        if motion is None:
+            motion = SMotionModel()
+        no_link_cost = max(self.max_distance, self.initial_distance) ** 2
+        count = data.shape[0]
+        indexes = frame_indexes(data)
+        frames = sorted(indexes)
+        # state of the segment ending at each particle
+        states = motion.initialize(coordinates)
+        lengths = np.ones(count, dtype=int)
+
+        def radius(index):
+            return np.where(lengths[index] > 1, self.max_distance,
+                            self.initial_distance)
+
+        self.notify('processing: frame to frame linking')
+        link_sources, link_targets = [], []
+        for i, frame in enumerate(frames[1:]):
+            self.progress(int(60 * i / len(frames)))
+            if frame - 1 not in indexes:
+                continue
+            previous, index = indexes[frame - 1], indexes[frame]
+            sources, targets, costs = predicted_links(
+                motion.predict(states[previous], 1), radius(previous),
+                coordinates[index])
+            selected = assignment_links(sources, targets, costs,
+                                        no_link_cost)
+            sources, targets = previous[sources[selected]], \
+                index[targets[selected]]
+            states[targets] = motion.update(states[sources],
+                                            coordinates[targets], 1)
+            lengths[targets] = lengths[sources] + 1
+            link_sources.append(sources)
+            link_targets.append(targets)
+        link_sources = np.concatenate(
+            [np.empty((0,), dtype=int)] + link_sources)
+        link_targets = np.concatenate(
+            [np.empty((0,), dtype=int)] + link_targets)
+
+        self.notify('processing: gap closing')
+        self.progress(60)
+        ends = np.ones(count, dtype=bool)
+        ends[link_sources] = False
+        starts = np.ones(count, dtype=bool)
+        starts[link_targets] = False
+        sources, targets, costs = [], [], []
+        for dt in range(2, self.gap + 1):
+            for frame in frames:
+                if frame + dt not in indexes:
+                    continue
+                end = indexes[frame][ends[indexes[frame]]]
+                start = indexes[frame + dt][starts[indexes[frame + dt]]]
+                source, target, cost = predicted_links(
+                    motion.predict(states[end], dt), radius(end),
+                    coordinates[start])
+                sources.append(end[source])
+                targets.append(start[target])
+                costs.append(cost)
+        if len(costs) > 0:
+            sources = np.concatenate(sources)
+            targets = np.concatenate(targets)
+            costs = np.concatenate(costs)
+            selected = assignment_links(sources, targets, costs,
+                                        no_link_cost)
+            link_sources = np.concatenate((link_sources, sources[selected]))
+            link_targets = np.concatenate((link_targets, targets[selected]))
+        return link_sources, link_targets
+
+
+class SNearestNeighborLinker(SLinker):
+    """Greedy nearest neighbor linker with a spatial index
+
+    The frames are linked in time order. The particles of a frame are
+    searched with a KD-tree around the ends of the tracks of the previous
+    gap frames, and linked to them by increasing distance, one to one (see
+    ``greedy_links``). The particles not linked start new tracks. There is
+    no global optimization, so it is much faster than the shortest path
+    and LAP linkers, and well suited to sparse particles.
+
+    Parameters
+    ----------
+    max_distance: float
+        Maximum distance between a linked particle and the (predicted)
+        position of the track end
+    gap: int
+        Gap (in frame number) of possible missing detections
+    min_track_length: int
+        Tracks with this number of particles or less are discarded
+    motion: SMotionModel
+        Motion model predicting the tracks positions. None for a brownian
+        motion (no prediction)
+    initial_distance: float
+        Maximum distance of the second particle of a track, when the
+        motion cannot be predicted yet. By default max_distance
+
+    """
+    def __init__(self, max_distance=5, gap=1, min_track_length=2,
+                 motion=None, initial_distance=None):
+        super().__init__(None)
+        self.max_distance = max_distance
+        self.gap = gap
+        self.min_track_length = min_track_length
+        if motion is None:
+            motion = SMotionModel()
+        self.motion = motion
+        if initial_distance is None:
+            initial_distance = max_distance
+        self.initial_distance = initial_distance
+
+    def run(self, particles, image=None):
+        """Run the linker
+
+        Parameters
+        ----------
+        particles: SParticles
+            Particles of all the frames
+        image: ndarray
+            Not used
+
+        Returns
+        -------
+        tracks: STracks
+
+        """
+        data = particles.data
+        self.notify('processing')
+        self.progress(0)
+
+        order = np.argsort(data[:, 0], kind='stable')
+        data = data[order]
+        properties = {key: np.asarray(value)[order]
+                      for key, value in particles.properties.items()}
+        count = data.shape[0]
+        coordinates = scaled_coordinates(data, particles.scale)
+        indexes = frame_indexes(data)
+
+        # state of the track ending at each particle
+        states = self.motion.initialize(coordinates)
+        lengths = np.ones(count, dtype=int)
+        ends = np.empty((0,), dtype=int)
+        link_sources, link_targets = [], []
+        for i, frame in enumerate(sorted(indexes)):
+            self.progress(int(100 * i / len(indexes)))
+            index = indexes[frame]
+            ends = ends[data[ends, 0] >= frame - self.gap]
+            dt = frame - data[ends, 0]
+            radius = np.where(lengths[ends] > 1, self.max_distance,
+                              self.initial_distance)
+            sources, targets, costs = predicted_links(
+                self.motion.predict(states[ends], dt), radius,
+                coordinates[index])
+            selected = greedy_links(sources, targets, costs)
+            sources, targets = sources[selected], targets[selected]
+            states[index[targets]] = self.motion.update(
+                states[ends[sources]], coordinates[index[targets]],
+                dt[sources])
+            lengths[index[targets]] = lengths[ends[sources]] + 1
+            link_sources.append(ends[sources])
+            link_targets.append(index[targets])
+            linked = np.zeros(ends.shape[0], dtype=bool)
+            linked[sources] = True
+            ends = np.concatenate((ends[~linked], index))
+
+        link_sources = np.concatenate(
+            [np.empty((0,), dtype=int)] + link_sources)
+        link_targets = np.concatenate(
+            [np.empty((0,), dtype=int)] + link_targets)
+        paths = [path for path in chain_links(link_sources, link_targets,
+                                              count)
+                 if len(path) > self.min_track_length]
+        self.progress(100)
+        self.notify('done')
+        return tracks_from_paths(data, paths, properties, particles.scale)
+
+
+class SWindowedLinker(SLinker):
+    """Link a long movie by overlapping time windows
+
+    The time axis is split into windows of consecutive frames, extended by
+    overlap frames. Each window is linked independently, in a pool of
+    processes, and only the links starting in the window (not in its
+    overlap) are kept. The windows links are then stitched into tracks: the
+    overlap frames give the links crossing the windows borders, and
+    conflicting links are resolved in favor of the shortest one.
+
+    The windows are linked without minimum track length, because the
+    tracks are cut at the windows end: the tracks shorter than the linker
+    minimum track length are removed after stitching.
+
+    The windowed linking is an approximation of the whole movie linking:
+    the linker only sees the frames of a window and its overlap, so when the
+    particles are dense a few links can differ from the links found on the
+    whole movie (a few percent of the links with windows of 10 to 20
+    frames). The result is the same when the window covers all the frames.
+
+    Parameters
+    ----------
+    linker: SLinker
+        Linker to run on each window. It must copy the particles properties
+        to the tracks (as SShortestPathLinker)
+    window: int
+        Number of frames of each window (without the overlap)
+    overlap: int
+        Number of frames added at the end of each window. By default, twice
+        the linker gap plus its minimum track length
+    workers: int
+        Number of processes used to link the windows. 1 links the windows
+        in the calling thread
+
+    """
+    def __init__(self, linker, window=100, overlap=None, workers=1):
+        super().__init__(None)
+        self.linker = linker
+        self.window = window
+        if overlap is None:
+            overlap = 2 * linker.gap + linker.min_track_length
+        self.overlap = overlap
+        self.workers = workers
+        self.min_track_length = getattr(linker, 'min_track_length', 0)
+        self._window_linker = copy.copy(linker)
+        self._window_linker.min_track_length = 0
+
+    def windows(self, frames):
+        """Frames range of each window
+
+        Parameters
+        ----------
+        frames: ndarray
+            Frame of each particle
+
+        Returns
+        -------
+        windows: list
+            (start, stop) frames of the core of each window
+
+        """
+        first, last = int(frames.min()), int(frames.max())
+        return [(start, start + self.window)
+                for start in range(first, last + 1, self.window)]
+
+    def run(self, particles, image=None):
+        """Run the linker
+
+        Parameters
+        ----------
+        particles: SParticles
+            Particles of all the frames
+        image: ndarray
+            Not used
+
+        Returns
+        -------
+        tracks: STracks
+
+        """
+        data = particles.data
+        self.notify('processing')
+        self.progress(0)
+        if data.shape[0] == 0:
+            return tracks_from_paths(data, [], particles.properties,
+                                     particles.scale)
+        frames = data[:, 0]
+        windows = self.windows(frames)
+        self.notify(f'linking {len(windows)} windows')
+        jobs = []
+        for start, stop in windows:
+            index = np.flatnonzero((frames >= start) &
+                                   (frames < stop + self.overlap))
+            jobs.append((start, stop, index))
+
+        links = []
+        if self.workers > 1 and len(jobs) > 1:
+            self._run_parallel(data, particles.scale, jobs, links)
+        else:
+            for i, job in enumerate(jobs):
+                self.progress(int(90 * i / len(jobs)))
+                links.append(self._window_links(
+                    data, job, link_window(self._window_linker,
+                                           data[job[2]], particles.scale)))
+
+        self.notify('stitching windows')
+        sources = np.concatenate([link[0] for link in links])
+        targets = np.concatenate([link[1] for link in links])
+        coordinates = scaled_coordinates(data, particles.scale)
+        costs = np.sum((coordinates[sources] - coordinates[targets]) ** 2,
+                       axis=1)
+        paths = links_paths(sources, targets, costs, data.shape[0])
+        paths = [path for path in paths
+                 if len(path) > self.min_track_length]
+        self.progress(100)
+        self.notify('done')
+        return tracks_from_paths(data, paths, particles.properties,
+                                 particles.scale)
+
+    def _run_parallel(self, data, scale, jobs, links):
+        """Link the windows in a pool of processes"""
+        executor = ProcessPoolExecutor(max_workers=self.workers)
+        pending = dict()
+        try:
+            for job in jobs:
+                pending[executor.submit(link_window, self._window_linker,
+                                        data[job[2]], scale)] = job
+            while len(pending) > 0:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    links.append(self._window_links(data, job,
+                                                    future.result()))
+                self.progress(int(90 * len(links) / len(jobs)))
+        except BaseException:
+            # canceled by an observer or failed: drop the waiting windows
+            # (cancel_futures needs python 3.9)
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+            raise
+        executor.shutdown()
+
+    @staticmethod
+    def _window_links(data, job, window_links):
+        """Keep the links of a window starting in its core frames"""
+        start, stop, index = job
+        sources, targets = index[window_links[0]], index[window_links[1]]
+        core = (data[sources, 0] >= start) & (data[sources, 0] < stop)
+        return sources[core], targets[core]
+
+
+def changed_frames(previous, data):
+    """Frames whose particles differ between two versions of the particles
+
+    Parameters
+    ----------
+    previous: ndarray
+        Previous particles data [T, (Z), Y, X]
+    data: ndarray
+        Current particles data [T, (Z), Y, X]
+
+    Returns
+    -------
+    frames: ndarray
+        Sorted indexes of the frames with added, removed or moved particles
+
+    """
+    previous_indexes = frame_indexes(previous)
+    indexes = frame_indexes(data)
+    frames = []
+    for frame in set(previous_indexes) | set(indexes):
+        if frame not in previous_indexes or frame not in indexes or \
+                not np.array_equal(previous[previous_indexes[frame]],
+                                   data[indexes[frame]]):
+            frames.append(frame)
+    return np.array(sorted(frames))
+
+
+class SIncrementalLinker(SLinker):
+    """Relink only the frames around the edited particles
+
+    The linker remembers the particles and the links of its last run. When
+    it is run again on the same particles with a few frames edited
+    (particles added, removed or moved), only the frames up to ``gap``
+    frames around the edited frames are relinked. The previous links
+    outside of these frames are kept, and the new links are stitched to
+    them as in ``SWindowedLinker``.
+
+    The first run (or a run with too many edited frames) links all the
+    particles with the linker itself, so the tracks are exactly the linker
+    tracks. When relinking, as in ``SWindowedLinker``, the edited frames
+    are linked without minimum track length, and the short tracks are
+    removed after stitching, so that a track extended by an edit is not
+    lost. The relinked tracks are then an approximation of the tracks the
+    linker would find on all the particles: the shortest path linker stops
+    at the first track shorter than its minimum track length, instead of
+    filtering the short tracks.
+
+    Parameters
+    ----------
+    linker: SLinker
+        Linker used to link the particles. It must copy the particles
+        properties to the tracks (as SShortestPathLinker)
+    gap: int
+        Gap (in frame number) of the linker. By default the linker gap
+    max_changed: float
+        Fraction of edited frames above which all the particles are
+        relinked
+
+    """
+    def __init__(self, linker, gap=None, max_changed=0.5):
+        super().__init__(None)
+        self.linker = linker
+        if gap is None:
+            gap = linker.gap
+        self.gap = gap
+        self.max_changed = max_changed
+        self.min_track_length = getattr(linker, 'min_track_length', 0)
+        self._linker = copy.copy(linker)
+        self._linker.min_track_length = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the last run, so the next run links all the particles"""
+        self._data = None
+        self._sources = None
+        self._targets = None
+
+    def run(self, particles, image=None):
+        """Run the linker
+
+        Parameters
+        ----------
+        particles: SParticles
+            Particles of all the frames
+        image: ndarray
+            Not used
+
+        Returns
+        -------
+        tracks: STracks
+
+        """
+        data = np.asarray(particles.data)
+        self.notify('processing')
+        self.progress(0)
+        changed = None
+        if self._data is not None and self._data.shape[1] == data.shape[1]:
+            changed = changed_frames(self._data, data)
+            frames_count = len(set(np.unique(self._data[:, 0])) |
+                               set(np.unique(data[:, 0])))
+            if len(changed) > self.max_changed * frames_count:
+                changed = None
+        if data.shape[0] == 0:
+            sources = np.empty((0,), dtype=int)
+            targets = np.empty((0,), dtype=int)
+        elif changed is None:
+            # the linker itself, with its own stopping rule
+            self.notify('linking all the frames')
+            sources, targets = link_window(self.linker, data,
+                                           particles.scale)
+        else:
+            self.notify(f'{len(changed)} edited frames')
+            sources, targets = self._relink(data, changed, particles.scale)
+        self._data = data.copy()
+        self._sources, self._targets = sources, targets
+
+        paths = [path for path in chain_links(sources, targets, data.shape[0])
+                 if len(path) > self.min_track_length]
+        self.progress(100)
+        self.notify('done')
+        return tracks_from_paths(data, paths, particles.properties,
+                                 particles.scale)
+
+    def _relink(self, data, changed, scale):
+        """Relink the frames around the edited frames
+
+        Returns
+        -------
+        sources: ndarray
+            Index in data of the first particle of each link
+        targets: ndarray
+            Index in data of the second particle of each link
+
+        """
+        if len(changed) == 0:
+            return self._sources, self._targets
+        # previous particles index in the current particles
+        previous_indexes = frame_indexes(self._data)
+        indexes = frame_indexes(data)
+        mapping = np.full(self._data.shape[0], -1)
+        for frame, previous_index in previous_indexes.items():
+            if frame in indexes and frame not in changed:
+                mapping[previous_index] = indexes[frame]
+
+        def near(frames, distance):
+            position = np.searchsorted(changed, frames)
+            before = np.abs(frames - changed[np.maximum(position - 1, 0)])
+            after = np.abs(changed[np.minimum(position, len(changed) - 1)]
+                           - frames)
+            return np.minimum(before, after) <= distance
+
+        # previous links outside the relinked frames
+        sources = mapping[self._sources]
+        targets = mapping[self._targets]
+        keep = (sources >= 0) & (targets >= 0)
+        sources, targets = sources[keep], targets[keep]
+        keep = ~near(data[sources, 0], self.gap) & \
+            ~near(data[targets, 0], self.gap)
+        sources, targets = sources[keep], targets[keep]
+
+        # new links of the relinked frames, with a gap frames context
+        index = np.flatnonzero(near(data[:, 0], 2 * self.gap))
+        self.notify(f'relinking {len(np.unique(data[index, 0]))} frames')
+        new_sources, new_targets = link_window(self._linker, data[index],
+                                               scale)
+        new_sources, new_targets = index[new_sources], index[new_targets]
+        keep = near(data[new_sources, 0], self.gap) | \
+            near(data[new_targets, 0], self.gap)
+
+        sources = np.concatenate((sources, new_sources[keep]))
+        targets = np.concatenate((targets, new_targets[keep]))
+        coordinates = scaled_coordinates(data, scale)
+        costs = np.sum((coordinates[sources] - coordinates[targets]) ** 2,
+                       axis=1)
+        return paths_links(links_paths(sources, targets, costs,
+                                       data.shape[0]))
+
+
+class SOnlineLinker(SLinker):
+    """Link the particles frame by frame, as they are detected
+
+    The frames are pushed in time order with ``push``. Only the ends of the
+    active tracks (tracks with a particle in the last gap frames) are
+    candidates for the links: the particles of a new frame are assigned to
+    the active tracks ends by increasing distance, one to one, and the
+    particles not assigned start new tracks. A track that cannot be
+    extended anymore is finished and returned by ``push``, so the tracks
+    are emitted while the movie is being processed (or acquired). ``flush``
+    finishes all the tracks at the end of the movie.
+
+    With a motion model, the particles are searched around the predicted
+    positions of the tracks ends instead of their last positions.
+
+    Parameters
+    ----------
+    max_distance: float
+        Maximum distance between a linked particle and the (predicted)
+        position of the track end
+    gap: int
+        Gap (in frame number) of possible missing detections
+    min_track_length: int
+        Tracks with this number of particles or less are discarded
+    scale: tuple or list
+        Scale of the particles. The distances are computed in the scale
+        units
+    motion: SMotionModel
+        Motion model predicting the tracks positions. None for a brownian
+        motion (no prediction)
+    initial_distance: float
+        Maximum distance of the second particle of a track, when the
+        motion cannot be predicted yet. By default max_distance
+
+    """
+    def __init__(self, max_distance=5, gap=1, min_track_length=2,
+                 scale=None, motion=None, initial_distance=None):
+        super().__init__(None)
+        self.max_distance = max_distance
+        self.gap = gap
+        self.min_track_length = min_track_length
+        self.scale = scale
+        if motion is None:
+            motion = SMotionModel()
+        self.motion = motion
+        if initial_distance is None:
+            initial_distance = max_distance
+        self.initial_distance = initial_distance
+        self.reset(scale)
+
+    def reset(self, scale=None):
+        """Remove all the tracks to start a new movie"""
+        self.scale = scale
+        self._active = dict()
+        self._count = 0
+        self._last_frame = None
+
+    def push(self, frame, data, properties=None):
+        """Link the particles of a new frame
+
+        Parameters
+        ----------
+        frame: int
+            Index of the frame. The frames must be pushed in time order
+        data: ndarray
+            Particles of the frame [T, (Z), Y, X]
+        properties: dict
+            Properties of the particles
+
+        Returns
+        -------
+        finished: list
+            (track_id, data, properties) of the tracks finished before this
+            frame
+
+        """
+        if self._last_frame is not None and frame <= self._last_frame:
+            raise Exception('SOnlineLinker: the frames must be pushed in '
+                            'time order')
+        self._last_frame = frame
+        if properties is None:
+            properties = dict()
+        finished = self._finish([track_id for track_id, track
+                                 in self._active.items()
+                                 if track['frame'] < frame - self.gap])
+        assigned = np.full(data.shape[0], -1)
+        positions = scaled_coordinates(data, self.scale)
+        states = self.motion.initialize(positions)
+        if len(self._active) > 0 and data.shape[0] > 0:
+            tracks = list(self._active.values())
+            ids = np.array(list(self._active.keys()))
+            ends = np.array([track['state'] for track in tracks])
+            dt = frame - np.array([track['frame'] for track in tracks])
+            radius = np.where(
+                np.array([len(track['rows']) for track in tracks]) > 1,
+                self.max_distance, self.initial_distance)
+            sources, targets, costs = predicted_links(
+                self.motion.predict(ends, dt), radius, positions)
+            selected = greedy_links(sources, targets, costs)
+            sources, targets = sources[selected], targets[selected]
+            assigned[targets] = ids[sources]
+            states[targets] = self.motion.update(ends[sources],
+                                                 positions[targets],
+                                                 dt[sources])
+        for i in range(data.shape[0]):
+            if assigned[i] < 0:
+                assigned[i] = self._count
+                self._active[self._count] = {'rows': [], 'properties': []}
+                self._count += 1
+            track = self._active[assigned[i]]
+            track['rows'].append(data[i])
+            track['properties'].append({key: value[i] for key, value
+                                        in properties.items()})
+            track['frame'] = frame
+            track['state'] = states[i]
+        return finished
+
+    def flush(self):
+        """Finish all the active tracks
+
+        Returns
+        -------
+        finished: list
+            (track_id, data, properties) of the finished tracks
+
+        """
+        finished = self._finish(list(self._active.keys()))
+        self._last_frame = None
+        return finished
+
+    def _finish(self, track_ids):
+        """Remove tracks from the active tracks and return the long ones"""
+        finished = []
+        for track_id in track_ids:
+            track = self._active.pop(track_id)
+            if len(track['rows']) <= self.min_track_length:
+                continue
+            properties = {key: np.array([prop[key] for prop
+                                         in track['properties']])
+                          for key in track['properties'][0]}
+            finished.append((track_id, np.array(track['rows']), properties))
+        return finished
+
+    def run(self, particles, image=None):
+        """Link all the particles at once, frame by frame
+
+        Parameters
+        ----------
+        particles: SParticles
+            Particles of all the frames
+        image: ndarray
+            Not used
+
+        Returns
+        -------
+        tracks: STracks
+
+        """
+        self.notify('processing')
+        self.progress(0)
+        self.reset(particles.scale)
+        indexes = frame_indexes(particles.data)
+        finished = []
+        for i, (frame, index) in enumerate(indexes.items()):
+            self.progress(int(100 * i / len(indexes)))
+            properties = {key: np.asarray(value)[index]
+                          for key, value in particles.properties.items()}
+            finished += self.push(frame, particles.data[index], properties)
+        finished += self.flush()
+        self.progress(100)
+        self.notify('done')
+        return finished_tracks(finished, particles.data.shape[1],
+                               particles.scale)
+
+
+def finished_tracks(finished, ndim, scale=None):
+    """Create the tracks container from the tracks of an online linker
+
+    Parameters
+    ----------
+    finished: list
+        (track_id, data, properties) of the tracks
+    ndim: int
+        Number of dimensions of the particles (time included)
+    scale: tuple or list
+        Scale of the particles
+
+    Returns
+    -------
+    tracks: STracks
+        The tracks, with consecutive ids in the order of their creation
+
+    """
+    finished = sorted(finished, key=lambda track: track[0])
+    if len(finished) == 0:
+        return STracks(data=np.empty((0, ndim + 1)), properties={},
+                       graph={}, features={}, scale=scale)
+    data = np.concatenate([np.column_stack((np.full(len(rows), i), rows))
+                           for i, (_, rows, _) in enumerate(finished)])
+    properties = {key: np.concatenate([track[2][key] for track in finished])
+                  for key in finished[0][2]}
+    return STracks(data=data, properties=properties, graph={}, features={},
+                   scale=scale)
@@ -3,6 +3,8 @@ from ._slinking_workers import (SLinkerNearestNeighborWidget,
                                 SLinkerNearestNeighborWorker,
                                 SLinkerShortestPathWidget,
                                 SLinkerShortestPathWorker,
+                                SLinkerLAPWidget,
+                                SLinkerLAPWorker,
                                 )
 
 
@@ -48,3 +50,25 @@ class SLinkerShortestPath(SNapariPlugin):
         self.init_ui()
         self.widget.init_layer_list()
         self.set_advanced(True)
+
+
+class SLinkerLAP(SNapariPlugin):
+    """Plugin to link detections using the linear assignment algorithm
+
+    Parameters
+    ----------
+    napari_viewer: Viewer
+        Napari viewer
+
+    """
+    def __init__(self, napari_viewer):
+        super().__init__(napari_viewer)
+        self.title = 'S Linker LAP'
+        self.widget = SLinkerLAPWidget(napari_viewer)
+        self.worker = SLinkerLAPWorker(napari_viewer, self.widget)
+        self.widget.advanced.connect(self.set_advanced)
+        self.widget.enable.connect(self.set_enable)
+        self.fill_widget_resize = 0
+        self.init_ui()
+        self.widget.init_layer_list()
+        self.set_advanced(True)
@@ -1,13 +1,205 @@
 from qtpy.QtWidgets import (QWidget, QGridLayout, QLabel, QLineEdit,
                             QComboBox, QCheckBox, QVBoxLayout, QHBoxLayout,
                             QPushButton, QMessageBox)
+from qtpy.QtCore import Signal
+import numpy as np
 import napari
 from ._splugin import SNapariWorker, SNapariWidget, SProgressObserver
+from ._slinking_engine import (SShortestPathLinker, SWindowedLinker,
+                               SLAPLinker, SIncrementalLinker,
+                               SNearestNeighborLinker,
+                               estimate_max_distance, candidate_count)
+from ._smotion_model import motion_model
+from ._sdrift_engine import (image_drift, points_drift, remove_drift,
+                             restore_drift)
 
-from stracking.linkers import SNNLinker, SPLinker, EuclideanCost
 from stracking.containers import SParticles, STracks
 
 
+# ------------------- Common ------------
+class SDriftWidget(QWidget):
+    """Widget for the drift correction options of the linker plugins
+
+    The drift is estimated from an image layer (phase correlation) or from
+    the detections (median nearest neighbour displacement), subtracted
+    from the detections before linking and added back to the tracks
+
+    """
+    def __init__(self):
+        super().__init__()
+
+        self._method_label = QLabel('Drift correction')
+        self._method_value = QComboBox()
+        self._method_value.addItems(['None', 'Detections', 'Image'])
+        self._method_value.currentTextChanged.connect(self._on_method_change)
+
+        self._image_label = QLabel('Drift image layer')
+        self._image_layer_box = QComboBox()
+
+        self._distance_label = QLabel('Drift max distance')
+        self._distance_value = QLineEdit('20')
+
+        layout = QGridLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self._method_label, 0, 0)
+        layout.addWidget(self._method_value, 0, 1)
+        layout.addWidget(self._image_label, 1, 0)
+        layout.addWidget(self._image_layer_box, 1, 1)
+        layout.addWidget(self._distance_label, 2, 0)
+        layout.addWidget(self._distance_value, 2, 1)
+        self.setLayout(layout)
+        self._on_method_change('None')
+
+    def _on_method_change(self, method):
+        """Show only the options of the selected method"""
+        self._image_label.setVisible(method == 'Image')
+        self._image_layer_box.setVisible(method == 'Image')
+        self._distance_label.setVisible(method == 'Detections')
+        self._distance_value.setVisible(method == 'Detections')
+
+    def update_layers(self, viewer):
+        """Refresh the list of the image layers"""
+        current_text = self._image_layer_box.currentText()
+        self._image_layer_box.clear()
+        for layer in viewer.layers:
+            if isinstance(layer, napari.layers.Image):
+                self._image_layer_box.addItem(layer.name)
+        self._image_layer_box.setCurrentText(current_text)
+
+    def check_inputs(self):
+        """Check the drift correction options
+
+        Returns
+        -------
+        True if all the inputs are correct, False otherwise
+
+        """
+        method = self._method_value.currentText()
+        if method == 'Image' and self._image_layer_box.count() < 1:
+            SNapariWidget.show_error("No image layer for the drift "
+                                     "correction")
+            return False
+        if method == 'Detections':
+            try:
+                distance = float(self._distance_value.text())
+                if distance <= 0:
+                    SNapariWidget.show_error("Drift max distance must be "
+                                             "positive")
+                    return False
+            except ValueError as err:
+                SNapariWidget.show_error("Drift max distance must be a "
+                                         "number")
+                return False
+        return True
+
+    def parameters(self):
+        """Returns the drift correction options"""
+        return {'drift': self._method_value.currentText(),
+                'drift_image': self._image_layer_box.currentText(),
+                'drift_distance': float(self._distance_value.text())}
+
+
+class SDistanceEstimateWidget(QWidget):
+    """Widget to estimate the max distance of the linker plugins
+
+    The max distance is a quantile of the displacements of the particles
+    to their nearest neighbour in the next frame, computed on a sample of
+    frames. The predicted number of candidate links shows the cost of the
+    linking before running it.
+
+    """
+    estimate_requested = Signal()
+
+    def __init__(self):
+        super().__init__()
+
+        self._quantile_label = QLabel('Distance quantile')
+        self._quantile_value = QLineEdit('0.95')
+        self._estimate_button = QPushButton('Estimate')
+        self._estimate_button.released.connect(self.estimate_requested)
+        self._report_label = QLabel()
+        self._report_label.setWordWrap(True)
+
+        layout = QGridLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self._quantile_label, 0, 0)
+        layout.addWidget(self._quantile_value, 0, 1)
+        layout.addWidget(self._estimate_button, 0, 2)
+        layout.addWidget(self._report_label, 1, 0, 1, 3)
+        self.setLayout(layout)
+
+    def estimate(self, layer, gap):
+        """Estimate the max distance of the detections of a points layer
+
+        Parameters
+        ----------
+        layer: Points
+            Detections layer
+        gap: int
+            Gap of the linker
+
+        Returns
+        -------
+        max_distance: float
+            Estimated max distance, None if it cannot be estimated
+
+        """
+        try:
+            quantile = float(self._quantile_value.text())
+            if not 0 < quantile <= 1:
+                SNapariWidget.show_error("Distance quantile must be in "
+                                         "]0, 1]")
+                return None
+        except ValueError as err:
+            SNapariWidget.show_error("Distance quantile must be a number")
+            return None
+        max_distance = estimate_max_distance(layer.data, layer.scale,
+                                             quantile)
+        if max_distance is None or max_distance <= 0:
+            self._report_label.setText('Not enough consecutive frames to '
+                                       'estimate the max distance')
+            return None
+        count = candidate_count(layer.data, layer.scale, max_distance, gap)
+        self._report_label.setText(f'Predicted candidate links: {count}')
+        return max_distance
+
+
+def estimate_drift(viewer, state_params, particles, observer=None):
+    """Estimate the drift with the drift correction options
+
+    Parameters
+    ----------
+    viewer: Viewer
+        Napari viewer
+    state_params: dict
+        Parameters of the linker widget state (see
+        ``SDriftWidget.parameters``)
+    particles: SParticles
+        Particles to link
+    observer: SProgressObserver
+        Observer notified of the progress
+
+    Returns
+    -------
+    drift: ndarray
+        (T, D) drift of each frame, None if the drift is not corrected
+
+    """
+    if state_params['drift'] == 'Image':
+        layer = viewer.layers[state_params['drift_image']]
+        image = layer.data[0] if layer.multiscale else layer.data
+        drift = image_drift(image, observer=observer)
+    elif state_params['drift'] == 'Detections':
+        drift = points_drift(particles.data, state_params['drift_distance'],
+                             scale=particles.scale, observer=observer)
+    else:
+        return None
+    if observer is not None:
+        observer.notify(f'drift estimated: maximum '
+                        f'{np.abs(drift).max():.2f} pixels')
+    return drift
+
+
 # ------------------- SLinkerNearestNeighbor -------
 class SLinkerNearestNeighborWidget(SNapariWidget):
     """Widget for the linker nearest neighbor plugin"""
@@ -18,7 +210,6 @@ class SLinkerNearestNeighborWidget(SNapariWidget):
         napari_viewer.layers.events.inserted.connect(self._on_layer_change)
         napari_viewer.layers.events.removed.connect(self._on_layer_change)
         napari_viewer.layers.events.changed.connect(self._on_layer_change)
-        #napari_viewer.events.layers_change.connect(self._on_layer_change)
 
         self._points_layer_box = QComboBox()
 
@@ -28,6 +219,15 @@ class SLinkerNearestNeighborWidget(SNapariWidget):
         self._gap_label = QLabel('Gap')
         self._gap_value = QLineEdit('2')
 
+        self._motion_label = QLabel('Motion model')
+        self._motion_value = QComboBox()
+        self._motion_value.addItems(['Brownian', 'Constant velocity',
+                                     'Kalman'])
+
+        self._initial_distance_label = QLabel('Initial distance '
+                                              '(0 for max distance)')
+        self._initial_distance_value = QLineEdit('0')
+
         layout = QGridLayout()
         layout.addWidget(QLabel('Detections layer'), 0, 0)
         layout.addWidget(self._points_layer_box, 0, 1)
@@ -35,14 +235,23 @@ class SLinkerNearestNeighborWidget(SNapariWidget):
         layout.addWidget(self._max_distance_value, 1, 1)
         layout.addWidget(self._gap_label, 2, 0)
         layout.addWidget(self._gap_value, 2, 1)
+        layout.addWidget(self._motion_label, 3, 0)
+        layout.addWidget(self._motion_value, 3, 1)
+        layout.addWidget(self._initial_distance_label, 4, 0)
+        layout.addWidget(self._initial_distance_value, 4, 1)
+        self._drift_widget = SDriftWidget()
+        layout.addWidget(self._drift_widget, 5, 0, 1, 2)
+        self._estimate_widget = SDistanceEstimateWidget()
+        self._estimate_widget.estimate_requested.connect(self._on_estimate)
+        layout.addWidget(self._estimate_widget, 6, 0, 1, 2)
         self.setLayout(layout)
-        self._init_layer_list()
 
     def init_layer_list(self):
         """Initialize the layers lists"""
         for layer in self.viewer.layers:
             if isinstance(layer, napari.layers.points.points.Points):
                 self._points_layer_box.addItem(layer.name)
+        self._drift_widget.update_layers(self.viewer)
         if self._points_layer_box.count() < 1:
             self.enable.emit(False)
         else:
@@ -57,21 +266,38 @@ class SLinkerNearestNeighborWidget(SNapariWidget):
             Qt event
 
         """
-        current_points_text = self.points_layer_box.currentText()
-        self.points_layer_box.clear()
+        current_points_text = self._points_layer_box.currentText()
+        self._points_layer_box.clear()
         is_current_points_item_still_here = False
         for layer in self.viewer.layers:
             if isinstance(layer, napari.layers.points.points.Points):
                 if layer.name == current_points_text:
                     is_current_points_item_still_here = True
-                self.points_layer_box.addItem(layer.name)
+                self._points_layer_box.addItem(layer.name)
         if is_current_points_item_still_here:
-            self.points_layer_box.setCurrentText(current_points_text)
+            self._points_layer_box.setCurrentText(current_points_text)
+        self._drift_widget.update_layers(self.viewer)
         if self._points_layer_box.count() < 1:
             self.enable.emit(False)
         else:
             self.enable.emit(True)
 
+    def _on_estimate(self):
+        """Estimate the max distance from the detections layer"""
+        points_layer = self._points_layer_box.currentText()
+        if points_layer not in self.viewer.layers:
+            self.show_error("No detections layer")
+            return
+        try:
+            gap = int(self._gap_value.text())
+        except ValueError as err:
+            self.show_error("Gap value must be an integer")
+            return
+        max_distance = self._estimate_widget.estimate(
+            self.viewer.layers[points_layer], gap)
+        if max_distance is not None:
+            self._max_distance_value.setText(f'{max_distance:.3g}')
+
     def check_inputs(self):
         try:
             distance = float(self._max_distance_value.text())
@@ -90,14 +316,27 @@ class SLinkerNearestNeighborWidget(SNapariWidget):
         except ValueError as err:
             self.show_error("Gap value must be an integer")
             return False
-        return True
+
+        try:
+            initial_distance = float(self._initial_distance_value.text())
+            if initial_distance < 0:
+                self.show_error("Initial distance must be positive")
+                return False
+        except ValueError as err:
+            self.show_error("Initial distance must be a number")
+            return False
+        return self._drift_widget.check_inputs()
 
     def state(self) -> dict:
         return {'name': 'SNearestNeighborLinker',
                 'inputs': {'points': self._points_layer_box.currentText()},
                 'parameters': {'max_distance':
                                float(self._max_distance_value.text()),
-                               'gap': int(self._gap_value.text())
+                               'gap': int(self._gap_value.text()),
+                               'motion': self._motion_value.currentText(),
+                               'initial_distance':
+                               float(self._initial_distance_value.text()),
+                               **self._drift_widget.parameters()
                                },
                 'outputs': ['tracks', 'S Nearest Neighbor Tracks']
                 }
@@ -108,7 +347,7 @@ class SLinkerNearestNeighborWorker(SNapariWorker):
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
 
-        self.observer = SProgressObserver()
+        self.observer = SProgressObserver(self.cancel_event)
         self.observer.progress_signal.connect(self.progress)
         self.observer.notify_signal.connect(self.log)
 
@@ -120,16 +359,25 @@ class SLinkerNearestNeighborWorker(SNapariWorker):
         points_layer = state['inputs']['points']
         state_params = state['parameters']
 
-        max_distance = state_params['max_distance']
-        gap = state_params['gap']
-
-        euclidean_cost = EuclideanCost(max_cost=max_distance * max_distance)
-        linker = SNNLinker(cost=euclidean_cost, gap=gap)
+        initial_distance = state_params['initial_distance']
+        if initial_distance <= 0:
+            initial_distance = None
+        linker = SNearestNeighborLinker(
+            max_distance=state_params['max_distance'],
+            gap=state_params['gap'],
+            motion=motion_model(state_params['motion']),
+            initial_distance=initial_distance)
         linker.add_observer(self.observer)
         particles = SParticles(data=self.viewer.layers[points_layer].data,
                                properties=self.viewer.layers[points_layer].properties,
                                scale=self.viewer.layers[points_layer].scale)
+        drift = estimate_drift(self.viewer, state_params, particles,
+                               self.observer)
+        if drift is not None:
+            particles = remove_drift(particles, drift)
         self._out_data = linker.run(particles)
+        if drift is not None:
+            self._out_data = restore_drift(self._out_data, drift)
 
         self.finished.emit()
 
@@ -142,7 +390,7 @@ class SLinkerNearestNeighborWorker(SNapariWorker):
             msg.exec_()
         else:
             self.viewer.add_tracks(self._out_data.data,
-                                   name='S Shortest Path Tracks',
+                                   name='S Nearest Neighbor Tracks',
                                    scale=self._out_data.scale,
                                    properties=self._out_data.properties,
                                    metadata=self._out_data.features,
@@ -169,6 +417,16 @@ class SLinkerShortestPathWidget(SNapariWidget):
         self._gap_label = QLabel('Gap')
         self._gap_value = QLineEdit('2')
 
+        self._solver_label = QLabel('Solver')
+        self._solver_value = QComboBox()
+        self._solver_value.addItems(['Sparse DAG', 'Bellman-Ford'])
+
+        self._window_label = QLabel('Window (0 for all frames)')
+        self._window_value = QLineEdit('0')
+
+        self._workers_label = QLabel('Workers')
+        self._workers_value = QLineEdit('1')
+
         layout = QGridLayout()
         layout.addWidget(QLabel('Detections layer'), 0, 0)
         layout.addWidget(self._points_layer_box, 0, 1)
@@ -176,6 +434,17 @@ class SLinkerShortestPathWidget(SNapariWidget):
         layout.addWidget(self._max_distance_value, 1, 1)
         layout.addWidget(self._gap_label, 2, 0)
         layout.addWidget(self._gap_value, 2, 1)
+        layout.addWidget(self._solver_label, 3, 0)
+        layout.addWidget(self._solver_value, 3, 1)
+        layout.addWidget(self._window_label, 4, 0)
+        layout.addWidget(self._window_value, 4, 1)
+        layout.addWidget(self._workers_label, 5, 0)
+        layout.addWidget(self._workers_value, 5, 1)
+        self._drift_widget = SDriftWidget()
+        layout.addWidget(self._drift_widget, 6, 0, 1, 2)
+        self._estimate_widget = SDistanceEstimateWidget()
+        self._estimate_widget.estimate_requested.connect(self._on_estimate)
+        layout.addWidget(self._estimate_widget, 7, 0, 1, 2)
         self.setLayout(layout)
         self.init_layer_list()
 
@@ -184,6 +453,7 @@ class SLinkerShortestPathWidget(SNapariWidget):
         for layer in self.viewer.layers:
             if isinstance(layer, napari.layers.points.points.Points):
                 self._points_layer_box.addItem(layer.name)
+        self._drift_widget.update_layers(self.viewer)
         if self._points_layer_box.count() < 1:
             self.enable.emit(False)
         else:
@@ -208,11 +478,28 @@ class SLinkerShortestPathWidget(SNapariWidget):
                 self._points_layer_box.addItem(layer.name)
         if is_current_points_item_still_here:
             self._points_layer_box.setCurrentText(current_points_text)
+        self._drift_widget.update_layers(self.viewer)
         if self._points_layer_box.count() < 1:
             self.enable.emit(False)
         else:
             self.enable.emit(True)
 
+    def _on_estimate(self):
+        """Estimate the max distance from the detections layer"""
+        points_layer = self._points_layer_box.currentText()
+        if points_layer not in self.viewer.layers:
+            self.show_error("No detections layer")
+            return
+        try:
+            gap = int(self._gap_value.text())
+        except ValueError as err:
+            self.show_error("Gap value must be an integer")
+            return
+        max_distance = self._estimate_widget.estimate(
+            self.viewer.layers[points_layer], gap)
+        if max_distance is not None:
+            self._max_distance_value.setText(f'{max_distance:.3g}')
+
     def check_inputs(self):
         try:
             distance = float(self._max_distance_value.text())
@@ -231,29 +518,59 @@ class SLinkerShortestPathWidget(SNapariWidget):
         except ValueError as err:
             self.show_error("Gap value must be an integer")
             return False
-        return True
+
+        try:
+            window = int(self._window_value.text())
+            if window < 0:
+                self.show_error("Window must be positive")
+                return False
+        except ValueError as err:
+            self.show_error("Window must be an integer")
+            return False
+
+        try:
+            workers = int(self._workers_value.text())
+            if workers < 1:
+                self.show_error("Workers must be at least 1")
+                return False
+        except ValueError as err:
+            self.show_error("Workers must be an integer")
+            return False
+        return self._drift_widget.check_inputs()
 
     def state(self) -> dict:
         return {'name': 'SShortestPathLinker',
                 'inputs': {'points': self._points_layer_box.currentText()},
                 'parameters': {'max_distance':
                                float(self._max_distance_value.text()),
-                               'gap': int(self._gap_value.text())
+                               'gap': int(self._gap_value.text()),
+                               'solver': self._solver_value.currentText(),
+                               'window': int(self._window_value.text()),
+                               'workers': int(self._workers_value.text()),
+                               **self._drift_widget.parameters()
                                },
                 'outputs': ['tracks', 'S Shortest Path Tracks']
                 }
 
 
 class SLinkerShortestPathWorker(SNapariWorker):
-    """Worker for the shortest path linker plugin"""
+    """Worker for the shortest path linker plugin
+
+    The worker keeps the linker of its last run: when the same detections
+    layer is linked again with the same parameters, only the frames around
+    the edited detections are relinked (see ``SIncrementalLinker``)
+
+    """
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
 
-        self.observer = SProgressObserver()
+        self.observer = SProgressObserver(self.cancel_event)
         self.observer.progress_signal.connect(self.progress)
         self.observer.notify_signal.connect(self.log)
 
         self._out_data = None
+        self._linker = None
+        self._linker_key = None
 
     def run(self):
         """Execute the processing"""
@@ -264,13 +581,37 @@ class SLinkerShortestPathWorker(SNapariWorker):
         max_distance = state_params['max_distance']
         gap = state_params['gap']
 
-        euclidean_cost = EuclideanCost(max_cost=max_distance * max_distance)
-        linker = SPLinker(cost=euclidean_cost, gap=gap)
-        linker.add_observer(self.observer)
         particles = SParticles(data=self.viewer.layers[points_layer].data,
                                properties=self.viewer.layers[points_layer].properties,
                                scale=self.viewer.layers[points_layer].scale)
-        self._out_data = linker.run(particles)
+        drift = estimate_drift(self.viewer, state_params, particles,
+                               self.observer)
+        if drift is not None:
+            particles = remove_drift(particles, drift)
+        key = (points_layer, tuple(particles.scale),
+               tuple(sorted(state_params.items())))
+        if key != self._linker_key:
+            solver = 'dag'
+            if state_params['solver'] == 'Bellman-Ford':
+                solver = 'bellman-ford'
+            linker = SShortestPathLinker(max_distance=max_distance, gap=gap,
+                                         solver=solver)
+            if state_params['window'] > 0:
+                linker = SWindowedLinker(linker,
+                                         window=state_params['window'],
+                                         workers=state_params['workers'])
+            linker.add_observer(self.observer)
+            self._linker = SIncrementalLinker(linker, gap=gap)
+            self._linker.add_observer(self.observer)
+            self._linker_key = key
+        try:
+            self._out_data = self._linker.run(particles)
+        except BaseException:
+            # the linker state is not valid after a failed or canceled run
+            self._linker_key = None
+            raise
+        if drift is not None:
+            self._out_data = restore_drift(self._out_data, drift)
 
         self.finished.emit()
 
@@ -291,3 +632,199 @@ class SLinkerShortestPathWorker(SNapariWorker):
                                    properties=self._out_data.properties,
                                    metadata=self._out_data.features,
                                    graph=self._out_data.graph)
+
+
+# ------------------- SLinkerLAP ------------
+class SLinkerLAPWidget(SNapariWidget):
+    """Widget for the linear assignment linker plugin"""
+    def __init__(self, napari_viewer):
+        super().__init__()
+        self.viewer = napari_viewer
+
+        napari_viewer.layers.events.inserted.connect(self._on_layer_change)
+        napari_viewer.layers.events.removed.connect(self._on_layer_change)
+        napari_viewer.layers.events.changed.connect(self._on_layer_change)
+
+        self._points_layer_box = QComboBox()
+
+        self._max_distance_label = QLabel('Max distance')
+        self._max_distance_value = QLineEdit('15')
+
+        self._gap_label = QLabel('Gap')
+        self._gap_value = QLineEdit('2')
+
+        self._motion_label = QLabel('Motion model')
+        self._motion_value = QComboBox()
+        self._motion_value.addItems(['Brownian', 'Constant velocity',
+                                     'Kalman'])
+
+        self._initial_distance_label = QLabel('Initial distance '
+                                              '(0 for max distance)')
+        self._initial_distance_value = QLineEdit('0')
+
+        layout = QGridLayout()
+        layout.addWidget(QLabel('Detections layer'), 0, 0)
+        layout.addWidget(self._points_layer_box, 0, 1)
+        layout.addWidget(self._max_distance_label, 1, 0)
+        layout.addWidget(self._max_distance_value, 1, 1)
+        layout.addWidget(self._gap_label, 2, 0)
+        layout.addWidget(self._gap_value, 2, 1)
+        layout.addWidget(self._motion_label, 3, 0)
+        layout.addWidget(self._motion_value, 3, 1)
+        layout.addWidget(self._initial_distance_label, 4, 0)
+        layout.addWidget(self._initial_distance_value, 4, 1)
+        self._drift_widget = SDriftWidget()
+        layout.addWidget(self._drift_widget, 5, 0, 1, 2)
+        self._estimate_widget = SDistanceEstimateWidget()
+        self._estimate_widget.estimate_requested.connect(self._on_estimate)
+        layout.addWidget(self._estimate_widget, 6, 0, 1, 2)
+        self.setLayout(layout)
+
+    def init_layer_list(self):
+        """Initialize the layers lists"""
+        for layer in self.viewer.layers:
+            if isinstance(layer, napari.layers.points.points.Points):
+                self._points_layer_box.addItem(layer.name)
+        self._drift_widget.update_layers(self.viewer)
+        if self._points_layer_box.count() < 1:
+            self.enable.emit(False)
+        else:
+            self.enable.emit(True)
+
+    def _on_layer_change(self, e):
+        """Callback called when a napari layer is updated
+
+        Parameters
+        ----------
+        e: QObject
+            Qt event
+
+        """
+        current_points_text = self._points_layer_box.currentText()
+        self._points_layer_box.clear()
+        is_current_points_item_still_here = False
+        for layer in self.viewer.layers:
+            if isinstance(layer, napari.layers.points.points.Points):
+                if layer.name == current_points_text:
+                    is_current_points_item_still_here = True
+                self._points_layer_box.addItem(layer.name)
+        if is_current_points_item_still_here:
+            self._points_layer_box.setCurrentText(current_points_text)
+        self._drift_widget.update_layers(self.viewer)
+        if self._points_layer_box.count() < 1:
+            self.enable.emit(False)
+        else:
+            self.enable.emit(True)
+
+    def _on_estimate(self):
+        """Estimate the max distance from the detections layer"""
+        points_layer = self._points_layer_box.currentText()
+        if points_layer not in self.viewer.layers:
+            self.show_error("No detections layer")
+            return
+        try:
+            gap = int(self._gap_value.text())
+        except ValueError as err:
+            self.show_error("Gap value must be an integer")
+            return
+        max_distance = self._estimate_widget.estimate(
+            self.viewer.layers[points_layer], gap)
+        if max_distance is not None:
+            self._max_distance_value.setText(f'{max_distance:.3g}')
+
+    def check_inputs(self):
+        try:
+            distance = float(self._max_distance_value.text())
+            if distance <= 0:
+                self.show_error("Max distance must be positive")
+                return False
+        except ValueError as err:
+            self.show_error("Max distance must be a number")
+            return False
+
+        try:
+            gap = int(self._gap_value.text())
+            if gap < 1:
+                self.show_error("Minimum gap value is 1")
+                return False
+        except ValueError as err:
+            self.show_error("Gap value must be an integer")
+            return False
+
+        try:
+            initial_distance = float(self._initial_distance_value.text())
+            if initial_distance < 0:
+                self.show_error("Initial distance must be positive")
+                return False
+        except ValueError as err:
+            self.show_error("Initial distance must be a number")
+            return False
+        return self._drift_widget.check_inputs()
+
+    def state(self) -> dict:
+        return {'name': 'SLAPLinker',
+                'inputs': {'points': self._points_layer_box.currentText()},
+                'parameters': {'max_distance':
+                               float(self._max_distance_value.text()),
+                               'gap': int(self._gap_value.text()),
+                               'motion': self._motion_value.currentText(),
+                               'initial_distance':
+                               float(self._initial_distance_value.text()),
+                               **self._drift_widget.parameters()
+                               },
+                'outputs': ['tracks', 'S LAP Tracks']
+                }
+
+
+class SLinkerLAPWorker(SNapariWorker):
+    """Worker for the linear assignment linker plugin"""
+    def __init__(self, napari_viewer, widget):
+        super().__init__(napari_viewer, widget)
+
+        self.observer = SProgressObserver(self.cancel_event)
+        self.observer.progress_signal.connect(self.progress)
+        self.observer.notify_signal.connect(self.log)
+
+        self._out_data = None
+
+    def run(self):
+        """Execute the processing"""
+        state = self.widget.state()
+        points_layer = state['inputs']['points']
+        state_params = state['parameters']
+
+        initial_distance = state_params['initial_distance']
+        if initial_distance <= 0:
+            initial_distance = None
+        linker = SLAPLinker(max_distance=state_params['max_distance'],
+                            gap=state_params['gap'],
+                            motion=motion_model(state_params['motion']),
+                            initial_distance=initial_distance)
+        linker.add_observer(self.observer)
+        particles = SParticles(data=self.viewer.layers[points_layer].data,
+                               properties=self.viewer.layers[points_layer].properties,
+                               scale=self.viewer.layers[points_layer].scale)
+        drift = estimate_drift(self.viewer, state_params, particles,
+                               self.observer)
+        if drift is not None:
+            particles = remove_drift(particles, drift)
+        self._out_data = linker.run(particles)
+        if drift is not None:
+            self._out_data = restore_drift(self._out_data, drift)
+
+        self.finished.emit()
+
+    def set_outputs(self):
+        """Set the calculated tracks to a new napari layer"""
+        if len(self._out_data.data) == 0:
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Information)
+            msg.setText("No track found")
+            msg.exec_()
+        else:
+            self.viewer.add_tracks(self._out_data.data,
+                                   name='S LAP Tracks',
+                                   scale=self._out_data.scale,
+                                   properties=self._out_data.properties,
+                                   metadata=self._out_data.features,
+                                   graph=self._out_data.graph)
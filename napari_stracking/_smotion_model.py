@@ -0,0 +1,223 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class SMotionModel:
+    """Brownian motion model: the particles are expected where they were
+
+    A motion model predicts the position of the tracks ends in the next
+    frames, and the linkers search the candidate particles around the
+    predicted positions. The state of all the tracks ends is stored in a
+    single (N, S) array, one row per track end, so the predictions and
+    updates are vectorized over the tracks.
+
+    """
+    #: True if the model predicts a displacement once it has seen two
+    #: particles of a track
+    predictive = False
+
+    def initialize(self, positions):
+        """State of new tracks
+
+        Parameters
+        ----------
+        positions: ndarray
+            (N, D) positions of the first particle of each track
+
+        Returns
+        -------
+        state: ndarray
+            (N, S) state of each track
+
+        """
+        return np.array(positions, dtype=float)
+
+    def predict(self, state, dt):
+        """Predicted positions of the tracks
+
+        Parameters
+        ----------
+        state: ndarray
+            (N, S) state of each track
+        dt: int or ndarray
+            Number of frames since the last particle of each track
+
+        Returns
+        -------
+        positions: ndarray
+            (N, D) predicted positions
+
+        """
+        return np.array(state, dtype=float)
+
+    def update(self, state, positions, dt):
+        """State of the tracks after adding a new particle
+
+        Parameters
+        ----------
+        state: ndarray
+            (N, S) state of each track
+        positions: ndarray
+            (N, D) positions of the new particle of each track
+        dt: int or ndarray
+            Number of frames between the last and the new particle
+
+        Returns
+        -------
+        state: ndarray
+            (N, S) updated state
+
+        """
+        return np.array(positions, dtype=float)
+
+
+class SConstantVelocityMotion(SMotionModel):
+    """Constant velocity motion model
+
+    The velocity of a track is its last displacement per frame, and the
+    particles are expected at the last position moved by the velocity
+
+    """
+    predictive = True
+
+    def initialize(self, positions):
+        positions = np.asarray(positions, dtype=float)
+        return np.concatenate((positions, np.zeros_like(positions)), axis=1)
+
+    def predict(self, state, dt):
+        ndim = state.shape[1] // 2
+        dt = np.reshape(dt, (-1, 1))
+        return state[:, :ndim] + dt * state[:, ndim:]
+
+    def update(self, state, positions, dt):
+        ndim = state.shape[1] // 2
+        dt = np.reshape(dt, (-1, 1))
+        positions = np.asarray(positions, dtype=float)
+        return np.concatenate(
+            (positions, (positions - state[:, :ndim]) / dt), axis=1)
+
+
+class SKalmanMotion(SMotionModel):
+    """Constant velocity motion model with a Kalman filter
+
+    The position and velocity of each track are estimated with a Kalman
+    filter, so the predictions are robust to the localization noise of the
+    particles. The axes are filtered independently with the same noise, so
+    the state of a track holds its position, its velocity and the three
+    terms of the (position, velocity) covariance shared by all the axes.
+
+    Parameters
+    ----------
+    process_noise: float
+        Variance of the random acceleration of the particles, per frame
+    measurement_noise: float
+        Variance of the particles localization
+    velocity_variance: float
+        Variance of the velocity of the new tracks
+
+    """
+    predictive = True
+
+    def __init__(self, process_noise=1.0, measurement_noise=1.0,
+                 velocity_variance=100.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.velocity_variance = velocity_variance
+
+    def initialize(self, positions):
+        positions = np.asarray(positions, dtype=float)
+        covariance = np.empty((positions.shape[0], 3))
+        covariance[:, 0] = self.measurement_noise
+        covariance[:, 1] = 0
+        covariance[:, 2] = self.velocity_variance
+        return np.concatenate((positions, np.zeros_like(positions),
+                               covariance), axis=1)
+
+    def predict(self, state, dt):
+        ndim = (state.shape[1] - 3) // 2
+        dt = np.reshape(dt, (-1, 1))
+        return state[:, :ndim] + dt * state[:, ndim:2 * ndim]
+
+    def update(self, state, positions, dt):
+        ndim = (state.shape[1] - 3) // 2
+        positions = np.asarray(positions, dtype=float)
+        dt = np.broadcast_to(np.asarray(dt, dtype=float),
+                             (state.shape[0],))
+        p00, p01, p11 = state[:, -3], state[:, -2], state[:, -1]
+        # predicted covariance: F P F^T + Q
+        q = self.process_noise
+        p00 = p00 + 2 * dt * p01 + dt ** 2 * p11 + q * dt ** 3 / 3
+        p01 = p01 + dt * p11 + q * dt ** 2 / 2
+        p11 = p11 + q * dt
+        # gain of the position measurement
+        innovation_variance = p00 + self.measurement_noise
+        gain_position = p00 / innovation_variance
+        gain_velocity = p01 / innovation_variance
+        predicted = self.predict(state, dt)
+        innovation = positions - predicted
+        updated = np.empty_like(state)
+        updated[:, :ndim] = predicted + gain_position[:, None] * innovation
+        updated[:, ndim:2 * ndim] = state[:, ndim:2 * ndim] + \
+            gain_velocity[:, None] * innovation
+        updated[:, -3] = (1 - gain_position) * p00
+        updated[:, -2] = (1 - gain_position) * p01
+        updated[:, -1] = p11 - gain_velocity * p01
+        return updated
+
+
+def motion_model(name):
+    """Create a motion model from its name in the linkers widgets
+
+    Parameters
+    ----------
+    name: str
+        'Brownian', 'Constant velocity' or 'Kalman'
+
+    Returns
+    -------
+    model: SMotionModel
+        The motion model, None for the brownian motion (no prediction)
+
+    """
+    if name == 'Brownian':
+        return None
+    if name == 'Constant velocity':
+        return SConstantVelocityMotion()
+    if name == 'Kalman':
+        return SKalmanMotion()
+    raise Exception(f'Unknown motion model {name}')
+
+
+def predicted_links(predictions, radius, positions):
+    """Candidate links between predicted positions and particles
+
+    Parameters
+    ----------
+    predictions: ndarray
+        (N, D) predicted positions of the tracks ends
+    radius: ndarray
+        Search radius around each predicted position
+    positions: ndarray
+        (M, D) positions of the particles
+
+    Returns
+    -------
+    sources: ndarray
+        Index of the track end of each link
+    targets: ndarray
+        Index of the particle of each link
+    costs: ndarray
+        Squared distance between the predicted position and the particle
+
+    """
+    radius = np.broadcast_to(np.asarray(radius, dtype=float),
+                             (predictions.shape[0],))
+    if predictions.shape[0] == 0 or positions.shape[0] == 0:
+        return (np.empty((0,), dtype=int), np.empty((0,), dtype=int),
+                np.empty((0,)))
+    pairs = cKDTree(predictions).sparse_distance_matrix(
+        cKDTree(positions), radius.max(), output_type='ndarray')
+    sources, targets = pairs['i'].astype(int), pairs['j'].astype(int)
+    costs = np.sum((predictions[sources] - positions[targets]) ** 2, axis=1)
+    keep = costs < radius[sources] ** 2
+    return sources[keep], targets[keep], costs[keep]
@@ -1,3 +1,4 @@
+import threading
 from qtpy.QtWidgets import (QWidget, QGridLayout, QLabel, QPushButton,
                             QHBoxLayout, QVBoxLayout, QProgressBar,
                             QTextEdit, QMessageBox)
@@ -5,6 +6,10 @@ from qtpy import QtCore
 from qtpy.QtCore import Signal, QThread, QObject
 
 
+class SCanceled(Exception):
+    """Raised in a worker thread to stop a job canceled by the user"""
+
+
 class SNapariWidget(QWidget):
     """Interface for a STracking napari widget
 
@@ -90,11 +95,50 @@ class SNapariWorker(QObject):
         super().__init__()
         self.viewer = napari_viewer
         self.widget = widget
+        self.cancel_event = threading.Event()
+        self.error = None
 
     def state(self):
         """Get the states from the SNapariWidget"""
         self.widget.state()
 
+    def cancel(self):
+        """Request the cancellation of the running job
+
+        The job stops at the next cancellation check: between frames,
+        tracks or processing stages
+
+        """
+        self.cancel_event.set()
+
+    def is_canceled(self):
+        """Returns True if the cancellation of the job has been requested"""
+        return self.cancel_event.is_set()
+
+    def check_canceled(self):
+        """Stop the job by raising SCanceled if it has been canceled"""
+        if self.cancel_event.is_set():
+            raise SCanceled()
+
+    def execute(self):
+        """Run the job in the worker thread and handle its cancellation
+
+        An error of the job is stored in the error attribute, and the
+        finished signal is emitted, so the plugin is ready for a new run
+
+        """
+        self.cancel_event.clear()
+        self.error = None
+        try:
+            self.run()
+        except SCanceled:
+            self.log.emit('canceled')
+            self.finished.emit()
+        except Exception as err:
+            self.error = err
+            self.log.emit(f'error: {err}')
+            self.finished.emit()
+
     def run(self):
         """Exec the data processing"""
         raise NotImplementedError()
@@ -154,7 +198,14 @@ class SNapariPlugin(QWidget):
 
         self.run_btn = QPushButton('Run')
         self.run_btn.released.connect(self.run)
-        layout.addWidget(self.run_btn)
+        self.cancel_btn = QPushButton('Cancel')
+        self.cancel_btn.released.connect(self.cancel)
+        self.cancel_btn.setEnabled(False)
+        buttons_layout = QHBoxLayout()
+        buttons_layout.setContentsMargins(0, 0, 0, 0)
+        buttons_layout.addWidget(self.run_btn)
+        buttons_layout.addWidget(self.cancel_btn)
+        layout.addLayout(buttons_layout)
 
         layout.addWidget(self.log_widget)
         layout.addWidget(QWidget(), self.fill_widget_resize, QtCore.Qt.AlignTop)
@@ -162,7 +213,7 @@ class SNapariPlugin(QWidget):
 
         # connect
         self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
+        self.thread.started.connect(self.worker.execute)
         self.worker.finished.connect(self.thread.quit)
         self.worker.progress.connect(self.log_widget.set_progress)
         self.worker.log.connect(self.log_widget.add_log)
@@ -172,8 +223,14 @@ class SNapariPlugin(QWidget):
     def run(self):
         """Start the worker in a new thread"""
         if self.widget.check_inputs():
+            self.cancel_btn.setEnabled(True)
             self.thread.start()
 
+    def cancel(self):
+        """Ask the worker to stop the running job"""
+        self.cancel_btn.setEnabled(False)
+        self.worker.cancel()
+
     def set_advanced(self, mode: bool):
         """Toggle the graphical interface to advanced mode
 
@@ -191,6 +248,12 @@ class SNapariPlugin(QWidget):
 
     def set_outputs(self):
         """Call the worker set_outputs method to set the plugin outputs to napari layers"""
+        self.cancel_btn.setEnabled(False)
+        if self.worker.is_canceled():
+            return
+        if self.worker.error is not None:
+            self.widget.show_error(f'{self.title} failed: {self.worker.error}')
+            return
         self.worker.set_outputs()
 
 
@@ -228,15 +291,29 @@ class SLogWidget(QWidget):
 
 
 class SProgressObserver(QObject):
-    """Implement the STRacking observer design pattern to display STracking tools progress"""
+    """Implement the STRacking observer design pattern to display STracking tools progress
+
+    The progress notifications are also used as cancellation checks: when
+    the cancel event is set, the next progress notification raises SCanceled
+    to stop the running STracking tool
+
+    Parameters
+    ----------
+    cancel_event: threading.Event
+        Event set when the job is canceled
+
+    """
     progress_signal = Signal(int)
     notify_signal = Signal(str)
 
-    def __init__(self):
+    def __init__(self, cancel_event=None):
         super().__init__()
+        self.cancel_event = cancel_event
 
     def progress(self, value):
         """Callback to refresh the computation progress"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise SCanceled()
         self.progress_signal.emit(value)
 
     def notify(self, message):
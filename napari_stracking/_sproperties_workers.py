@@ -232,7 +232,7 @@ class SSpotPropertiesWorker(SNapariWorker):
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
 
-        self.observer = SProgressObserver()
+        self.observer = SProgressObserver(self.cancel_event)
         self.observer.progress_signal.connect(self.progress)
         self.observer.notify_signal.connect(self.log)
 
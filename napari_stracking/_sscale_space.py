@@ -0,0 +1,265 @@
+import numpy as np
+from scipy import ndimage as ndi
+from skimage.feature import peak_local_max
+from skimage.feature.blob import _prune_blobs
+from skimage.filters import gaussian
+from skimage.util import img_as_float
+
+from stracking.containers import SParticles
+from stracking.detectors import SDetector
+
+from ._sdetection_cache import SDetectionCache, frame_hash
+
+
+def dog_sigmas(min_sigma, max_sigma, sigma_ratio):
+    """Standard deviations of the gaussian kernels of a DoG scale space"""
+    if sigma_ratio <= 1.0:
+        raise ValueError('sigma_ratio must be > 1.0')
+    k = int(np.log(max_sigma / min_sigma) / np.log(sigma_ratio) + 1)
+    return np.array([min_sigma * (sigma_ratio ** i) for i in range(k + 1)])
+
+
+def log_sigmas(min_sigma, max_sigma, num_sigma, log_scale):
+    """Standard deviations of the gaussian kernels of a LoG scale space"""
+    if log_scale:
+        return np.logspace(np.log10(min_sigma), np.log10(max_sigma),
+                           num_sigma)
+    return np.linspace(min_sigma, max_sigma, num_sigma)
+
+
+def dog_maxima(frame, min_sigma, max_sigma, sigma_ratio, floor=0):
+    """Local maxima of the Difference of Gaussian scale space of a frame
+
+    The scale space is computed as in ``skimage.feature.blob_dog``.
+
+    Parameters
+    ----------
+    frame: ndarray
+        2D or 3D image
+    min_sigma: float
+        Minimum standard deviation of the gaussian kernels
+    max_sigma: float
+        Maximum standard deviation of the gaussian kernels
+    sigma_ratio: float
+        Ratio between the standard deviation of successive kernels
+    floor: float
+        Only the maxima with a response greater than floor are kept
+
+    Returns
+    -------
+    maxima: ndarray
+        (N, D+2) array of the maxima: coordinates, sigma and response
+
+    """
+    image = img_as_float(frame)
+    sigma_list = dog_sigmas(min_sigma, max_sigma, sigma_ratio)
+    cube = np.empty(image.shape + (len(sigma_list) - 1,), dtype=image.dtype)
+    gaussian_previous = gaussian(image, sigma=sigma_list[0], mode='reflect')
+    for i, s in enumerate(sigma_list[1:]):
+        gaussian_current = gaussian(image, sigma=s, mode='reflect')
+        cube[..., i] = gaussian_previous - gaussian_current
+        gaussian_previous = gaussian_current
+    cube *= 1 / (sigma_ratio - 1)
+    return _cube_maxima(cube, sigma_list, floor)
+
+
+def log_maxima(frame, min_sigma, max_sigma, num_sigma, log_scale, floor=0):
+    """Local maxima of the Laplacian of Gaussian scale space of a frame
+
+    The scale space is computed as in ``skimage.feature.blob_log``.
+
+    Parameters
+    ----------
+    frame: ndarray
+        2D or 3D image
+    min_sigma: float
+        Minimum standard deviation of the gaussian kernels
+    max_sigma: float
+        Maximum standard deviation of the gaussian kernels
+    num_sigma: int
+        Number of standard deviations between min_sigma and max_sigma
+    log_scale: bool
+        True to interpolate the standard deviations in log scale
+    floor: float
+        Only the maxima with a response greater than floor are kept
+
+    Returns
+    -------
+    maxima: ndarray
+        (N, D+2) array of the maxima: coordinates, sigma and response
+
+    """
+    image = img_as_float(frame)
+    sigma_list = log_sigmas(min_sigma, max_sigma, num_sigma, log_scale)
+    cube = np.empty(image.shape + (len(sigma_list),), dtype=image.dtype)
+    for i, s in enumerate(sigma_list):
+        cube[..., i] = -ndi.gaussian_laplace(image, s) * s ** 2
+    return _cube_maxima(cube, sigma_list, floor)
+
+
+def _cube_maxima(cube, sigma_list, floor):
+    """Extract the local maxima of a scale space cube"""
+    local_maxima = peak_local_max(cube, threshold_abs=floor,
+                                  exclude_border=False,
+                                  footprint=np.ones((3,) * cube.ndim))
+    maxima = np.empty((local_maxima.shape[0], cube.ndim + 1))
+    maxima[:, :-2] = local_maxima[:, :-1]
+    maxima[:, -2] = sigma_list[local_maxima[:, -1]]
+    maxima[:, -1] = cube[tuple(local_maxima.T)]
+    return maxima
+
+
+def select_blobs(maxima, threshold, overlap):
+    """Select the blobs from the scale space maxima
+
+    Parameters
+    ----------
+    maxima: ndarray
+        (N, D+2) array of the maxima: coordinates, sigma and response
+    threshold: float
+        Minimum response of a blob
+    overlap: float
+        A value between 0 and 1. If the area of two blobs overlaps by a
+        fraction greater than overlap, the smaller blob is eliminated.
+
+    Returns
+    -------
+    blobs: ndarray
+        (N, D+1) array of the blobs coordinates and sigma
+
+    """
+    blobs = maxima[maxima[:, -1] > threshold, :-1]
+    if blobs.shape[0] == 0:
+        return blobs
+    return _prune_blobs(blobs.copy(), overlap)
+
+
+class SScaleSpaceDetector(SDetector):
+    """DoG or LoG detector reusing the scale space of the frames
+
+    The detector computes the local maxima of the scale space of each frame
+    with their response and keeps them in a cache. The threshold and
+    overlap parameters only select blobs from the maxima, so changing them
+    does not recompute the scale space. The cached maxima are invalidated
+    when the frame content or the sigma parameters change.
+
+    Parameters
+    ----------
+    method: str
+        'dog' for Difference of Gaussian or 'log' for Laplacian of Gaussian
+    min_sigma: float
+        Minimum standard deviation of the gaussian kernels
+    max_sigma: float
+        Maximum standard deviation of the gaussian kernels
+    threshold: float
+        Minimum response of a blob in the scale space
+    overlap: float
+        A value between 0 and 1. If the area of two blobs overlaps by a
+        fraction greater than overlap, the smaller blob is eliminated.
+    sigma_ratio: float
+        Ratio between the standard deviation of successive kernels (DoG)
+    num_sigma: int
+        Number of standard deviations between min_sigma and max_sigma (LoG)
+    log_scale: bool
+        True to interpolate the standard deviations in log scale (LoG)
+    cache: SDetectionCache
+        Cache of the scale space maxima. None to disable the cache
+
+    """
+    def __init__(self, method='dog', min_sigma=1, max_sigma=50,
+                 threshold=2.0, overlap=.5, sigma_ratio=1.6, num_sigma=10,
+                 log_scale=False, cache=None):
+        super().__init__()
+        self.method = method
+        self.min_sigma = min_sigma
+        self.max_sigma = max_sigma
+        self.threshold = threshold
+        self.overlap = overlap
+        self.sigma_ratio = sigma_ratio
+        self.num_sigma = num_sigma
+        self.log_scale = log_scale
+        self.cache = cache
+
+    def __getstate__(self):
+        # the cache stays in the calling process
+        state = self.__dict__.copy()
+        state['cache'] = None
+        return state
+
+    def _sigmas_key(self, floor):
+        """Key of the scale space parameters in the cache"""
+        if self.method == 'dog':
+            return ('dog', self.min_sigma, self.max_sigma, self.sigma_ratio,
+                    floor)
+        return ('log', self.min_sigma, self.max_sigma, self.num_sigma,
+                self.log_scale, floor)
+
+    def maxima(self, frame):
+        """Local maxima of the scale space of a frame
+
+        Parameters
+        ----------
+        frame: ndarray
+            2D or 3D image
+
+        Returns
+        -------
+        maxima: ndarray
+            (N, D+2) array of the maxima: coordinates, sigma and response
+
+        """
+        floor = min(self.threshold, 0)
+        key = None
+        if self.cache is not None:
+            key = (self._sigmas_key(floor), frame_hash(frame))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[0]
+        if self.method == 'dog':
+            maxima = dog_maxima(frame, self.min_sigma, self.max_sigma,
+                                self.sigma_ratio, floor)
+        else:
+            maxima = log_maxima(frame, self.min_sigma, self.max_sigma,
+                                self.num_sigma, self.log_scale, floor)
+        if key is not None:
+            self.cache.put(key, (maxima, {}))
+        return maxima
+
+    def run(self, image, scale=None):
+        """Run the detection on a ND image
+
+        Parameters
+        ----------
+        image: ndarray
+            time frames to analyse
+        scale: tuple or list
+            scale of the image in each dimension
+
+        Returns
+        -------
+        detections: SParticles
+
+        """
+        if image.ndim not in (3, 4):
+            raise Exception('SScaleSpaceDetector: can process only 2D+t or '
+                            '3D+t images')
+        self.notify('processing')
+        self.progress(0)
+        spots_ = np.empty((0, image.ndim))
+        sigma_ = np.empty((0,))
+        for t in range(image.shape[0]):
+            self.progress(int(100 * t / image.shape[0]))
+            blobs = select_blobs(self.maxima(image[t, ...]), self.threshold,
+                                 self.overlap)
+            spots = t * np.ones((blobs.shape[0], image.ndim))
+            spots[:, 1:] = blobs[:, :-1]
+            spots_ = np.concatenate((spots_, spots), axis=0)
+            sigma_ = np.concatenate((sigma_, blobs[:, -1]), axis=0)
+        self.notify('done')
+        self.progress(100)
+        return SParticles(data=spots_, properties={'radius': sigma_},
+                          scale=scale)
+
+
+# scale space maxima shared by the DoG and LoG plugins
+scale_space_cache = SDetectionCache(max_bytes=256*1024*1024)
@@ -1,12 +1,14 @@
 from qtpy.QtWidgets import (QWidget, QGridLayout, QLabel, QLineEdit,
                             QComboBox, QCheckBox, QVBoxLayout, QHBoxLayout,
                             QPushButton, QMessageBox)
+import numpy as np
 import napari
 from ._splugin import SNapariWorker, SNapariWidget, SProgressObserver
 from ._swidgets import SPropertiesViewer, SPipelineListWidget
+from ._sfeatures_engine import (REGISTRY_KEY, TABLE_KEY, layer_registry,
+                               layer_features, layer_features_names)
 
 from stracking.containers import STracks
-from stracking.filters import FeatureFilter
 
 
 # ------------- Spot properties -------------
@@ -145,8 +147,8 @@ class SFeatureFilterWidget(QWidget):
 
         self.features_box = QComboBox()
         if len(napari_viewer.layers) > 0:
-            for key in napari_viewer.layers[layer_name].metadata.keys():
-                self.features_box.addItem(key)
+            self.features_box.addItems(layer_features_names(
+                napari_viewer.layers[layer_name], scalar=True))
 
         layout = QGridLayout()
         layout.addWidget(QLabel('Feature:'), 0, 0)
@@ -188,44 +190,62 @@ class STrackFilterWorker(SNapariWorker):
     def __init__(self, napari_viewer, widget):
         super().__init__(napari_viewer, widget)
 
-        self.observer = SProgressObserver()
+        self.observer = SProgressObserver(self.cancel_event)
         self.observer.progress_signal.connect(self.progress)
         self.observer.notify_signal.connect(self.log)
 
         self._out_data = None
+        self._out_table = None
+        self._registry = None
 
     def run(self):
         """Execute the processing"""
         state = self.widget.state()
         current_layer = state['inputs']['tracks']
 
-        # get the particles
-        data = self.viewer.layers[current_layer].data.copy()
-        properties = self.viewer.layers[current_layer].properties.copy()
-        features = self.viewer.layers[current_layer].metadata.copy()
-        scale = self.viewer.layers[current_layer].scale.copy()
-        tracks = STracks(data=data, properties=properties, features=features,
-                         scale=scale)
-
         # run the filters
         state_params = state['parameters']
 
         filters_names = state_params['filters']
         filters_params = state_params['filters_params']
-        tracks_o = tracks
+
+        # get the tracks, and compute the filtered features
+        layer = self.viewer.layers[current_layer]
+        self.observer.notify('processing')
+        self.observer.progress(0)
+        table = layer_features(
+            layer, [params['feature'] for params in filters_params],
+            self.observer)
+
+        keep = np.ones(len(table), dtype=bool)
         for i in range(len(filters_names)):
             n_filter = filters_names[i]
             if n_filter == 'Features':
-                feature_name = filters_params[i]['feature']
-                min_val = filters_params[i]['min']
-                max_val = filters_params[i]['max']
-                f_filter = FeatureFilter(feature_name=feature_name,
-                                         min_val=min_val,
-                                         max_val=max_val)
-                f_filter.add_observer(self.observer)
-                tracks_o = f_filter.run(tracks_o)
-
-        self._out_data = tracks_o
+                values = table[filters_params[i]['feature']]
+                # the tracks without the feature are kept
+                keep &= ~((values < filters_params[i]['min']) |
+                          (values > filters_params[i]['max']))
+
+        # select the points and the graph of the kept tracks
+        kept = table.track_ids[keep]
+        points = np.isin(layer.data[:, 0], kept)
+        properties = {name: np.asarray(values)[points]
+                      for name, values in layer.properties.items()}
+        kept_ids = set(kept.tolist())
+        graph = dict()
+        for track_id, parents in layer.graph.items():
+            if track_id in kept_ids:
+                graph[track_id] = [parent for parent in parents
+                                   if parent in kept_ids]
+        self._out_data = STracks(data=layer.data[points],
+                                 properties=properties, graph=graph,
+                                 scale=layer.scale.copy())
+
+        # the registry features stay lazy on the new layer
+        self._registry = layer_registry(layer)
+        if self._registry is not None:
+            table = table.drop(self._registry.columns())
+        self._out_table = table.select(keep)
         self.progress.emit(100)
         self.finished.emit()
 
@@ -237,10 +257,13 @@ class STrackFilterWorker(SNapariWorker):
             msg.setText("No track found")
             msg.exec_()
         else:
+            metadata = {TABLE_KEY: self._out_table}
+            if self._registry is not None:
+                metadata[REGISTRY_KEY] = self._registry.derive()
             self.viewer.add_tracks(self._out_data.data,
                                    name='S Tracks Filter',
                                    scale=self._out_data.scale,
                                    properties=self._out_data.properties,
-                                   metadata=self._out_data.features,
+                                   metadata=metadata,
                                    graph=self._out_data.graph)
 
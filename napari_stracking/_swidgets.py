@@ -2,9 +2,12 @@ import numpy as np
 from qtpy.QtWidgets import (QWidget, QGridLayout, QLabel, QPushButton,
                             QLineEdit, QHBoxLayout, QVBoxLayout, QComboBox,
                             QTableWidget, QAbstractItemView, QTableWidgetItem,
-                            QScrollArea)
+                            QScrollArea, QProgressBar)
 import qtpy.QtCore as QtCore
-from qtpy.QtCore import Signal
+from qtpy.QtCore import Signal, QThread
+
+from ._splugin import SNapariWorker, SProgressObserver
+from ._sfeatures_engine import layer_features
 
 
 class SPropertiesViewer(QWidget):
@@ -81,9 +84,43 @@ class SPropertiesViewer(QWidget):
                                          QTableWidgetItem(str(prop[line])))
 
 
+class SLayerFeaturesWorker(SNapariWorker):
+    """Worker computing the features table of a tracks layer
+
+    The features declared in the layer features registry are computed in
+    the worker thread, and the table is available in the table attribute
+    when the worker is finished (None if the computation was canceled)
+
+    Parameters
+    ----------
+    napari_viewer: Viewer
+        Napari viewer
+
+    """
+    def __init__(self, napari_viewer):
+        super().__init__(napari_viewer, None)
+        self.layer = None
+        self.names = None
+        self.table = None
+
+        self.observer = SProgressObserver(self.cancel_event)
+        self.observer.progress_signal.connect(self.progress)
+        self.observer.notify_signal.connect(self.log)
+
+    def run(self):
+        """Compute the features of the layer"""
+        self.table = None
+        self.table = layer_features(self.layer, self.names, self.observer)
+        self.progress.emit(100)
+        self.finished.emit()
+
+
 class SFeaturesViewer(QWidget):
     """Widget to display a the tracks features table
 
+    The features are computed in a worker thread, and the table is filled
+    when they are computed
+
     Parameters
     ----------
     napari_viewer: QWidget
@@ -94,49 +131,85 @@ class SFeaturesViewer(QWidget):
         super().__init__()
         self.viewer = napari_viewer
         self.layer_name = ''
+        self._reload_pending = False
+
+        self.thread = QThread()
+        self.worker = SLayerFeaturesWorker(napari_viewer)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.execute)
+        self.worker.finished.connect(self.thread.quit)
+        self.worker.finished.connect(self._on_computed)
 
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
         self.setLayout(layout)
+        progress_layout = QHBoxLayout()
+        progress_layout.setContentsMargins(0, 0, 0, 0)
+        self.progress_bar = QProgressBar()
+        self.worker.progress.connect(self.progress_bar.setValue)
+        self.cancel_btn = QPushButton('Cancel')
+        self.cancel_btn.released.connect(self.worker.cancel)
+        self.cancel_btn.setEnabled(False)
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_btn)
+        layout.addLayout(progress_layout)
         self.tableWidget = QTableWidget()
         self.tableWidget.setEditTriggers(QAbstractItemView.NoEditTriggers)
         layout.addWidget(self.tableWidget)
         self.setLayout(layout)
 
     def reload(self):
-        """Reload the tracks features from the layers to the table widget"""
-        particles = self.viewer.layers[self.layer_name].data
-        features = self.viewer.layers[self.layer_name].metadata
-        headers = ['track_id']
-        for key in features:
-            if isinstance(features[key], dict):
-                headers.append(key)
+        """Compute the tracks features of the layer in the worker thread
+
+        The table widget is filled when the features are computed. A reload
+        requested during a computation cancels it and starts a new one
+
+        """
+        if self.thread.isRunning():
+            self._reload_pending = True
+            self.worker.cancel()
+            return
+        self.worker.layer = self.viewer.layers[self.layer_name]
+        self.progress_bar.setValue(0)
+        self.cancel_btn.setEnabled(True)
+        self.thread.start()
+
+    def _on_computed(self):
+        """Callback called when the worker is finished"""
+        self.thread.wait()
+        self.cancel_btn.setEnabled(False)
+        if self._reload_pending:
+            self._reload_pending = False
+            self.reload()
+        elif self.worker.table is not None:
+            self.set_table(self.worker.table)
+
+    def set_table(self, table):
+        """Fill the table widget with the single value features
+
+        Parameters
+        ----------
+        table: SFeatureTable
+            The tracks features
+
+        """
+        names = table.names(scalar=True)
+        headers = ['track_id'] + names
         self.tableWidget.setColumnCount(len(headers))
         self.tableWidget.setHorizontalHeaderLabels(headers)
-        self.tableWidget.setRowCount(len(np.unique(particles[:, 0])))
-
-        features_dict = dict()
-        tracks_ids = np.unique(particles[:, 0])
-        for id_ in tracks_ids:
-            features_dict[id_] = list()
-
-        for key in features:
-            if isinstance(features[key], dict):
-                feature_dict = features[key]
-                for f_key in feature_dict:
-                    if f_key in features_dict:
-                        features_dict[f_key].append(str(feature_dict[f_key]))
-
-        line = -1
-        for key in features_dict:
-            line += 1
-            # track_id = key
-            self.tableWidget.setItem(line, 0, QTableWidgetItem(str(key)))
-            # add each feature per column
-            col = 0
-            for feature in features_dict[key]:
-                col += 1
-                self.tableWidget.setItem(line, col, QTableWidgetItem(feature))
+        self.tableWidget.setRowCount(len(table))
+
+        columns = [table.track_ids.astype(str)] + \
+            [table[name].astype(str) for name in names]
+        for col, values in enumerate(columns):
+            for line, value in enumerate(values):
+                self.tableWidget.setItem(line, col, QTableWidgetItem(value))
+
+    def closeEvent(self, event):
+        """Stop the running computation when the viewer is closed"""
+        self._reload_pending = False
+        self.worker.cancel()
+        super().closeEvent(event)
 
 
 class SProcessInListWidget(QWidget):
@@ -0,0 +1,277 @@
+import numpy as np
+import pytest
+from stracking.detectors import DoGDetector, LoGDetector
+
+from napari_stracking._sdetection_cache import SDetectionCache, parameters_key
+from napari_stracking._sdetection_engine import (SFrameDetector,
+                                                time_chunk_size, iter_frames,
+                                                tile_regions,
+                                                scale_space_halo,
+                                                plan_execution, roi_boxes)
+from napari_stracking._sscale_space import SScaleSpaceDetector
+
+
+def _spots_movie():
+    """Create a 2D+t movie with one bright spot moving along the x axis"""
+    image = np.zeros((4, 40, 40))
+    for t in range(image.shape[0]):
+        image[t, 20, 10 + 5 * t] = 1
+        image[t, 10, 30] = 1
+    yy, xx = np.mgrid[-3:4, -3:4]
+    kernel = np.exp(-(xx ** 2 + yy ** 2) / 4)
+    for t in range(image.shape[0]):
+        image[t] = np.real(np.fft.ifft2(np.fft.fft2(image[t]) *
+                                        np.fft.fft2(kernel, s=(40, 40))))
+    return image
+
+
+def test_frame_detector_serial():
+    image = _spots_movie()
+    detector = DoGDetector(min_sigma=1, max_sigma=3, threshold=0.01)
+    particles = SFrameDetector(detector, workers=1).run(image)
+    expected = detector.run(image)
+    np.testing.assert_allclose(particles.data, expected.data)
+    np.testing.assert_allclose(particles.properties['radius'],
+                               expected.properties['radius'])
+
+
+def test_frame_detector_parallel():
+    image = _spots_movie()
+    detector = DoGDetector(min_sigma=1, max_sigma=3, threshold=0.01)
+    serial = SFrameDetector(detector, workers=1).run(image)
+    parallel = SFrameDetector(detector, workers=2).run(image)
+    np.testing.assert_allclose(parallel.data, serial.data)
+
+
+def test_frame_detector_frames():
+    image = _spots_movie()
+    detector = DoGDetector(min_sigma=1, max_sigma=3, threshold=0.01)
+    particles = SFrameDetector(detector).run(image, frames=[2])
+    assert particles.data.shape[0] > 0
+    assert np.all(particles.data[:, 0] == 2)
+
+
+def _blobs_movie():
+    """Create a 2D+t movie with random blobs of several sizes"""
+    rng = np.random.default_rng(1)
+    yy, xx = np.mgrid[0:96, 0:96]
+    image = np.zeros((2, 96, 96))
+    for t in range(image.shape[0]):
+        for y, x, sigma in zip(rng.uniform(0, 96, 30), rng.uniform(0, 96, 30),
+                               rng.uniform(1, 3, 30)):
+            image[t] += np.exp(-((xx - x) ** 2 + (yy - y) ** 2) /
+                               (2 * sigma ** 2))
+    return image
+
+
+def test_tile_regions():
+    regions = tile_regions((10, 25), 10, 3)
+    assert len(regions) == 3
+    covered = np.zeros((10, 25), dtype=int)
+    for origin, slices, core in regions:
+        tile = np.zeros((10, 25), dtype=bool)[slices]
+        core_slices = tuple(slice(start, stop) for start, stop in core)
+        covered[slices][core_slices] += 1
+        assert tile.shape[1] <= 10 + 2 * 3
+    # the tiles cores are a partition of the frame
+    assert np.all(covered == 1)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_frame_detector_tiles(workers):
+    image = _blobs_movie()
+    detector = SScaleSpaceDetector('log', min_sigma=1, max_sigma=3,
+                                   num_sigma=5, threshold=0.05)
+    expected = SFrameDetector(detector).run(image)
+    particles = SFrameDetector(detector, workers=workers, tile_size=32,
+                               halo=scale_space_halo(3),
+                               overlap=detector.overlap).run(image)
+    order = np.lexsort(particles.data.T[::-1])
+    expected_order = np.lexsort(expected.data.T[::-1])
+    np.testing.assert_allclose(particles.data[order],
+                               expected.data[expected_order])
+    np.testing.assert_allclose(particles.properties['radius'][order],
+                               expected.properties['radius'][expected_order])
+
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_frame_detector_callback(workers):
+    image = _blobs_movie()
+    detector = SScaleSpaceDetector('log', min_sigma=1, max_sigma=3,
+                                   num_sigma=5, threshold=0.05)
+    frames = []
+    particles = SFrameDetector(
+        detector, workers=workers, tile_size=32, halo=scale_space_halo(3),
+        overlap=detector.overlap,
+        frame_callback=lambda t, data, properties: frames.append(
+            (t, data))).run(image)
+    assert [t for t, _ in frames] == list(range(image.shape[0]))
+    np.testing.assert_allclose(np.concatenate([data for _, data in frames]),
+                               particles.data)
+
+@pytest.mark.parametrize('tile_size', [None, 16])
+def test_frame_detector_roi(tile_size):
+    image = _blobs_movie()
+    detector = SScaleSpaceDetector('log', min_sigma=1, max_sigma=3,
+                                   num_sigma=5, threshold=0.05)
+    roi = np.zeros(image.shape[1:], dtype=bool)
+    roi[10:40, 20:50] = True
+    roi[60:90, 55:70] = True
+    expected = SFrameDetector(detector).run(image)
+    coords = expected.data[:, 1:].astype(int)
+    expected_data = expected.data[roi[coords[:, 0], coords[:, 1]]]
+    particles = SFrameDetector(detector, tile_size=tile_size,
+                               halo=scale_space_halo(3),
+                               overlap=detector.overlap, roi=roi).run(image)
+    assert expected_data.shape[0] > 0
+    order = np.lexsort(particles.data.T[::-1])
+    expected_order = np.lexsort(expected_data.T[::-1])
+    np.testing.assert_allclose(particles.data[order],
+                               expected_data[expected_order])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_frame_detector_empty_roi(workers):
+    image = _blobs_movie()
+    detector = SScaleSpaceDetector('log', min_sigma=1, max_sigma=3,
+                                   num_sigma=5, threshold=0.05)
+    frames = []
+    particles = SFrameDetector(
+        detector, workers=workers, roi=np.zeros(image.shape[1:], dtype=bool),
+        frame_callback=lambda t, data, properties: frames.append(t)
+    ).run(image)
+    assert particles.data.shape == (0, 3)
+    assert frames == list(range(image.shape[0]))
+
+    # ROI empty in the first and last frames only
+    roi = np.zeros(image.shape, dtype=bool)
+    roi[1:-1] = True
+    particles = SFrameDetector(detector, workers=workers, roi=roi).run(image)
+    expected = SFrameDetector(detector).run(image)
+    inner = (expected.data[:, 0] > 0) & \
+        (expected.data[:, 0] < image.shape[0] - 1)
+    np.testing.assert_allclose(particles.data, expected.data[inner])
+
+
+class _LazyROI:
+    """Movie ROI recording the frames read by the detector"""
+    def __init__(self, mask):
+        self.mask = mask
+        self.shape = mask.shape
+        self.ndim = mask.ndim
+        self.frames = set()
+
+    def __getitem__(self, t):
+        self.frames.add(t)
+        return self.mask[t]
+
+
+def test_frame_detector_lazy_roi():
+    image = _blobs_movie()
+    detector = SScaleSpaceDetector('log', min_sigma=1, max_sigma=3,
+                                   num_sigma=5, threshold=0.05)
+    mask = np.zeros(image.shape, dtype=np.uint8)
+    mask[:, 10:60, 20:70] = 3
+    roi = _LazyROI(mask)
+    particles = SFrameDetector(detector, roi=roi).run(image, frames=[1])
+    assert roi.frames == {1}
+    expected = SFrameDetector(detector, roi=mask > 0).run(image, frames=[1])
+    np.testing.assert_allclose(particles.data, expected.data)
+
+
+def test_roi_boxes():
+    mask = np.zeros((30, 30), dtype=bool)
+    # L shape, with a small region inside its bounding box
+    mask[2:10, 2] = True
+    mask[9, 2:10] = True
+    mask[3:5, 6:8] = True
+    mask[20:25, 20:25] = True
+    assert sorted(roi_boxes(mask)) == [((2, 10), (2, 10)),
+                                       ((20, 25), (20, 25))]
+
+
+def test_plan_execution():
+    # 1000x1000 frames, 100 bytes per voxel: 100 MB per frame
+    mb = 1024 * 1024
+    workers, tile, estimate = plan_execution((1000, 1000), 100, 1000 * mb,
+                                             workers=4)
+    assert (workers, tile) == (4, None)
+    assert estimate == 4 * 100 * 1000 * 1000
+    workers, tile, _ = plan_execution((1000, 1000), 100, 250 * mb, workers=4)
+    assert (workers, tile) == (2, None)
+    workers, tile, estimate = plan_execution((1000, 1000), 100, 50 * mb,
+                                             workers=4, halo=10)
+    assert tile is not None and tile < 1000
+    assert estimate <= 50 * mb
+    # no tiling for detectors without halo
+    workers, tile, _ = plan_execution((1000, 1000), 100, 50 * mb, workers=4)
+    assert (workers, tile) == (1, None)
+
+
+def test_frame_detector_dask():
+    da = pytest.importorskip('dask.array')
+    image = _spots_movie()
+    detector = DoGDetector(min_sigma=1, max_sigma=3, threshold=0.01)
+    expected = SFrameDetector(detector).run(image)
+    lazy = da.from_array(image, chunks=(3, 40, 40))
+    particles = SFrameDetector(detector).run(lazy)
+    np.testing.assert_allclose(particles.data, expected.data)
+
+
+def test_iter_frames_chunks():
+    da = pytest.importorskip('dask.array')
+    image = da.from_array(np.arange(10)[:, None, None] * np.ones((10, 2, 2)),
+                          chunks=(4, 2, 2))
+    assert time_chunk_size(image) == 4
+    frames = [t for t, frame in iter_frames(image, [1, 2, 5, 9])]
+    assert frames == [1, 2, 5, 9]
+    values = [frame[0, 0] for t, frame in iter_frames(image, [1, 2, 5, 9])]
+    assert values == [1, 2, 5, 9]
+
+
+def test_frame_detector_cache():
+    image = _spots_movie()
+    detector = DoGDetector(min_sigma=1, max_sigma=3, threshold=0.01)
+    cache = SDetectionCache()
+    key = parameters_key('DoG', {'threshold': 0.01})
+    engine = SFrameDetector(detector, cache=cache, cache_key=key)
+    first = engine.run(image)
+    assert len(cache) == image.shape[0]
+    second = engine.run(image)
+    assert engine._cache_hits == image.shape[0]
+    np.testing.assert_allclose(second.data, first.data)
+    current = engine.run(image, frames=[3])
+    assert engine._cache_hits == 1
+    np.testing.assert_allclose(current.data, first.data[first.data[:, 0] == 3])
+
+
+def test_detection_cache_eviction():
+    cache = SDetectionCache(max_bytes=2 * 8 * 3 * 10)
+    for i in range(3):
+        cache.put(('key', str(i)), (np.zeros((10, 3)), {}))
+    assert len(cache) == 2
+    assert cache.get(('key', '0')) is None
+    assert cache.get(('key', '2')) is not None
+
+
+@pytest.mark.parametrize('method', ['dog', 'log'])
+def test_scale_space_detector(method):
+    image = _spots_movie() + 0.05 * np.random.default_rng(0).random((4, 40, 40))
+    cache = SDetectionCache()
+    for threshold in [0.01, 0.05]:
+        if method == 'dog':
+            expected = DoGDetector(min_sigma=1, max_sigma=3,
+                                   threshold=threshold).run(image)
+        else:
+            expected = LoGDetector(min_sigma=1, max_sigma=3, num_sigma=5,
+                                   threshold=threshold).run(image)
+        detector = SScaleSpaceDetector(method, min_sigma=1, max_sigma=3,
+                                       num_sigma=5, threshold=threshold,
+                                       cache=cache)
+        particles = detector.run(image)
+        np.testing.assert_allclose(particles.data, expected.data)
+        np.testing.assert_allclose(particles.properties['radius'],
+                                   expected.properties['radius'])
+    # the second threshold reused the maxima of the first run
+    assert len(cache) == image.shape[0]
@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+from stracking.detectors import DoGDetector
+
+from napari_stracking._sdetection_engine import SFrameDetector
+from napari_stracking._sdetection_preview import SDetectionPreviewRunner
+
+
+class _CancelingDetector(DoGDetector):
+    """Detector sending a newer preview request while it runs"""
+    def __init__(self, cancel_event):
+        super().__init__(min_sigma=1, max_sigma=3, threshold=0.01)
+        self.cancel_event = cancel_event
+
+    def run(self, image, scale=None):
+        self.cancel_event.set()
+        return super().run(image, scale)
+
+
+def test_preview_runner_cancel():
+    image = np.zeros((2, 40, 40))
+    image[:, 20, 20] = 1
+    runner = SDetectionPreviewRunner()
+    done = []
+    runner.done.connect(lambda generation, data: done.append(generation))
+    logs = []
+    runner.log.connect(logs.append)
+
+    cancel_event = threading.Event()
+    detector = SFrameDetector(DoGDetector(min_sigma=1, max_sigma=3),
+                              tile_size=16)
+    runner.run(1, detector, image, 0, None, cancel_event)
+    assert done == [1]
+
+    # the run is stopped at the next tile once a newer request is sent
+    detector = SFrameDetector(_CancelingDetector(cancel_event), tile_size=16)
+    runner.run(2, detector, image, 0, None, cancel_event)
+    assert done == [1]
+    assert logs == []
@@ -0,0 +1,18 @@
+import numpy as np
+import napari
+
+from napari_stracking._sdetection_workers import SShapesMask
+
+
+def test_shapes_mask():
+    layer = napari.layers.Shapes(
+        [np.array([[0, 5, 5], [0, 5, 20], [0, 20, 20], [0, 20, 5]]),
+         np.array([[2, 30, 30], [2, 30, 40], [2, 40, 40]]),
+         np.array([[2, 10, 10], [2, 10, 18], [2, 18, 18], [2, 18, 10]])],
+        shape_type=['rectangle', 'polygon', 'ellipse'])
+    shape = (4, 50, 60)
+    expected = layer.to_labels(labels_shape=shape) > 0
+    mask = SShapesMask(layer, shape)
+    assert mask.ndim == 3
+    for t in range(shape[0]):
+        np.testing.assert_array_equal(mask[t], expected[t])
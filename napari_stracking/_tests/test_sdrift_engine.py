@@ -0,0 +1,53 @@
+import numpy as np
+from stracking.containers import SParticles, STracks
+
+from napari_stracking._sdrift_engine import (image_drift, points_drift,
+                                             remove_drift, restore_drift)
+
+
+def _drift():
+    rng = np.random.default_rng(0)
+    drift = np.cumsum(rng.normal(0, 1.5, (6, 2)), axis=0)
+    return drift - drift[0]
+
+
+def _spots():
+    rng = np.random.default_rng(1)
+    return rng.uniform(10, 54, (20, 2))
+
+
+def test_image_drift():
+    drift = _drift()
+    yy, xx = np.mgrid[:64, :64]
+    image = np.stack([sum(np.exp(-((yy - y) ** 2 + (xx - x) ** 2) / 8)
+                          for y, x in _spots() + shift)
+                      for shift in drift])
+    np.testing.assert_allclose(image_drift(image), drift, atol=0.2)
+
+
+def test_points_drift():
+    drift = _drift()
+    rng = np.random.default_rng(2)
+    data = np.concatenate([
+        np.column_stack((np.full(20, t),
+                         _spots() + shift + rng.normal(0, 0.2, (20, 2))))
+        for t, shift in enumerate(drift)])
+    np.testing.assert_allclose(points_drift(data, 5), drift, atol=0.4)
+
+    # the max distance is in the scale units
+    scale = (1, 0.1, 0.1)
+    np.testing.assert_allclose(points_drift(data, 0.5, scale), drift,
+                               atol=0.4)
+
+
+def test_drift_round_trip():
+    drift = _drift()
+    data = np.array([[0, 10, 10], [3, 20, 20], [5, 30, 30]], dtype=float)
+    corrected = remove_drift(SParticles(data=data, properties={},
+                                        scale=(1, 1, 1)), drift)
+    np.testing.assert_allclose(corrected.data[:, 1:],
+                               data[:, 1:] - drift[[0, 3, 5]])
+    tracks = STracks(data=np.column_stack((np.zeros(3), corrected.data)),
+                     properties={}, graph={}, features={}, scale=(1, 1, 1))
+    np.testing.assert_allclose(restore_drift(tracks, drift).data[:, 1:],
+                               data)
@@ -0,0 +1,212 @@
+import numpy as np
+import pytest
+from stracking.containers import STracks
+from stracking.features import (LengthFeature, DistanceFeature,
+                                DisplacementFeature)
+
+from napari_stracking._sfeatures_engine import (SFeaturesCache,
+                                                SFeaturesRegistry,
+                                                tracks_features,
+                                                SFeatureTable, SRaggedArray)
+
+
+def _tracks():
+    rng = np.random.default_rng(0)
+    data = []
+    for track_id in range(20):
+        length = rng.integers(1, 15)
+        start = rng.integers(0, 10)
+        positions = np.cumsum(rng.normal(0, 2, (length, 2)), axis=0)
+        data.append(np.column_stack((np.full(length, track_id),
+                                     np.arange(start, start + length),
+                                     positions)))
+    return np.concatenate(data)
+
+
+def _assert_column_close(values, expected):
+    if isinstance(expected, SRaggedArray):
+        np.testing.assert_array_equal(values.offsets, expected.offsets)
+        values, expected = values.values, expected.values
+    np.testing.assert_allclose(values, expected)
+
+
+def test_tracks_features():
+    data = _tracks()
+    expected = STracks(data=data, features=dict())
+    for feature in (LengthFeature(), DistanceFeature(),
+                    DisplacementFeature()):
+        expected = feature.run(expected)
+
+    shuffled = data[np.random.default_rng(1).permutation(data.shape[0])]
+    columns = tracks_features(shuffled,
+                              ['length', 'distance', 'displacement'])
+    np.testing.assert_array_equal(columns['track_id'], np.arange(20))
+    features = SFeatureTable(columns['track_id'],
+                             {name: values for name, values in columns.items()
+                              if name != 'track_id'}).to_dicts()
+    assert features['length'] == expected.features['length']
+    for name in ('distance', 'displacement'):
+        for track_id, value in expected.features[name].items():
+            np.testing.assert_allclose(features[name][track_id], value)
+
+
+def test_tracks_features_scale():
+    data = np.array([[0, 0, 0, 0], [0, 1, 3, 0], [0, 2, 3, 4],
+                     [1, 0, 1, 1]], dtype=float)
+    columns = tracks_features(data, ['distance', 'displacement'],
+                              scale=(1, 2, 1))
+    np.testing.assert_allclose(columns['distance'], [10, 0])
+    np.testing.assert_allclose(columns['displacement'], [np.sqrt(52), 0])
+
+
+def test_msd_feature():
+    rng = np.random.default_rng(2)
+    data = []
+    for track_id in range(10):
+        length = rng.integers(2, 30)
+        frames = np.sort(rng.choice(60, length, replace=False))
+        positions = np.cumsum(rng.normal(0, 1, (length, 2)), axis=0)
+        data.append(np.column_stack((np.full(length, track_id), frames,
+                                     positions)))
+    data = np.concatenate(data)
+
+    columns = tracks_features(data, ['msd'], parameters={'msd': {
+        'max_lag': 20}})
+    for track, track_id in enumerate(columns['track_id']):
+        points = data[data[:, 0] == track_id]
+        assert len(columns['msd'][track]) == \
+            min(points[-1, 1] - points[0, 1], 20)
+        lags = points[:, 1][None, :] - points[:, 1][:, None]
+        squares = np.sum((points[None, :, 2:] - points[:, None, 2:]) ** 2,
+                         axis=2)
+        for lag in range(1, len(columns['msd'][track]) + 1):
+            expected = squares[lags == lag].mean() \
+                if np.any(lags == lag) else np.nan
+            np.testing.assert_allclose(columns['msd'][track][lag - 1],
+                                       expected)
+
+
+def test_msd_diffusion():
+    rng = np.random.default_rng(3)
+    data = np.column_stack((np.repeat(np.arange(500), 100),
+                            np.tile(np.arange(100), 500),
+                            np.cumsum(rng.normal(0, 1, (50000, 2)), axis=0)))
+    columns = tracks_features(data, ['msd'])
+    np.testing.assert_allclose(np.median(columns['diffusion']), 0.5,
+                               atol=0.05)
+    np.testing.assert_allclose(np.median(columns['alpha']), 1, atol=0.05)
+    table = SFeatureTable.from_dicts(SFeatureTable(
+        columns['track_id'], {'msd': columns['msd'],
+                              'alpha': columns['alpha']}).to_dicts())
+    assert table.names(scalar=True) == ['alpha']
+    _assert_column_close(table['msd'], columns['msd'])
+
+
+def test_features_cache():
+    names = ['length', 'distance', 'displacement', 'msd']
+    data = _tracks()
+    cache = SFeaturesCache()
+    cache.run(data, names)
+
+    # filter a track, edit a point, and add a new track
+    edited = data[data[:, 0] != 3].copy()
+    edited[edited[:, 0] == 5, 2] += 1
+    edited = np.concatenate((edited, [[30, 0, 1, 1], [30, 2, 4, 5]]))
+    computed = cache.run(edited, names)
+    expected = tracks_features(edited, names)
+    assert computed.keys() == expected.keys()
+    for name in expected:
+        _assert_column_close(computed[name], expected[name])
+
+
+def test_features_registry():
+    data = _tracks()
+    registry = SFeaturesRegistry()
+    registry.declare('length')
+    registry.declare('msd', {'fit_lags': 5})
+    assert registry.columns(scalar=True) == ['length', 'diffusion', 'alpha']
+
+    table = registry.compute(data, ['length'])
+    assert table.names() == ['length']
+    assert registry._computed.keys() == {'length'}
+    np.testing.assert_array_equal(registry.compute(data, ['length'])['length'],
+                                  table['length'])
+
+    edited = data[data[:, 0] != 3]
+    table = registry.compute(edited)
+    expected = tracks_features(edited, ['length', 'msd'],
+                               parameters={'msd': {'fit_lags': 5}})
+    np.testing.assert_array_equal(table.track_ids, expected['track_id'])
+    for name in table.names():
+        _assert_column_close(table[name], expected[name])
+
+
+
+class _DeclaringObserver:
+    """Observer declaring a feature, or canceling, during a computation"""
+    def __init__(self, registry, cancel=False):
+        self.registry = registry
+        self.cancel = cancel
+        self.values = []
+
+    def notify(self, message):
+        pass
+
+    def progress(self, value):
+        if self.cancel:
+            raise Exception('canceled')
+        self.values.append(value)
+        self.registry.declare('length')
+
+
+def test_features_registry_observer():
+    data = _tracks()
+    registry = SFeaturesRegistry()
+    registry.declare('msd')
+    with pytest.raises(Exception, match='canceled'):
+        registry.compute(data, observer=_DeclaringObserver(registry, True))
+    assert registry._computed == dict()
+
+    # the feature declared during the computation is not computed with the
+    # parameters the computation started with
+    observer = _DeclaringObserver(registry)
+    table = registry.compute(data, observer=observer)
+    assert observer.values == [0, 100]
+    assert table.names() == ['msd', 'diffusion', 'alpha']
+    table = registry.compute(data, ['length'])
+    np.testing.assert_array_equal(
+        table['length'], tracks_features(data, ['length'])['length'])
+
+
+def test_feature_table():
+    table = SFeatureTable([3, 1, 2], {'length': [30, 10, 20]})
+    np.testing.assert_array_equal(table.track_ids, [1, 2, 3])
+    np.testing.assert_array_equal(table['length'], [10, 20, 30])
+    assert table['length'].dtype.kind == 'i'
+    np.testing.assert_array_equal(table.rows([2, 5]), [1, -1])
+
+    table.update(SFeatureTable([2, 3], {'distance': [2.5, 3.5]}))
+    np.testing.assert_array_equal(table['distance'], [np.nan, 2.5, 3.5])
+    selected = table.select(table['length'] > 15)
+    np.testing.assert_array_equal(selected.track_ids, [2, 3])
+    assert selected.to_dicts() == {'length': {2: 20, 3: 30},
+                                   'distance': {2: 2.5, 3: 3.5}}
+
+
+def test_ragged_array():
+    array = SRaggedArray.from_rows([[1, 2], [], [3, 4, 5]])
+    assert len(array) == 3
+    np.testing.assert_array_equal(array.lengths, [2, 0, 3])
+    np.testing.assert_array_equal(array[2], [3, 4, 5])
+    assert array[[2, 0]].tolist() == [[3, 4, 5], [1, 2]]
+    assert array.take([-1, 0]).tolist() == [[], [1, 2]]
+    assert SRaggedArray.concatenate([array, array[1:]]).tolist() == \
+        [[1, 2], [], [3, 4, 5], [], [3, 4, 5]]
+
+    table = SFeatureTable([5, 3, 4], {'msd': array})
+    assert table.names(scalar=True) == []
+    assert table['msd'].tolist() == [[], [3, 4, 5], [1, 2]]
+    table.update(SFeatureTable([3, 4], {'length': [2, 3]}))
+    assert table.reindex([4, 9])['msd'].tolist() == [[3, 4, 5], []]
+    assert table.select(table['length'] == 3).to_dicts() == {
+        'msd': {4: [3.0, 4.0, 5.0]}, 'length': {4: 3.0}}
@@ -0,0 +1,237 @@
+import numpy as np
+import pytest
+from stracking.containers import SParticles
+from stracking.linkers import SPLinker, EuclideanCost
+
+from napari_stracking._slinking_engine import (candidate_links,
+                                               SShortestPathLinker,
+                                               SWindowedLinker,
+                                               SOnlineLinker,
+                                               SLAPLinker,
+                                               SNearestNeighborLinker,
+                                               chain_links,
+                                               SIncrementalLinker,
+                                               changed_frames,
+                                               estimate_max_distance,
+                                               candidate_count,
+                                               assignment_links)
+
+
+def _moving_particles(count=15, frames=6, seed=0, grid=False):
+    """Create 2D+t particles moving along the diagonal, with missing ones"""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 100, (count, 2))
+    if grid:
+        # well separated particles
+        start = 15 * np.stack(np.unravel_index(np.arange(count), (10, 10)),
+                              axis=1)
+    rows = []
+    for t in range(frames):
+        for position in start + 1.5 * t:
+            if rng.random() < 0.9:
+                rows.append([t, *position])
+    return np.array(rows)
+
+
+def test_candidate_links():
+    data = _moving_particles()
+    scale = (1, 2, 0.5)
+    sources, targets, costs = candidate_links(data, scale, 5, 2)
+    # brute force
+    coordinates = data[:, 1:] * np.array(scale[1:])
+    expected = set()
+    for i in range(data.shape[0]):
+        for j in range(data.shape[0]):
+            dt = data[j, 0] - data[i, 0]
+            distance = np.sum((coordinates[i] - coordinates[j]) ** 2)
+            if 1 <= dt <= 2 and distance < 25:
+                expected.add((i, j))
+    assert set(zip(sources.tolist(), targets.tolist())) == expected
+    np.testing.assert_allclose(
+        costs, np.sum((coordinates[sources] - coordinates[targets]) ** 2, 1))
+
+
+def test_shortest_path_linker():
+    data = _moving_particles()
+    particles = SParticles(data=data, properties={}, scale=(1, 1, 1))
+    expected = SPLinker(cost=EuclideanCost(max_cost=25), gap=2).run(particles)
+    particles.properties = {'index': np.arange(data.shape[0], dtype=float)}
+    tracks = SShortestPathLinker(max_distance=5, gap=2,
+                                 solver='bellman-ford').run(particles)
+    np.testing.assert_array_equal(tracks.data, expected.data)
+    index = tracks.properties['index'].astype(int)
+    np.testing.assert_array_equal(data[index], tracks.data[:, 1:])
+
+
+def test_shortest_path_linker_dag():
+    for seed in range(5):
+        data = _moving_particles(count=30, frames=8, seed=seed)
+        data[:, 1:] += np.random.default_rng(seed).normal(0, 0.7,
+                                                           data[:, 1:].shape)
+        particles = SParticles(data=data, properties={}, scale=(1, 1, 1))
+        expected = SShortestPathLinker(max_distance=5, gap=2,
+                                       solver='bellman-ford').run(particles)
+        tracks = SShortestPathLinker(max_distance=5, gap=2,
+                                     solver='dag').run(particles)
+        np.testing.assert_array_equal(tracks.data, expected.data)
+
+
+def _tracks_paths(tracks):
+    """Set of the particles indexes of each track"""
+    index = tracks.properties['index']
+    return {tuple(index[tracks.data[:, 0] == track_id].tolist())
+            for track_id in np.unique(tracks.data[:, 0])}
+
+
+def test_windowed_linker():
+    data = _moving_particles(count=20, frames=30, grid=True)
+    particles = SParticles(data=data,
+                           properties={'index': np.arange(data.shape[0])},
+                           scale=(1, 1, 1))
+    expected = SShortestPathLinker(max_distance=5, gap=2).run(particles)
+    for workers in [1, 2]:
+        linker = SWindowedLinker(SShortestPathLinker(max_distance=5, gap=2),
+                                 window=7, workers=workers)
+        tracks = linker.run(particles)
+        # the stitched tracks are the same
+        assert _tracks_paths(tracks) == _tracks_paths(expected)
+        assert np.array_equal(np.unique(tracks.data[:, 0]),
+                              np.arange(len(_tracks_paths(tracks))))
+
+
+def _tracks_links(tracks):
+    """Set of the (source, target) particles indexes of the tracks links"""
+    links = set()
+    for path in _tracks_paths(tracks):
+        links |= set(zip(path[:-1], path[1:]))
+    return links
+
+
+def test_windowed_linker_approximation():
+    # dense random particles: the windows can change a few links
+    data = _moving_particles(count=60, frames=40, seed=2)
+    particles = SParticles(data=data,
+                           properties={'index': np.arange(data.shape[0])},
+                           scale=(1, 1, 1))
+    expected = _tracks_links(SShortestPathLinker(5, 2).run(particles))
+    tracks = SWindowedLinker(SShortestPathLinker(5, 2),
+                             window=10).run(particles)
+    assert len(_tracks_links(tracks) ^ expected) < 0.1 * len(expected)
+    # a window covering all the frames gives the whole movie linking
+    tracks = SWindowedLinker(SShortestPathLinker(5, 2),
+                             window=40).run(particles)
+    assert _tracks_links(tracks) == expected
+
+
+def test_online_linker():
+    data = _moving_particles(count=20, frames=30, grid=True)
+    particles = SParticles(data=data,
+                           properties={'index': np.arange(data.shape[0])},
+                           scale=(1, 1, 1))
+    expected = SShortestPathLinker(5, 2).run(particles)
+    tracks = SOnlineLinker(5, 2).run(particles)
+    assert _tracks_paths(tracks) == _tracks_paths(expected)
+
+
+def test_online_linker_push():
+    linker = SOnlineLinker(max_distance=5, gap=1, min_track_length=2)
+    for t in range(3):
+        assert linker.push(t, np.array([[t, 10, 10 + t], [t, 50, 50]])) == []
+    # the first particle disappears: its track is finished one frame later
+    assert linker.push(3, np.array([[3, 50, 50]])) == []
+    finished = linker.push(4, np.array([[4, 50, 50]]))
+    assert len(finished) == 1
+    np.testing.assert_allclose(finished[0][1][:, 2], [10, 11, 12])
+    finished = linker.flush()
+    assert len(finished) == 1 and finished[0][1].shape[0] == 5
+    linker.push(2, np.array([[2, 50, 50]]))
+    with pytest.raises(Exception):
+        linker.push(1, np.array([[1, 50, 50]]))
+
+
+def test_assignment_links():
+    sources = np.array([0, 0, 1, 1])
+    targets = np.array([2, 3, 2, 3])
+    costs = np.array([4., 25., 0., 4.])
+    # global optimum, where a greedy selection would link 1 to 2 first
+    assert assignment_links(sources, targets, costs, 36).tolist() == \
+        [True, False, False, True]
+    # ending and starting the tracks is cheaper than the costly links
+    assert assignment_links(sources, targets, costs, 2).tolist() == \
+        [False, False, True, False]
+
+
+def test_lap_linker():
+    data = _moving_particles(count=20, frames=30, grid=True)
+    particles = SParticles(data=data,
+                           properties={'index': np.arange(data.shape[0])},
+                           scale=(1, 1, 1))
+    expected = SShortestPathLinker(5, 2).run(particles)
+    tracks = SLAPLinker(5, 2).run(particles)
+    assert _tracks_paths(tracks) == _tracks_paths(expected)
+    # gap closing over a missing detection
+    data = np.array([[0, 10, 10], [1, 10, 11], [3, 10, 13], [4, 10, 14]])
+    particles = SParticles(data=data, properties={}, scale=(1, 1, 1))
+    assert SLAPLinker(5, 1).run(particles).data.shape[0] == 0
+    tracks = SLAPLinker(5, 2).run(particles)
+    np.testing.assert_allclose(tracks.data[:, 0], 0)
+
+
+def test_incremental_linker():
+    data = _moving_particles(count=20, frames=30, grid=True)
+    linker = SIncrementalLinker(SShortestPathLinker(5, 2))
+    particles = SParticles(data=data,
+                           properties={'index': np.arange(data.shape[0])},
+                           scale=(1, 1, 1))
+    expected = SShortestPathLinker(5, 2).run(particles)
+    assert _tracks_paths(linker.run(particles)) == _tracks_paths(expected)
+
+    # remove a particle and move another one
+    edited = np.delete(data, np.flatnonzero(data[:, 0] == 10)[3], axis=0)
+    edited[np.flatnonzero(edited[:, 0] == 20)[5], 1] += 1
+    assert changed_frames(data, edited).tolist() == [10, 20]
+    particles = SParticles(data=edited,
+                           properties={'index': np.arange(edited.shape[0])},
+                           scale=(1, 1, 1))
+    expected = SShortestPathLinker(5, 2).run(particles)
+    assert _tracks_paths(linker.run(particles)) == _tracks_paths(expected)
+
+
+def test_incremental_linker_random():
+    # the first run gives the shortest path linker tracks, even when its
+    # stopping rule leaves short tracks unlinked
+    for seed in range(10):
+        data = _moving_particles(count=200, frames=10, seed=seed)
+        particles = SParticles(data=data,
+                               properties={'index': np.arange(data.shape[0])},
+                               scale=(1, 1, 1))
+        expected = _tracks_paths(SShortestPathLinker(5, 2).run(particles))
+        linker = SIncrementalLinker(SShortestPathLinker(5, 2))
+        assert _tracks_paths(linker.run(particles)) == expected
+        # nothing edited: the tracks are kept
+        assert _tracks_paths(linker.run(particles)) == expected
+
+
+def test_estimate_max_distance():
+    data = _moving_particles(count=20, frames=30, grid=True)
+    # the particles move by 1.5 * sqrt(2) per frame
+    assert estimate_max_distance(data, quantile=0.5) == \
+        pytest.approx(1.5 * np.sqrt(2))
+    # all the frames are sampled: exact count
+    sources, _, _ = candidate_links(data, (1, 1, 1), 5, 2)
+    assert candidate_count(data, (1, 1, 1), 5, 2, sample=30) == len(sources)
+
+
+def test_nearest_neighbor_linker():
+    data = _moving_particles(count=20, frames=30, grid=True)
+    particles = SParticles(data=data,
+                           properties={'index': np.arange(data.shape[0])},
+                           scale=(1, 1, 1))
+    expected = SShortestPathLinker(5, 2).run(particles)
+    tracks = SNearestNeighborLinker(5, 2).run(particles)
+    assert _tracks_paths(tracks) == _tracks_paths(expected)
+
+
+def test_chain_links():
+    paths = chain_links(np.array([4, 0, 2, 5]), np.array([2, 4, 3, 6]), 8)
+    assert [path.tolist() for path in paths] == [[0, 4, 2, 3], [5, 6]]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from stracking.containers import SParticles
+
+from napari_stracking._smotion_model import (SConstantVelocityMotion,
+                                             SKalmanMotion, predicted_links)
+from napari_stracking._slinking_engine import SLAPLinker, SOnlineLinker
+
+
+@pytest.mark.parametrize('motion', [SConstantVelocityMotion(),
+                                    SKalmanMotion(0.01, 0.01)])
+def test_motion_prediction(motion):
+    state = motion.initialize(np.array([[0., 0.], [10., 10.]]))
+    np.testing.assert_allclose(motion.predict(state, 1), [[0, 0], [10, 10]])
+    for t in range(1, 5):
+        state = motion.update(state, np.array([[2. * t, t], [10., 10.]]), 1)
+    np.testing.assert_allclose(motion.predict(state, 2),
+                               [[12, 6], [10, 10]], atol=0.1)
+
+
+def test_predicted_links():
+    predictions = np.array([[0., 0.], [10., 0.]])
+    positions = np.array([[1., 0.], [13., 0.], [30., 0.]])
+    sources, targets, costs = predicted_links(predictions, [2, 5], positions)
+    assert sources.tolist() == [0, 1]
+    assert targets.tolist() == [0, 1]
+    np.testing.assert_allclose(costs, [1, 9])
+
+
+def _directed_particles():
+    """Close particles moving fast in opposite directions"""
+    rows = []
+    for t in range(10):
+        for i in range(5):
+            rows.append([t, 10 * i, 8 * t])
+            rows.append([t, 10 * i + 5, 100 - 8 * t])
+    return np.array(rows, dtype=float)
+
+
+@pytest.mark.parametrize('linker', [
+    SLAPLinker(2, 1, motion=SConstantVelocityMotion(), initial_distance=9),
+    SLAPLinker(2, 1, motion=SKalmanMotion(), initial_distance=9),
+    SOnlineLinker(2, 1, motion=SKalmanMotion(), initial_distance=9)])
+def test_motion_linkers(linker):
+    data = _directed_particles()
+    # the brownian motion cannot link the particles with a small radius
+    assert SLAPLinker(2, 1).run(
+        SParticles(data=data, properties={}, scale=(1, 1, 1))).data.shape[0] == 0
+    tracks = linker.run(SParticles(data=data, properties={},
+                                   scale=(1, 1, 1)))
+    assert len(np.unique(tracks.data[:, 0])) == 10
+    for track_id in np.unique(tracks.data[:, 0]):
+        track = tracks.data[tracks.data[:, 0] == track_id]
+        assert track.shape[0] == 10
+        assert np.all(track[:, 2] == track[0, 2])
@@ -0,0 +1,29 @@
+from napari_stracking._splugin import SNapariWorker, SCanceled
+
+
+class _FailingWorker(SNapariWorker):
+    """Worker whose job raises an exception"""
+    def __init__(self, error):
+        super().__init__(None, None)
+        self.error_to_raise = error
+
+    def run(self):
+        raise self.error_to_raise
+
+
+def test_worker_error():
+    worker = _FailingWorker(ValueError('bad layer'))
+    finished = []
+    worker.finished.connect(lambda: finished.append(True))
+    logs = []
+    worker.log.connect(logs.append)
+    worker.execute()
+    assert finished == [True]
+    assert logs == ['error: bad layer']
+    assert isinstance(worker.error, ValueError)
+
+    # a canceled job is not an error
+    worker.error_to_raise = SCanceled()
+    worker.execute()
+    assert finished == [True, True]
+    assert worker.error is None
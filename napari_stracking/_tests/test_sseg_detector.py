@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from stracking.detectors import SSegDetector
+
+from napari_stracking._sseg_detector import (SSegCentroidsDetector,
+                                             label_centroids)
+
+
+def _labels_movie():
+    """Create a 2D+t labels movie with random rectangular objects"""
+    rng = np.random.default_rng(0)
+    image = np.zeros((3, 64, 64), dtype=np.int32)
+    for t in range(image.shape[0]):
+        for label in range(1, 20):
+            y, x = rng.integers(0, 56, 2)
+            h, w = rng.integers(2, 8, 2)
+            image[t, y:y+h, x:x+w] = label
+    return image
+
+
+@pytest.mark.parametrize('is_mask', [False, True])
+def test_seg_centroids_detector(is_mask):
+    image = _labels_movie()
+    if is_mask:
+        image = (image > 0).astype(np.uint8)
+    expected = SSegDetector(is_mask=is_mask).run(image)
+    particles = SSegCentroidsDetector(is_mask=is_mask).run(image)
+    np.testing.assert_allclose(particles.data, expected.data)
+    assert particles.properties['area'].shape[0] == particles.data.shape[0]
+
+
+def test_label_centroids_sparse_labels():
+    frame = np.zeros((10, 10), dtype=np.int64)
+    frame[1:3, 1:3] = 10 ** 12
+    frame[5:9, 6] = 7
+    centroids, areas = label_centroids(frame)
+    np.testing.assert_allclose(centroids, [[6.5, 6], [1.5, 1.5]])
+    np.testing.assert_allclose(areas, [4, 4])